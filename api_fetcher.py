@@ -0,0 +1,218 @@
+# time and threading for the rate-limiter
+import time
+import threading
+import random
+# thread-pool for concurrent api calls (the calls spend most of their time waiting on the network)
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# status codes worth retrying, 429 == too many requests
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# errors without a status code worth retrying: dropped connections and timeouts (requests' own
+# exceptions are not subclasses of the builtin ones)
+RETRY_EXCEPTIONS = (ConnectionError, TimeoutError)
+try:
+    import requests
+    RETRY_EXCEPTIONS += (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+except ImportError:
+    pass
+
+
+class ApiError(Exception):
+    """
+    error response from the api (or the fake api) with its http status code
+    """
+    def __init__(self, status_code, message=''):
+        super().__init__(f'status code {status_code} {message}'.strip())
+        self.status_code = status_code
+
+
+def status_code(exception):
+    """
+    http status code of an exception, None if it does not have one
+    """
+    code = getattr(exception, 'status_code', None)
+    if code is None:
+        response = getattr(exception, 'response', None)
+        code = getattr(response, 'status_code', None)
+    return code
+
+
+def is_retryable(exception):
+    """
+    429 and 5xx, dropped connections and timeouts are retried. everything else (other status codes,
+    programming errors like KeyError or TypeError) is raised at once instead of going through the backoff
+    """
+    code = status_code(exception)
+    if code is not None:
+        return code in RETRY_STATUS_CODES
+    return isinstance(exception, RETRY_EXCEPTIONS)
+
+
+class TokenBucket:
+    """
+    rate-limiter, every call takes a token and the bucket is refilled with rate tokens per second
+    """
+    def __init__(self, rate, capacity):
+        """
+        :param rate: tokens per second
+        :param capacity: max number of tokens, i.e. the size of a burst
+        """
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        blocks until a token is available
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+class ApiFetcher:
+    """
+    concurrent fetch layer over BorsdataAPI. calls run in a bounded thread-pool, share a
+    token-bucket within borsdata's request quota and are retried with backoff on 429/5xx
+    """
+    def __init__(self, borsdata_api, max_workers=8, calls_per_second=10, burst=10, retries=5, backoff=0.5,
+                 max_backoff=30):
+        """
+        :param borsdata_api: BorsdataAPI-object (or anything with the same methods)
+        :param max_workers: max number of concurrent calls
+        :param calls_per_second: sustained call rate, borsdata allows 100 calls per 10 seconds
+        :param burst: number of calls allowed at once before the rate applies
+        :param retries: number of retries of a failing call
+        :param backoff: seconds before the first retry, doubled for each retry
+        :param max_backoff: max seconds between two retries
+        """
+        self._borsdata_api = borsdata_api
+        self._max_workers = max_workers
+        self._bucket = TokenBucket(calls_per_second, burst)
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        # key (the ins_id for fetch_many) -> exception for the calls that failed in the last fetch_* call
+        self.last_failures = {}
+        # method_name -> {key: exception} for the calls that have failed during the run (and not succeeded since)
+        self.failures = {}
+
+    def call(self, method_name, *args, **kwargs):
+        """
+        one rate-limited api call, retried with exponential backoff (and some jitter) on 429/5xx
+        :param method_name: name of the BorsdataAPI method e.g. 'get_instrument_stock_prices'
+        :return: result of the api method
+        """
+        method = getattr(self._borsdata_api, method_name)
+        attempt = 0
+        while True:
+            self._bucket.acquire()
+            try:
+                return method(*args, **kwargs)
+            except Exception as exception:
+                if attempt >= self._retries or not is_retryable(exception):
+                    raise
+                delay = min(self._max_backoff, self._backoff * 2 ** attempt)
+                time.sleep(delay * (0.5 + random.random() / 2))
+                attempt += 1
+
+    def fetch_calls(self, calls, on_result=None):
+        """
+        runs api calls concurrently
+        :param calls: dict of key -> (method_name, args, kwargs)
+        :param on_result: function(key, result) called (on the calling thread) as soon as a call has
+                          succeeded, e.g. for storing every result before the whole batch is done
+        :return: dict of key -> result, failed calls are left out and kept in last_failures (by key)
+        """
+        results = {}
+        failures = {}
+        if len(calls) > 0:
+            executor = ThreadPoolExecutor(max_workers=self._max_workers)
+            try:
+                futures = {executor.submit(self.call, method_name, *args, **kwargs): key
+                           for key, (method_name, args, kwargs) in calls.items()}
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        results[key] = future.result()
+                    except Exception as exception:
+                        failures[key] = exception
+                        continue
+                    if on_result is not None:
+                        on_result(key, results[key])
+            except BaseException:
+                # e.g. ctrl-c, the queued calls are dropped (the results already handled are kept by on_result)
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            executor.shutdown()
+        for key, (method_name, args, kwargs) in calls.items():
+            if key in failures:
+                self.failures.setdefault(method_name, {})[key] = failures[key]
+            elif method_name in self.failures:
+                self.failures[method_name].pop(key, None)
+        if len(failures) > 0:
+            method_names = sorted({calls[key][0] for key in failures})
+            print(f"ApiFetcher >> {', '.join(method_names)} failed for {len(failures)} call(s): {list(failures)[:10]}")
+        self.last_failures = failures
+        # in the order of the calls
+        return {key: results[key] for key in calls if key in results}
+
+    def fetch_many(self, method_name, ins_ids, args=(), kwargs_list=None, on_result=None):
+        """
+        calls method_name(ins_id, *args, **kwargs) concurrently for every ins_id
+        :param method_name: name of the BorsdataAPI method
+        :param ins_ids: instrument ids
+        :param args: extra positional arguments, the same for all calls
+        :param kwargs_list: keyword arguments per ins_id (same order as ins_ids), default none
+        :param on_result: function(ins_id, result) called as soon as a call has succeeded
+        :return: dict of ins_id -> result, failed calls are left out and kept in last_failures
+        """
+        ins_ids = [int(ins_id) for ins_id in ins_ids]
+        if kwargs_list is None:
+            kwargs_list = [{}] * len(ins_ids)
+        return self.fetch_calls({ins_id: (method_name, (ins_id,) + tuple(args), kwargs)
+                                 for ins_id, kwargs in zip(ins_ids, kwargs_list)}, on_result)
+
+    def fetch_prices(self, ins_ids, from_dates=None, on_result=None):
+        """
+        stock prices for many instruments
+        :param ins_ids: instrument ids
+        :param from_dates: first date to fetch per ins_id (None for the full history), default full history
+        :param on_result: function(ins_id, stock_prices) called as soon as an instrument has been fetched
+        :return: dict of ins_id -> pd.DataFrame of stock prices
+        """
+        kwargs_list = None
+        if from_dates is not None:
+            kwargs_list = [{} if from_date is None else {'from_date': from_date} for from_date in from_dates]
+        return self.fetch_many('get_instrument_stock_prices', ins_ids, kwargs_list=kwargs_list, on_result=on_result)
+
+    def fetch_reports(self, ins_ids, on_result=None):
+        """
+        financial reports for many instruments
+        :param ins_ids: instrument ids
+        :param on_result: function(ins_id, reports) called as soon as an instrument has been fetched
+        :return: dict of ins_id -> (reports_quarter, reports_year, reports_r12)
+        """
+        return self.fetch_many('get_instrument_reports', ins_ids, on_result=on_result)
+
+    def fetch_kpi_histories(self, keys, report_type='year', price_type='mean', on_result=None):
+        """
+        kpi histories for many kpis and instruments in one concurrent batch
+        :param keys: (kpi_id, ins_id) pairs
+        :param report_type: 'year', 'r12' or 'quarter'
+        :param price_type: calculation e.g. 'mean', 'high' or 'low'
+        :param on_result: function((kpi_id, ins_id), history) called as soon as a history has been fetched
+        :return: dict of (kpi_id, ins_id) -> pd.DataFrame with (year, period) as index and a kpiValue column
+        """
+        return self.fetch_calls({(int(kpi_id), int(ins_id)): ('get_kpi_history',
+                                                              (int(ins_id), int(kpi_id), report_type, price_type), {})
+                                 for kpi_id, ins_id in keys}, on_result)
@@ -0,0 +1,170 @@
+# benchmark of BorsdataClient against FakeBorsdataAPI, usage e.g.
+#   python benchmark.py --sizes 100 1000 --latency 0.01
+#   python benchmark.py --save-baseline      (stores the results in benchmark_baseline.json)
+#   python benchmark.py                      (compares with the stored baseline, exit code 1 on regressions)
+# benchmark_baseline.json in the repository holds the sizes 100 and 1000 (run with --sizes 100 1000). the
+# wall times depend on the machine, after changing machine store a new baseline with
+#   python benchmark.py --sizes 100 1000 --save-baseline
+# and commit it together with the change. a missing baseline (file or size) fails the comparison
+# argparse for the command line, json for the baselines
+import argparse
+import json
+# os, tempfile and contextlib for running every size in its own directory with the prints silenced
+import os
+import tempfile
+import contextlib
+import io
+# time and tracemalloc for wall time and peak memory
+import time
+import tracemalloc
+import sys
+
+# no plot windows during the benchmark
+import matplotlib
+matplotlib.use('Agg')
+
+from fake_borsdata_api import FakeBorsdataAPI
+from borsdata_client import BorsdataClient
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+SIZES = (100, 1000)
+
+
+def benchmark_steps(client, year):
+    """
+    the timed steps in running order, the caches fill up the way they do in a normal session
+    :return: list of (name, function)
+    """
+    return [
+        ('instruments_with_meta_data', client.instruments_with_meta_data),
+        ('breadth', lambda: client.breadth(['Large Cap', 'Mid Cap', 'Small Cap', 'First North'])),
+        ('market_breadth', lambda: client.market_breadth('Large Cap')),
+        ('market_breadth_50', lambda: client.market_breadth_50('Mid Cap')),
+        ('sector_breadth', client.sector_breadth),
+        ('branch_breadth', client.branch_breadth),
+        ('grouped_breadth', lambda: client.grouped_breadth(['market', 'sector', 'branch'])),
+        ('breadth_history', client.breadth_history),
+        ('breadth_large_cap_sweden', client.breadth_large_cap_sweden),
+        ('get_eps_accelerationR12', client.get_eps_accelerationR12),
+        ('get_eps_accelerationQ', client.get_eps_accelerationQ),
+        ('get_eps_growth', client.get_eps_growth),
+        ('eps_acceleration_backtest', lambda: client.eps_acceleration_backtest('quarter')),
+        ('market_internals', client.market_internals),
+        ('expression_screen', lambda: client.expression_screen('(dist_high252 > -0.05) & (sma50 > sma200)',
+                                                               'return63')),
+        ('top_performers', lambda: client.top_performers('Large Cap', 'Sverige')),
+        ('history_kpi', lambda: client.history_kpi(2, 'Large Cap', 'Sverige', year)),
+        # the background exports still running
+        ('exports', client.close),
+    ]
+
+
+def run_size(number_of_instruments, latency=0.0, calls_per_second=None):
+    """
+    runs every step once for a universe of number_of_instruments, starting from empty caches
+    :return: dict of step name -> {'seconds', 'api_calls', 'peak_mb'}
+    """
+    api = FakeBorsdataAPI(number_of_instruments, latency=latency)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        working_directory = os.getcwd()
+        os.chdir(directory)
+        os.makedirs('file_exports')
+        try:
+            client = BorsdataClient(api, cache_path=os.path.join(directory, 'file_cache'),
+                                    calls_per_second=calls_per_second or 1000)
+            year = api._dates[-1].year - 1
+            for name, step in benchmark_steps(client, year):
+                calls_before = sum(api.calls.values())
+                tracemalloc.start()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    step()
+                seconds = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results[name] = {'seconds': round(seconds, 4),
+                                 'api_calls': sum(api.calls.values()) - calls_before,
+                                 'peak_mb': round(peak / 1e6, 2)}
+        finally:
+            os.chdir(working_directory)
+    return results
+
+
+def compare(results, baseline, tolerance, min_seconds=1.0):
+    """
+    :param tolerance: allowed relative increase of wall time and memory, e.g. 0.25
+    :param min_seconds: wall time increases below this are noise (short steps vary a lot between runs)
+    :return: list of regression messages (api calls may not increase at all)
+    """
+    regressions = []
+    for size, steps in results.items():
+        if size not in baseline:
+            regressions.append(f"{size}: no baseline for this size (run with --save-baseline)")
+            continue
+        for name, result in steps.items():
+            base = baseline[size].get(name)
+            if base is None:
+                regressions.append(f"{size} {name}: no baseline for this step (run with --save-baseline)")
+                continue
+            if result['seconds'] > base['seconds'] * (1 + tolerance) and \
+                    result['seconds'] - base['seconds'] > min_seconds:
+                regressions.append(f"{size} {name}: {result['seconds']}s (baseline {base['seconds']}s)")
+            if result['api_calls'] > base['api_calls']:
+                regressions.append(f"{size} {name}: {result['api_calls']} api calls (baseline {base['api_calls']})")
+            if result['peak_mb'] > base['peak_mb'] * (1 + tolerance):
+                regressions.append(f"{size} {name}: {result['peak_mb']} MB (baseline {base['peak_mb']} MB)")
+    return regressions
+
+
+def print_results(size, steps):
+    print(f'\n{size} instruments')
+    print(f"{'step':<28}{'seconds':>10}{'api calls':>11}{'peak MB':>10}")
+    for name, result in steps.items():
+        print(f"{name:<28}{result['seconds']:>10.3f}{result['api_calls']:>11}{result['peak_mb']:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark of BorsdataClient against a synthetic api')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='universe sizes (number of instruments)')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated seconds per api call')
+    parser.add_argument('--calls-per-second', type=int, default=None,
+                        help='client rate limit, default no practical limit')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline json-file')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative increase of wall time and peak memory')
+    parser.add_argument('--min-seconds', type=float, default=1.0,
+                        help='wall time increases below this many seconds are not regressions')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = run_size(size, args.latency, args.calls_per_second)
+        print_results(size, results[str(size)])
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file)
+        # only the benchmarked sizes are replaced
+        baseline.update(results)
+        with open(args.baseline, 'w') as file:
+            json.dump(baseline, file, indent=2)
+        print(f'\nbaseline saved to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'\nREGRESSION no baseline to compare with at {args.baseline} (run with --save-baseline)')
+        return 1
+    with open(args.baseline) as file:
+        regressions = compare(results, json.load(file), args.tolerance, args.min_seconds)
+    for regression in regressions:
+        print('REGRESSION', regression)
+    if len(regressions) == 0:
+        print('\nno regressions')
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,42 @@
 # importing the borsdata_api
 from borsdata_api import BorsdataAPI
-from excel_test import ExcelWriter
+# concurrent, rate-limited api calls
+from api_fetcher import ApiFetcher
+# on-disk cache of stock prices
+from price_cache import PriceCache
+# float32 close-only memory-mapped price matrix
+from close_store import CloseStore
+# instrument-table with meta-data and its filter index
+from instrument_meta import (InstrumentIndex, build_instruments_with_meta_data, load_instruments_with_meta_data,
+                             save_instruments_with_meta_data)
+# stock prices of many instruments aligned on a shared date index
+from price_panel import PricePanel
+# vectorized eps-screens
+from eps_screen import YEAR_LAG, eps_acceleration, eps_growth, pack_eps
+# point-in-time backtest of the eps-acceleration signal
+from eps_backtest import FORWARD_HORIZONS, backtest_statistics, eps_acceleration_events
+# cache of financial reports
+from reports_cache import ReportsCache
+# stored breadth time series
+from breadth_history import BreadthHistory, group_percent_history
+# technical indicators and screen expressions over the whole price history
+from indicators import IndicatorEngine
+# streaming moving-averages for today's breadth
+from rolling_state import RollingMAState
+# checkpoint of an unfinished sweep of moving-average top-ups
+from sweep_journal import SweepJournal
+# cached kpi histories as an instruments x years x kpis array
+from kpi_engine import KpiCache, KpiCube
+# multi-horizon returns and relative-strength ranking
+from momentum import HORIZONS, RS_WEIGHTS, horizon_returns, percentile_ranks, rs_score, top_k, top_k_by_group
+# api call, phase and cache statistics of a run
+from instrumentation import Instrumentation, InstrumentedApi, screener
+# screener outputs written to one workbook and parquet/csv in a background thread
+from export_pipeline import ExportPipeline
+# single-flight ttl/lru memoization of the api calls
+from memo_api import MemoizedApi
 # pandas is a data-analysis library for python (data frames)
 import pandas as pd
-# matplotlib for visual-presentations (plots)
-import matplotlib.pylab as plt
 # datetime for date- and time-stuff
 import datetime as dt
 # user constants
@@ -12,61 +44,143 @@ import constants as constants
 import numpy as np
 import os
 
-# pandas options for string representation of data frames (print)
-pd.set_option('display.max_columns', None)
-pd.set_option('display.max_rows', None)
+# countries used by the nordic-wide screeners
+NORDIC_COUNTRIES = ['Sverige', 'Norge', 'Finland', 'Danmark']
+# instruments topped up between saves of the moving-average state, the journal only lists saved instruments
+MA_STATE_SAVE_EVERY = 200
+
+
+def set_display_options():
+    """
+    pandas options for string representation of data frames (print), set by the scripts printing
+    screener results (not on import)
+    """
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.max_rows', None)
+
 
 class BorsdataClient:
-    def __init__(self):
-        self._borsdata_api = BorsdataAPI(constants.API_KEY)
+    def __init__(self, borsdata_api=None, cache_path=None, calls_per_second=10, instrumentation=None, refresh=True,
+                 compact_prices=False, memo_policies=None, exports=None):
+        """
+        :param borsdata_api: BorsdataAPI-object, default one created with constants.API_KEY
+                             (e.g. a FakeBorsdataAPI for running without the api)
+        :param cache_path: root directory of the local caches, default constants.CACHE_PATH (or file_cache/)
+        :param calls_per_second: max api calls per second, default 10 (borsdata's quota)
+        :param instrumentation: Instrumentation collecting the run statistics, default a new one
+                                (e.g. Instrumentation(profile=['sector_breadth']) to profile a screener)
+        :param refresh: False to use the cached prices, reports and moving-average state as they are, without
+                        topping them up (e.g. in worker processes after a RunPlanner has prefetched the data)
+        :param compact_prices: True to build close-only price panels from a float32 memory-mapped store of the
+                               whole universe instead of the per-instrument price files
+        :param memo_policies: dict of endpoint -> (ttl seconds, max entries) for the api memoization, merged into
+                              memo_api.ENDPOINT_POLICIES
+        :param exports: ExportPipeline for the screeners' file exports, default one writing file_exports/screeners.xlsx
+                        and a parquet- and csv-file per output
+        """
+        borsdata_api = borsdata_api if borsdata_api is not None else BorsdataAPI(constants.API_KEY)
+        # every api call is timed per endpoint, see self.instrumentation.summary()
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        # the api-object as given, e.g. handed to worker processes
+        self._raw_api = borsdata_api
+        # identical calls (also concurrent ones) are made once and kept per endpoint for a while, only the
+        # calls reaching the api are counted in the instrumentation
+        self._borsdata_api = MemoizedApi(InstrumentedApi(borsdata_api, self.instrumentation), memo_policies)
+        # bulk calls (prices, reports) run concurrently within the api's request quota
+        self._fetcher = ApiFetcher(self._borsdata_api, calls_per_second=calls_per_second, burst=calls_per_second)
         self._instruments_with_meta_data = pd.DataFrame()
+        self._instrument_index = None
+        # the exports of the run are written in the background, see close()
+        self.exports = exports if exports is not None else ExportPipeline('file_exports/')
+        # root directory of the local caches
+        self._cache_path = cache_path if cache_path is not None else getattr(constants, 'CACHE_PATH', 'file_cache/')
+        # stock prices are read from the local cache, only new days are fetched from the api
+        self._refresh = refresh
+        self._price_cache = PriceCache(self._fetcher, os.path.join(self._cache_path, 'prices'),
+                                       max_age=None if refresh else dt.timedelta.max)
+        # financial reports change at most quarterly, they are kept until a newer report shows up
+        self._reports_cache = ReportsCache(self._fetcher, os.path.join(self._cache_path, 'reports'),
+                                           recheck_after=dt.timedelta(days=1) if refresh else dt.timedelta.max)
+        # close-only panels from the compact store (the price files are still used for single instruments)
+        self._close_store = CloseStore(self._fetcher, os.path.join(self._cache_path, 'closes')) \
+            if compact_prices else None
+        # kpi histories are fetched again once a day
+        self._kpi_cache = KpiCache(self._fetcher, os.path.join(self._cache_path, 'kpis'),
+                                   max_age=dt.timedelta(days=1) if refresh else dt.timedelta.max)
+        self.instrumentation.register_cache('prices', self._price_cache)
+        self.instrumentation.register_cache('reports', self._reports_cache)
+        self.instrumentation.register_cache('kpis', self._kpi_cache)
+        self.instrumentation.register_cache('api', self._borsdata_api)
+        # calls failing after the retries are reported in the summary instead of stopping the run
+        self.instrumentation.register_failures(self._fetcher)
+        # price panel shared by the screeners during a run
+        self._price_panel = None
+        # indicators of the last universe screened with expressions, (key, IndicatorEngine)
+        self._indicator_engine = None
+        # streaming moving-averages and the instruments already topped up during this run
+        self._ma_state = None
+        self._ma_state_checked = set()
+        # instruments topped up by an unfinished moving-average sweep (e.g. one that crashed)
+        self._ma_journal = SweepJournal(os.path.join(self._cache_path, 'rolling_ma_state.journal'))
+
+    def close(self):
+        """
+        waits for the exports of the run and saves the workbook
+        """
+        self.exports.close()
+
+    @property
+    def cache_path(self):
+        return self._cache_path
+
+    @property
+    def compact_prices(self):
+        return self._close_store is not None
+
+    def prefetch(self, prices=(), latest_prices=(), reports=(), windows=(20, 50, 200), kpi_histories=(),
+                 price_frames=()):
+        """
+        fills the caches for several screeners at once, each kind in one concurrent batch
+        :param prices: ins_ids needing their full price history (price panels, plots)
+        :param latest_prices: ins_ids needing today's moving-average state (breadth)
+        :param reports: ins_ids needing their reports
+        :param windows: moving-average windows of the state
+        :param kpi_histories: (kpi, ins_id) pairs needing their year/mean kpi history
+        :param price_frames: ins_ids read as single price frames from the price cache (plots, P/E, index),
+                             also when the panels come from the compact store
+        """
+        with self.instrumentation.phase('fetch'):
+            # full histories first, the moving-average state then takes the new days from them
+            if self._close_store is not None:
+                self._close_store.update(prices)
+                self._price_cache.get_prices_many(price_frames)
+            else:
+                self._price_cache.get_prices_many(list(dict.fromkeys(list(prices) + list(price_frames))))
+            if len(latest_prices) > 0:
+                self._rolling_ma_flags(latest_prices, windows)
+            self._reports_cache.get_reports_many(reports)
+            kpi_ins_ids = {}
+            for kpi, ins_id in kpi_histories:
+                kpi_ins_ids.setdefault(int(kpi), []).append(int(ins_id))
+            for kpi, ins_ids in kpi_ins_ids.items():
+                self._kpi_cache.get_histories([kpi], ins_ids)
 
     def instruments_with_meta_data(self):
         """
-        creating a csv and xlsx of the APIs instrument-data (including meta-data)
-        and saves it to path defined in constants (default ../file_exports/)
+        instrument-data (including meta-data) of the API, market, country, sector and branch
+        are categorical columns. the table is stored in the cache directory and rebuilt once a day
         :return: pd.DataFrame of instrument-data with meta-data
         """
         if len(self._instruments_with_meta_data) > 0:
             return self._instruments_with_meta_data
         else:
-            self._borsdata_api = BorsdataAPI(constants.API_KEY)
-            # fetching data from api
-            countries = self._borsdata_api.get_countries()
-            branches = self._borsdata_api.get_branches()
-            sectors = self._borsdata_api.get_sectors()
-            markets = self._borsdata_api.get_markets()
-            instruments = self._borsdata_api.get_instruments()
-            # instrument type dict for conversion (https://github.com/Borsdata-Sweden/API/wiki/Instruments)
-            instrument_type_dict = {0: 'Aktie', 1: 'Pref', 2: 'Index', 3: 'Stocks2', 4: 'SectorIndex',
-                                    5: 'BranschIndex', 8: 'SPAC', 13: 'Index GI'}
-            # creating an empty dataframe
-            instrument_df = pd.DataFrame()
-            # loop through the whole dataframe (table) i.e. row-wise-iteration.
-            for index, instrument in instruments.iterrows():
-                ins_id = index
-                name = instrument['name']
-                ticker = instrument['ticker']
-                isin = instrument['isin']
-                # locating meta-data in various ways
-                # dictionary-lookup
-                instrument_type = instrument_type_dict[instrument['instrument']]
-                # .loc locates the rows where the criteria (inside the brackets, []) is fulfilled
-                # located rows (should be only one) get the column 'name' and return its value-array
-                # take the first value in that array ([0], should be only one value)
-                market = markets.loc[markets.index == instrument['marketId']]['name'].values[0]
-                country = countries.loc[countries.index == instrument['countryId']]['name'].values[0]
-                sector = 'N/A'
-                branch = 'N/A'
-                # index-typed instruments does not have a sector or branch
-                if market.lower() != 'index':
-                    sector = sectors.loc[sectors.index == instrument['sectorId']]['name'].values[0]
-                    branch = branches.loc[branches.index == instrument['branchId']]['name'].values[0]
-                # appending current data to dataframe, i.e. adding a row to the table.
-                df_temp = pd.DataFrame([{'name': name, 'ins_id': ins_id, 'ticker': ticker, 'isin': isin,
-                                         'instrument_type': instrument_type,
-                                         'market': market, 'country': country, 'sector': sector, 'branch': branch}])
-                instrument_df = pd.concat([instrument_df, df_temp], ignore_index=True)
+            file_path = os.path.join(self._cache_path, 'instruments_with_meta_data.pkl')
+            with self.instrumentation.phase('fetch'):
+                instrument_df = load_instruments_with_meta_data(file_path)
+                if instrument_df is None:
+                    # fetching data from api and joining the meta-data
+                    instrument_df = build_instruments_with_meta_data(self._borsdata_api)
+                    save_instruments_with_meta_data(instrument_df, file_path)
             """
             # create directory if it do not exist
             if not os.path.exists(constants.EXPORT_PATH):
@@ -81,8 +195,48 @@ class BorsdataClient:
             excel_writer.save()
             """
             self._instruments_with_meta_data = instrument_df
+            self._instrument_index = InstrumentIndex(instrument_df)
             return instrument_df
 
+    def filter_instruments(self, exclude=None, **criteria):
+        """
+        instruments matching all criteria, looked up in the filter index
+        :param exclude: dict of column -> value(s) to leave out, e.g. {'market': ['Spotlight', 'NGM']}
+        :param criteria: market, country, sector and/or branch as a value or a list of values
+        :return: pd.DataFrame of instrument-data with meta-data
+        """
+        self.instruments_with_meta_data()
+        return self._instrument_index.select(exclude, **criteria)
+
+    def price_panel(self, ins_ids, fields=('close',)):
+        """
+        stock prices for ins_ids as a PricePanel. the panel is built once and shared by all
+        screeners, it is only rebuilt when instruments or fields are missing
+        :param ins_ids: instrument ids
+        :param fields: price columns to include, default only close
+        :return: PricePanel (instruments without stock prices are left out)
+        """
+        ins_ids = [int(ins_id) for ins_id in ins_ids]
+        if self._close_store is not None and set(fields) <= {'close'}:
+            # the compact store is shared by all screeners as it is
+            if self._refresh:
+                with self.instrumentation.phase('fetch'):
+                    self._close_store.update(ins_ids)
+            return self._close_store.panel(ins_ids)
+        panel = self._price_panel
+        if panel is None or not set(fields) <= set(panel.fields) or not all(ins_id in panel for ins_id in ins_ids):
+            if panel is not None:
+                # keeping what is already loaded so the panel keeps covering the earlier screeners
+                ins_ids_all = list(dict.fromkeys(list(panel.ins_ids) + ins_ids))
+                fields = list(dict.fromkeys(panel.fields + list(fields)))
+            else:
+                ins_ids_all = ins_ids
+            with self.instrumentation.phase('fetch'):
+                frames = self._price_cache.get_prices_many(ins_ids_all)
+            self._price_panel = PricePanel.from_frames(frames, fields)
+        return self._price_panel.subset(ins_ids)
+
+    @screener
     def plot_stock_prices(self, ins_id):
         """
         Plotting a matplotlib chart for ins_id
@@ -91,12 +245,15 @@ class BorsdataClient:
         """
         # creating api-object
         # using api-object to get stock prices from API
-        stock_prices = self._borsdata_api.get_instrument_stock_prices(ins_id)
+        with self.instrumentation.phase('fetch'):
+            stock_prices = self._price_cache.get_prices(ins_id)
         # calculating/creating a new column named 'sma50' in the table and
         # assigning the 50 day rolling mean to it
         stock_prices['sma50'] = stock_prices['close'].rolling(window=50).mean()
         # filtering out data after 2015 for plot
         filtered_data = stock_prices[stock_prices.index > dt.datetime(2015, 1, 1)]
+        # matplotlib for visual-presentations (plots), only imported by the screeners that plot
+        import matplotlib.pylab as plt
         # plotting 'close' (with 'date' as index)
         plt.plot(filtered_data['close'], color='blue', label='close')
         # plotting 'sma50' (with 'date' as index)
@@ -104,8 +261,10 @@ class BorsdataClient:
         # show legend
         plt.legend()
         # show plot
-        plt.show()
+        with self.instrumentation.phase('export'):
+            plt.show()
 
+    @screener
     def top_performers(self, market, country, number_of_stocks=5, percent_change=1):
         """
         function that prints top performers for given parameters in the terminal
@@ -116,120 +275,207 @@ class BorsdataClient:
         :return: pd.DataFrame
         """
         # creating api-object
-        # using defined function above to retrieve dataframe of all instruments
-        instruments = self.instruments_with_meta_data()
         # filtering out the instruments with correct market and country
-        filtered_instruments = instruments.loc[(instruments['market'] == market) & (instruments['country'] == country)]
-        # creating new, empty dataframe
-        stock_prices = pd.DataFrame()
-        # looping through all rows in filtered dataframe
-        for index, instrument in filtered_instruments.iterrows():
-            # fetching the stock prices for the current instrument
-            instrument_stock_price = self._borsdata_api.get_instrument_stock_prices(int(instrument['ins_id']))
-            instrument_stock_price.sort_index(inplace=True)
-            # calculating the current instruments percent change
-            instrument_stock_price['pct_change'] = instrument_stock_price['close'].pct_change(percent_change)
-            # getting the last row of the dataframe, i.e. the last days values
-            last_row = instrument_stock_price.iloc[[-1]]
-            # appending the instruments name and last days percent change to new dataframe
-            df_temp = pd.DataFrame([{'stock': instrument['name'], 'pct_change': round(last_row['pct_change'].values[0] * 100, 2)}])
-            stock_prices = pd.concat([stock_prices, df_temp], ignore_index=True)
-        # printing the top sorted by pct_change-column
-        print(stock_prices.sort_values('pct_change', ascending=False).head(number_of_stocks))
+        filtered_instruments = self.filter_instruments(market=market, country=country)
+        # percent change up to the last day for all instruments at once
+        panel = self.price_panel(filtered_instruments['ins_id'].values)
+        pct_change = panel.last_returns(percent_change)
+        rows = panel.rows(filtered_instruments['ins_id'].values)
+        stock_prices = pd.DataFrame({'stock': filtered_instruments['name'].values[rows >= 0],
+                                     'pct_change': np.round(pct_change * 100, 2)})
+        # printing the top (partial sort, only the top is sorted)
+        print(stock_prices.iloc[top_k(stock_prices['pct_change'].values, number_of_stocks)])
         return stock_prices
 
+    @screener
+    def momentum(self, countries=NORDIC_COUNTRIES, horizons=HORIZONS, weights=RS_WEIGHTS, group_by=None,
+                 number_of_stocks=10, exclude=None):
+        """
+        returns over several horizons and a relative-strength score for the whole universe in one pass
+        over the price panel. prints the top instruments, overall or within every group
+        :param countries: countries to include, default the nordic countries
+        :param horizons: dict of horizon name -> trading days, default 1w, 1m, 3m, 6m and 12m
+        :param weights: dict of horizon name -> weight in the rs-score
+        :param group_by: None, 'market', 'sector' or 'branch', ranks (and prints the top) within every group
+        :param number_of_stocks: number of stocks to print (per group)
+        :param exclude: dict of column -> value(s) to leave out, e.g. {'market': ['Spotlight', 'NGM']}
+        :return: pd.DataFrame with one row per instrument, sorted on rs
+        """
+        filtered_instruments = self.filter_instruments(exclude, country=countries)
+        # index-typed instruments (without a sector) are not ranked
+        filtered_instruments = filtered_instruments[filtered_instruments['sector'] != 'N/A']
+        panel = self.price_panel(filtered_instruments['ins_id'].values)
+        # instruments without prices are not in the panel, the others are in the same order
+        filtered_instruments = filtered_instruments[panel.rows(filtered_instruments['ins_id'].values) >= 0]
+        returns = horizon_returns(panel, horizons)
+        weighted, rs = rs_score(returns, horizons, weights)
+        momentum_df = filtered_instruments[['ins_id', 'name', 'market', 'sector', 'branch']].reset_index(drop=True)
+        for column, horizon in enumerate(horizons):
+            momentum_df[f'return_{horizon}'] = np.round(returns[:, column] * 100, 2)
+        momentum_df['rs'] = rs
+        if group_by is None:
+            print(momentum_df.iloc[top_k(weighted, number_of_stocks)])
+        else:
+            groups = momentum_df[group_by].astype(str).values
+            momentum_df[f'rs_{group_by}'] = percentile_ranks(weighted, groups)
+            for group, positions in top_k_by_group(weighted, groups, number_of_stocks).items():
+                if len(positions) > 0:
+                    print(f'\n{group}')
+                    print(momentum_df.iloc[positions])
+        # sorted on the weighted return (ties in rs keep their order), instruments without a score last
+        return momentum_df.iloc[np.argsort(-weighted, kind='stable')]
+
+    def indicator_engine(self, ins_ids):
+        """
+        IndicatorEngine over the price panel of ins_ids, reused (with the indicators it has computed)
+        as long as the instruments and the dates are the same
+        :param ins_ids: instrument ids
+        :return: IndicatorEngine (instruments without stock prices are left out)
+        """
+        panel = self.price_panel(ins_ids)
+        key = (tuple(int(ins_id) for ins_id in panel.ins_ids), len(panel.dates),
+               panel.dates[-1] if len(panel.dates) > 0 else None)
+        if self._indicator_engine is None or self._indicator_engine[0] != key:
+            self._indicator_engine = (key, IndicatorEngine(panel))
+        return self._indicator_engine[1]
+
+    @screener
+    def expression_screen(self, expression, rank_by=None, number_of_stocks=10, countries=NORDIC_COUNTRIES,
+                          exclude=None, columns=()):
+        """
+        instruments meeting a condition on the last date, the condition is an expression over the
+        indicators of IndicatorEngine, e.g. '(dist_high252 > -0.05) & (sma50 > sma200)'
+        :param expression: condition, True for the instruments to keep
+        :param rank_by: expression to sort the instruments on (highest first), e.g. 'return63', default none
+        :param number_of_stocks: number of stocks to print
+        :param countries: countries to include, default the nordic countries
+        :param exclude: dict of column -> value(s) to leave out, e.g. {'market': ['Spotlight', 'NGM']}
+        :param columns: more expressions to include as columns, e.g. ('dist_high252', 'return21')
+        :return: pd.DataFrame with one row per instrument meeting the condition
+        """
+        filtered_instruments = self.filter_instruments(exclude, country=countries)
+        engine = self.indicator_engine(filtered_instruments['ins_id'].values)
+        # instruments without prices are not in the panel, the others are in the same order
+        filtered_instruments = filtered_instruments[engine.panel.rows(filtered_instruments['ins_id'].values) >= 0]
+        screen_df = filtered_instruments[['ins_id', 'name', 'market', 'sector', 'branch']].reset_index(drop=True)
+        for column in ([rank_by] if rank_by is not None else []) + [column for column in columns if column != rank_by]:
+            screen_df[column] = engine.last(column)
+        screen_df = screen_df[np.asarray(engine.last(expression), dtype=bool)].reset_index(drop=True)
+        if rank_by is None:
+            print(screen_df.head(number_of_stocks))
+            return screen_df
+        # printing the top (partial sort, only the top is sorted)
+        print(screen_df.iloc[top_k(screen_df[rank_by].values.astype(float), number_of_stocks)])
+        return screen_df.iloc[np.argsort(-screen_df[rank_by].values.astype(float), kind='stable')]
+
+    @screener
+    def expression_breadth(self, conditions, group_by=('market', 'sector', 'branch'), countries=NORDIC_COUNTRIES):
+        """
+        daily percent of the listed instruments meeting conditions per group, e.g.
+        {'new high': 'new_high252', 'near high': 'dist_high252 > -0.05', 'EMA20': 'close > ema20'}
+        :param conditions: dict of label -> expression over the indicators of IndicatorEngine
+        :param group_by: meta-data columns to group on
+        :param countries: countries to include, default the nordic countries
+        :return: pd.DataFrame with date as index and (group_column, group, label) as columns
+        """
+        filtered_instruments = self.filter_instruments(country=countries)
+        engine = self.indicator_engine(filtered_instruments['ins_id'].values)
+        # meta-data in the same order as the panel's rows
+        instruments = filtered_instruments.set_index('ins_id').loc[engine.panel.ins_ids]
+        group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+        return group_percent_history(engine.panel, instruments, conditions, group_by, engine)
+
+    @screener
+    def market_internals(self, countries=NORDIC_COUNTRIES, market=None, days=10):
+        """
+        daily advances, declines, advance/decline-line, 52-week new highs and lows, mcclellan oscillator
+        and summation index and percent above ma50 and ma200 for the universe
+        :param countries: countries to include, default the nordic countries
+        :param market: market or list of markets, default all
+        :param days: number of days to print
+        :return: pd.DataFrame with date as index
+        """
+        criteria = {'country': countries} if market is None else {'country': countries, 'market': market}
+        # index-typed instruments are not part of the advances and declines
+        engine = self.indicator_engine(self.filter_instruments({'sector': ['N/A']}, **criteria)['ins_id'].values)
+        internals = engine.frame(['advances', 'declines', 'ad_line', 'new_highs', 'new_lows', 'mcclellan',
+                                  'summation'])
+        internals['% > MA50'] = engine.percent('close > sma50')
+        internals['% > MA200'] = engine.percent('close > sma200')
+        print(internals.tail(days).round(2))
+        return internals
+
+    @screener
+    def breadth(self, markets, windows=(20, 50, 200), country='Sverige'):
+        """
+        calculates the breadth (percent of stocks above moving-average) for several markets and
+        moving-average windows at once, every instrument's prices are fetched only once
+        :param markets: list of markets e.g. ['Large Cap', 'Mid Cap']
+        :param windows: moving-average windows, default (20, 50, 200)
+        :param country: which country to search in, default 'Sverige'
+        :return: dict of market -> list of breadth (int percent, None if the market is empty), one per window
+        """
+        # filtering out the instruments for all markets in one go
+        flags = self._breadth_flags(self.filter_instruments(market=markets, country=country), windows)
+        group_breadth = self._group_breadth(flags, 'market', windows).set_index('market')
+        market_breadth = {}
+        for market in markets:
+            if market in group_breadth.index:
+                market_breadth[market] = [int(group_breadth.loc[market, f'% > MA{window}']) for window in windows]
+            else:
+                market_breadth[market] = [None] * len(windows)
+        return market_breadth
+
+    @screener
     def market_breadth_50(self, market):
         """
         function that prints breadth of specified market and cuntry
         :param market: which market to search in e.g. 'Large Cap'
         """
-        # creating api-object
-        # using defined function above to retrieve dataframe of all instruments
-        instruments = self.instruments_with_meta_data()
-        # filtering out the instruments with correct market
-        filtered_instruments = instruments.loc[(instruments['market'] == market) & (instruments['country'] == 'Sverige')]
-        # creating new, empty dataframe
-        stock_prices = pd.DataFrame()
-        # looping through all rows in filtered dataframe
-        for index, instrument in filtered_instruments.iterrows():
-            # fetching the stock prices for the current instrument
-            instrument_stock_price = self._borsdata_api.get_instrument_stock_prices(int(instrument['ins_id']))
-            instrument_stock_price.sort_index(inplace=True)
-            # using numpy's where function to create a 1 if close > ma50, else a 0
-            instrument_stock_price[f'above_ma50'] = np.where(
-                instrument_stock_price['close'] > instrument_stock_price['close'].rolling(window=50).mean(), 1, 0)
-            # getting the last row of the dataframe, i.e. the last days values
-            last_row = instrument_stock_price.iloc[[-1]]
-            # appending the instruments name and value to new dataframe
-            df_temp = pd.DataFrame([{'stock': instrument['name'], 'above_ma50': last_row['above_ma50'].values[0]}])
-            df_temp = df_temp.loc[(df_temp['above_ma50'] == 1)]
-            stock_prices = pd.concat([stock_prices, df_temp], ignore_index=True)
-            breadth = int(len(stock_prices)/len(filtered_instruments) * 100)
+        breadth = self.breadth([market], windows=(50,))[market][0]
         print(breadth)
         return breadth
 
+    @screener
     def market_breadth(self, market):
-        instruments = self._instruments_with_meta_data
-        # filtering out the instruments with correct market
-        filtered_instruments = instruments.loc[(instruments['market'] == market) & (instruments['country'] == 'Sverige')]
-        # creating new, empty dataframe
-        stock_prices = pd.DataFrame()
-        stock_prices2 = pd.DataFrame()
-        stock_prices3 = pd.DataFrame()
-        # looping through all rows in filtered dataframe
-        for index, instrument in filtered_instruments.iterrows():
-            # fetching the stock prices for the current instrument
-            instrument_stock_price = self._borsdata_api.get_instrument_stock_prices(int(instrument['ins_id']))
-            instrument_stock_price.sort_index(inplace=True)
-            # using numpy's where function to create a 1 if close > ma50, else a 0
-            instrument_stock_price[f'above_ma50'] = np.where(
-                instrument_stock_price['close'] > instrument_stock_price['close'].rolling(window=20).mean(), 1, 0)
-            # getting the last row of the dataframe, i.e. the last days values
-            last_row = instrument_stock_price.iloc[[-1]]
-            # appending the instruments name and value to new dataframe
-            df_temp = pd.DataFrame([{'stock': instrument['name'], 'above_ma50': last_row['above_ma50'].values[0]}])
-            df_temp = df_temp.loc[(df_temp['above_ma50'] == 1)]
-            stock_prices = pd.concat([stock_prices, df_temp], ignore_index=True)
-            breadth = int(len(stock_prices)/len(filtered_instruments) * 100)
-        for index, instrument in filtered_instruments.iterrows():
-            # fetching the stock prices for the current instrument
-            instrument_stock_price2 = self._borsdata_api.get_instrument_stock_prices(int(instrument['ins_id']))
-            instrument_stock_price2.sort_index(inplace=True)
-            # using numpy's where function to create a 1 if close > ma50, else a 0
-            instrument_stock_price2[f'above_ma50'] = np.where(
-                instrument_stock_price2['close'] > instrument_stock_price2['close'].rolling(window=50).mean(), 1, 0)
-            # getting the last row of the dataframe, i.e. the last days values
-            last_row2 = instrument_stock_price2.iloc[[-1]]
-            # appending the instruments name and value to new dataframe
-            df_temp2 = pd.DataFrame([{'stock': instrument['name'], 'above_ma50': last_row2['above_ma50'].values[0]}])
-            df_temp2 = df_temp2.loc[(df_temp2['above_ma50'] == 1)]
-            stock_prices2 = pd.concat([stock_prices2, df_temp2], ignore_index=True)
-            breadth2 = int(len(stock_prices2)/len(filtered_instruments) * 100)
-        for index, instrument in filtered_instruments.iterrows():
-            # fetching the stock prices for the current instrument
-            instrument_stock_price3 = self._borsdata_api.get_instrument_stock_prices(int(instrument['ins_id']))
-            instrument_stock_price3.sort_index(inplace=True)
-            # using numpy's where function to create a 1 if close > ma50, else a 0
-            instrument_stock_price3[f'above_ma50'] = np.where(
-                instrument_stock_price3['close'] > instrument_stock_price3['close'].rolling(window=200).mean(), 1, 0)
-            # getting the last row of the dataframe, i.e. the last days values
-            last_row3 = instrument_stock_price3.iloc[[-1]]
-            # appending the instruments name and value to new dataframe
-            df_temp3 = pd.DataFrame([{'stock': instrument['name'], 'above_ma50': last_row3['above_ma50'].values[0]}])
-            df_temp3 = df_temp3.loc[(df_temp3['above_ma50'] == 1)]
-            stock_prices3 = pd.concat([stock_prices3, df_temp3], ignore_index=True)
-            breadth3 = int(len(stock_prices3)/len(filtered_instruments) * 100)
-        return [breadth, breadth2, breadth3]
+        """
+        breadth of specified market (Sverige) for moving-average 20, 50 and 200
+        :param market: which market to search in e.g. 'Large Cap'
+        :return: list of [breadth20, breadth50, breadth200]
+        """
+        return self.breadth([market])[market]
 
+    @screener
     def market_breadth_to_excel(self):
-        self.instruments_with_meta_data()
-        large_cap = self.market_breadth('Large Cap')
-        mid_cap = self.market_breadth('Mid Cap')
-        small_cap = self.market_breadth('Small Cap')
-        first_north = self.market_breadth('First North')
-        excel_export=ExcelWriter(large_cap, mid_cap, small_cap, first_north)
-        excel_export.export_file()
-        
+        """
+        breadth of the four markets (Sverige) for moving-average 20, 50 and 200, exported as market-breadth
+        :return: pd.DataFrame with one row per market
+        """
+        windows = (20, 50, 200)
+        # all four markets in one sweep
+        markets = self.breadth(['Large Cap', 'Mid Cap', 'Small Cap', 'First North'], windows)
+        market_breadth = pd.DataFrame.from_dict(markets, orient='index',
+                                                columns=[f'% > MA{window}' for window in windows])
+        market_breadth.index.name = 'market'
+        with self.instrumentation.phase('export'):
+            self.exports.submit('market-breadth', market_breadth)
+        return market_breadth
+
+    def kpi_cube(self, kpis, ins_ids, report_type='year', price_type='mean'):
+        """
+        kpi histories for many kpis and instruments as one array, from the kpi cache (the missing
+        histories are fetched concurrently)
+        :param kpis: kpi ids see https://github.com/Borsdata-Sweden/API/wiki/KPI-History
+        :param ins_ids: instrument ids
+        :param report_type: 'year', 'r12' or 'quarter'
+        :param price_type: calculation e.g. 'mean', 'high' or 'low'
+        :return: KpiCube (instruments x years x kpis)
+        """
+        with self.instrumentation.phase('fetch'):
+            histories = self._kpi_cache.get_histories(kpis, ins_ids, report_type, price_type)
+        return KpiCube.from_histories(histories, ins_ids)
+
+    @screener
     def history_kpi(self, kpi, market, country, year):
         """
         gathers and concatenates historical kpi-values for provided kpi, market and country
@@ -239,172 +485,225 @@ class BorsdataClient:
         :param year: year for terminal print of kpi-values
         :return: pd.DataFrame of historical kpi-values
         """
-        # creating api-object
-        # using defined function above to retrieve data frame of all instruments
-        instruments = self.instruments_with_meta_data()
         # filtering out the instruments with correct market and country
-        filtered_instruments = instruments.loc[(instruments['market'] == market) & (instruments['country'] == country)]
-        # creating empty array (to hold data frames)
-        frames = []
-        # looping through all rows in filtered data frame
-        for index, instrument in filtered_instruments.iterrows():
-            # fetching the stock prices for the current instrument
-            instrument_kpi_history = self._borsdata_api.get_kpi_history(int(instrument['ins_id']), kpi, 'year', 'mean')
-            # check to see if response holds any data.
-            if len(instrument_kpi_history) > 0:
-                # resetting index and adding name as a column
-                instrument_kpi_history.reset_index(inplace=True)
-                instrument_kpi_history.set_index('year', inplace=True)
-                instrument_kpi_history['name'] = instrument['name']
-                # appending data frame to array
-                frames.append(instrument_kpi_history.copy())
-        # creating concatenated data frame with concat
-        symbols_df = pd.concat(frames)
+        filtered_instruments = self.filter_instruments(market=market, country=country)
+        cube = self.kpi_cube([kpi], filtered_instruments['ins_id'].values)
+        # float32 in the cube, float64 in the output
+        kpi_values = cube.kpi(kpi).astype(float)
+        # one row per instrument and year with a value
+        rows, columns = np.nonzero(~np.isnan(kpi_values))
+        symbols_df = pd.DataFrame({'period': 5,
+                                   'kpiValue': kpi_values[rows, columns],
+                                   'name': filtered_instruments['name'].values[rows]},
+                                  index=pd.Index(cube.years[columns], name='year'))
         # the data frame has the columns ['year', 'period', 'kpi_value', 'name']
         # show year ranked from highest to lowest, show top 5
-        print(symbols_df[symbols_df.index == year].sort_values('kpiValue', ascending=False).head(5))
+        year_values = cube.year(year)[:, 0].astype(float)
+        print(pd.DataFrame({'kpiValue': year_values, 'name': filtered_instruments['name'].values},
+                           index=pd.Index(np.full(len(year_values), year), name='year')).iloc[top_k(year_values, 5)])
         return symbols_df
-    
+
+    @screener
+    def kpi_screen(self, kpis, lower_is_better=(), year=None, number_of_stocks=10, countries=NORDIC_COUNTRIES,
+                   market=None):
+        """
+        ranks the instruments on several kpis at once, every kpi is ranked as a percentile among the
+        instruments for every year and the score is the mean rank over the kpis
+        :param kpis: kpi ids, e.g. [2, 33] for P/E and ROE
+        :param lower_is_better: kpis where the lowest value is the best (e.g. 2, P/E)
+        :param year: year to print the top instruments for, default the last year
+        :param number_of_stocks: number of stocks to print
+        :param countries: countries to search in, default the nordic countries
+        :param market: market(s) to search in, default all
+        :return: pd.DataFrame of the score per instrument (rows) and year (columns)
+        """
+        criteria = {'country': countries} if market is None else {'country': countries, 'market': market}
+        filtered_instruments = self.filter_instruments(**criteria)
+        filtered_instruments = filtered_instruments[filtered_instruments['sector'] != 'N/A']
+        cube = self.kpi_cube(kpis, filtered_instruments['ins_id'].values)
+        score = cube.score(lower_is_better)
+        if len(cube.years) == 0:
+            return pd.DataFrame(index=filtered_instruments['name'].values)
+        if year is not None and year not in cube.years:
+            raise ValueError(f"kpi_screen >> no kpi-values for {year}, years {cube.years[0]}-{cube.years[-1]}")
+        column = len(cube.years) - 1 if year is None else int(np.flatnonzero(cube.years == year)[0])
+        year_df = pd.DataFrame({'name': filtered_instruments['name'].values, 'score': score[:, column]})
+        for index, kpi in enumerate(cube.kpis):
+            # float32 in the cube, float64 in the output
+            year_df[f'kpi_{kpi}'] = cube.values[:, column, index].astype(float)
+        print(f'year {cube.years[column]}')
+        print(year_df.iloc[top_k(score[:, column], number_of_stocks)])
+        return pd.DataFrame(score, index=filtered_instruments['name'].values, columns=cube.years)
+
+    @screener
     def get_latest_pe(self, ins_id):
             """
             Prints the PE-ratio of the provided instrument id
             :param ins_id: ins_id which PE-ratio will be calculated for
-            :return:
+            :return: PE-ratio, None if the instrument is unknown or its reports or prices could not be fetched
             """
-            # creating api-object
-            # fetching all instrument data
-            reports_quarter, reports_year, reports_r12 = self._borsdata_api.get_instrument_reports(3)
+            ins_id = int(ins_id)
+            # the name of the ins_id from the instrument-table
+            instruments = self.instruments_with_meta_data()
+            names = instruments.loc[instruments['ins_id'] == ins_id, 'name']
+            if len(names) == 0:
+                print(f"get_latest_pe >> unknown ins_id {ins_id}")
+                return None
+            instrument_name = names.iloc[0]
+            # fetching the reports (from the cache if there is no newer report) and the stock prices,
+            # an instrument that can not be fetched is reported instead of stopping the run
+            with self.instrumentation.phase('fetch'):
+                reports = self._reports_cache.get_reports_many([ins_id])
+                stock_prices = self._price_cache.get_prices_many([ins_id])
+            if ins_id not in reports or ins_id not in stock_prices:
+                failure = self._reports_cache.last_failures.get(ins_id, self._price_cache.last_failures.get(ins_id))
+                print(f"get_latest_pe >> {instrument_name} ({ins_id}) could not be fetched: {failure}")
+                return None
             # getting the last reported eps-value
-            reports_r12.sort_index(inplace=True)
-            #print(reports_r12.tail())
-            last_eps = reports_r12['earningsPerShare'].values[-1]
+            reports_r12 = reports[ins_id][2].sort_index()['earningsPerShare'].dropna()
+            stock_prices = stock_prices[ins_id]['close'].dropna()
+            if len(reports_r12) == 0 or len(stock_prices) == 0:
+                print(f"get_latest_pe >> {instrument_name} ({ins_id}) has no r12 eps or no close")
+                return None
+            last_eps = reports_r12.values[-1]
             print(last_eps)
-            # getting the stock prices
-            stock_prices = self._borsdata_api.get_instrument_stock_prices(ins_id)
-            stock_prices.sort_index(inplace=True)
             # getting the last close
-            last_close = stock_prices['close'].values[-1]
+            last_close = stock_prices.values[-1]
             # getting the last date
             last_date = stock_prices.index.values[-1]
-            # getting instruments data to retrieve the name of the ins_id
-            instruments = self._borsdata_api.get_instruments()
-            instrument_name = instruments[instruments.index == ins_id]['name'].values[0]
             print(instrument_name)
             # printing the name and calculated PE-ratio with the corresponding date. (array slicing, [:10])
             #print(f"PE for {instrument_name} is {round(last_close / last_eps, 1)} with data from {str(last_date)[:10]}")
+            return last_close / last_eps if last_eps != 0 else None
+
+    @screener
+    def eps_acceleration(self, report_type='r12', periods=3, lag=None, positive_base=True, positive_growth=True,
+                         countries=NORDIC_COUNTRIES, exclude_markets=('Spotlight', 'NGM', 'PepMarket')):
+        """
+        prints (and returns) the instruments where the year-on-year eps-growth has accelerated for
+        the last periods reports, e.g. the growth of the latest r12 > the growth of the r12 before > ...
+        :param report_type: 'quarter', 'year' or 'r12'
+        :param periods: number of growths that must accelerate, default 3
+        :param lag: reports between the compared eps-values, default one year (4 for quarter/r12, 1 for year)
+        :param positive_base: require the eps-values the growths are calculated from to be > 0
+        :param positive_growth: require all growths to be > 0
+        :param countries: countries to search in, default the nordic countries
+        :param exclude_markets: markets to leave out
+        :return: pd.DataFrame of instrument_name and the average growth, sorted on the growth
+        """
+        if lag is None:
+            lag = YEAR_LAG[report_type]
+        filtered_instruments = self.filter_instruments(country=countries, exclude={'market': list(exclude_markets)})
+        with self.instrumentation.phase('fetch'):
+            reports = self._reports_cache.get_reports_many(filtered_instruments['ins_id'].values)
+        # instruments whose reports could not be fetched are left out
+        filtered_instruments = filtered_instruments[filtered_instruments['ins_id'].isin(list(reports))]
+        # eps of the whole universe in one array, one row per instrument
+        eps = pack_eps([reports[int(ins_id)] for ins_id in filtered_instruments['ins_id'].values],
+                       report_type, periods + lag)
+        accelerating, growth = eps_acceleration(eps, lag, positive_base, positive_growth)
+        growth_column = f'average_{periods}period_epsgrowth'
+        results_df = pd.DataFrame({'instrument_name': filtered_instruments['name'].values[accelerating],
+                                   growth_column: np.round(growth[accelerating].mean(axis=1)).astype(int)})
+        results_df = results_df.sort_values(by=[growth_column], ascending=False)
+        print(results_df)
+        return results_df
 
+    @screener
+    def eps_acceleration_backtest(self, report_type='r12', periods=3, lag=None, positive_base=True,
+                                  positive_growth=True, countries=NORDIC_COUNTRIES,
+                                  exclude_markets=('Spotlight', 'NGM', 'PepMarket'), horizons=FORWARD_HORIZONS,
+                                  from_year=None):
+        """
+        backtest of the eps_acceleration signal: the condition is evaluated at every historical report of
+        every instrument from the reports published up to then, and the signals are joined with the
+        forward returns from the first trading day after the signal was known. prints hit-rate and
+        return statistics of the signal compared to all reports
+        :param report_type: 'quarter', 'year' or 'r12'
+        :param periods: number of growths that must accelerate, default 3
+        :param lag: reports between the compared eps-values, default one year (4 for quarter/r12, 1 for year)
+        :param positive_base: require the eps-values the growths are calculated from to be > 0
+        :param positive_growth: require all growths to be > 0
+        :param countries: countries to search in, default the nordic countries
+        :param exclude_markets: markets to leave out
+        :param horizons: dict of horizon name -> trading days of the forward returns
+        :param from_year: first year of signals to include, default all
+        :return: (pd.DataFrame of statistics per group and horizon, pd.DataFrame with one row per report)
+        """
+        filtered_instruments = self.filter_instruments(country=countries, exclude={'market': list(exclude_markets)})
+        ins_ids = filtered_instruments['ins_id'].values
+        with self.instrumentation.phase('fetch'):
+            reports = self._reports_cache.get_reports_many(ins_ids)
+        ins_ids = [int(ins_id) for ins_id in ins_ids if int(ins_id) in reports]
+        panel = self.price_panel(ins_ids)
+        events = eps_acceleration_events([reports[ins_id] for ins_id in ins_ids], ins_ids, panel, report_type,
+                                         periods, lag, positive_base, positive_growth, horizons)
+        if from_year is not None:
+            events = events[events['known'].dt.year >= from_year]
+        statistics = backtest_statistics(events, horizons)
+        print(statistics)
+        return statistics, events
+
+    @screener
     def get_eps_accelerationR12(self):
-        instruments = self.instruments_with_meta_data()
-        # filtering out the instruments with correct market and country
-        #filtered_instruments = instruments.loc[(instruments['country'] == 'Finland') | (instruments['country'] == 'Sverige') | (instruments['country'] == 'Norge') | (instruments['country'] == 'Danmark') & (instruments['market'] != 'Spotlight') & (instruments['market'] != 'NGM') & (instruments['market'] != 'PepMarket')]
-        filtered_instruments = instruments.loc[(instruments['market'] != 'Spotlight') & (instruments['market'] != 'NGM') & (instruments['market'] != 'PepMarket') & (instruments['country'] == 'Sverige')]
-        #print(filtered_instruments['ins_id'])
-        results_df = pd.DataFrame(columns=['instrument_name', 'average_3period_epsgrowth'])
-        for index, instrument in filtered_instruments.iterrows():
-             
-            reports_quarter, reports_year, reports_r12 = self._borsdata_api.get_instrument_reports(int(instrument['ins_id']))
-            if len(reports_r12) >= 7:
-                reports_r12.sort_index(inplace=True)
-                r12_diff= ((reports_r12['earningsPerShare'].values[-1]-reports_r12['earningsPerShare'].values[-5])/reports_r12['earningsPerShare'].values[-5])*100
-                previous_r12_diff = ((reports_r12['earningsPerShare'].values[-2]-reports_r12['earningsPerShare'].values[-6])/reports_r12['earningsPerShare'].values[-6])*100
-                previous_previous_r12_fidd = ((reports_r12['earningsPerShare'].values[-3]-reports_r12['earningsPerShare'].values[-7])/reports_r12['earningsPerShare'].values[-7])*100
-
-                if (r12_diff > previous_r12_diff > previous_previous_r12_fidd > 0) & (reports_r12['earningsPerShare'].values[-7] > 0) & (reports_r12['earningsPerShare'].values[-6] > 0) & (reports_r12['earningsPerShare'].values[-5] > 0):
-
-
-                    instruments = self._borsdata_api.get_instruments()
-                    instrument_name = instruments[instruments.index == int(instrument['ins_id'])]['name'].values[0]
-                    results_df = results_df.append({'instrument_name': instrument_name, 'average_3period_epsgrowth': int(round((r12_diff+previous_r12_diff+previous_previous_r12_fidd)/3, 0))}, ignore_index=True)
-            else:
-                pass
-        #return results_df     
-        print(results_df.sort_values(by=['average_3period_epsgrowth'], ascending=False))
+        """
+        eps-acceleration of the r12 reports for Sverige (Spotlight, NGM and PepMarket left out)
+        """
+        return self.eps_acceleration('r12', countries='Sverige')
 
+    @screener
     def get_eps_accelerationQ(self):
-        instruments = self.instruments_with_meta_data()
-        #filtered_instruments = instruments.loc[(instruments['market'] != 'Spotlight') & (instruments['market'] != 'NGM') & (instruments['market'] != 'PepMarket') & (instruments['country'] == 'Sverige')]
-        filtered_instruments = instruments.loc[(instruments['country'] == 'Finland') | (instruments['country'] == 'Sverige') | (instruments['country'] == 'Norge') | (instruments['country'] == 'Danmark') & (instruments['market'] != 'Spotlight') & (instruments['market'] != 'NGM') & (instruments['market'] != 'PepMarket')]
-
-        results_df = pd.DataFrame(columns=['instrument_name', 'average_3period_epsgrowth'])
-        for index, instrument in filtered_instruments.iterrows():
-             
-            reports_quarter, reports_year, reports_r12 = self._borsdata_api.get_instrument_reports(int(instrument['ins_id']))
-            if len(reports_quarter) >= 7:
-                reports_quarter.sort_index(inplace=True)
-                r12_diff= ((reports_quarter['earningsPerShare'].values[-1]-reports_quarter['earningsPerShare'].values[-5])/reports_quarter['earningsPerShare'].values[-5])*100
-                previous_r12_diff = ((reports_quarter['earningsPerShare'].values[-2]-reports_quarter['earningsPerShare'].values[-6])/reports_quarter['earningsPerShare'].values[-6])*100
-                previous_previous_r12_fidd = ((reports_quarter['earningsPerShare'].values[-3]-reports_quarter['earningsPerShare'].values[-7])/reports_quarter['earningsPerShare'].values[-7])*100
-
-                if (r12_diff > previous_r12_diff > previous_previous_r12_fidd > 0) & (reports_quarter['earningsPerShare'].values[-7] > 0) & (reports_quarter['earningsPerShare'].values[-6] > 0) & (reports_quarter['earningsPerShare'].values[-5] > 0):
-
-
-                    instruments = self._borsdata_api.get_instruments()
-                    instrument_name = instruments[instruments.index == int(instrument['ins_id'])]['name'].values[0]
-                    results_df = results_df.append({'instrument_name': instrument_name, 'average_3period_epsgrowth': int(round((r12_diff+previous_r12_diff+previous_previous_r12_fidd)/3, 0))}, ignore_index=True)
-            else:
-                pass
-        #return results_df     
-        print(results_df.sort_values(by=['average_3period_epsgrowth'], ascending=False)) 
+        """
+        eps-acceleration of the quarter reports for the nordic countries (Spotlight, NGM and PepMarket left out)
+        """
+        return self.eps_acceleration('quarter', countries=NORDIC_COUNTRIES)
 
+    @screener
     def get_eps_growth(self):
         """
-        
+        prints the year-on-year growth of the latest and the previous r12 eps, and the growth
+        quarter on quarter, for Large Cap Sverige
+        :return: pd.DataFrame sorted on current_quarter_R12
         """
-        instruments = self.instruments_with_meta_data()
         # filtering out the instruments with correct market and country
-        filtered_instruments = instruments.loc[(instruments['market'] == 'Large Cap') & (instruments['country'] == 'Sverige')]
-        #print(filtered_instruments['ins_id'])
-        results_df = pd.DataFrame(columns=['instrument_name', 'current_quarter_R12', 'previous_quarter_R12', 'quarter_on_quarter'])
-        for index, instrument in filtered_instruments.iterrows():
-             
-            reports_quarter, reports_year, reports_r12 = self._borsdata_api.get_instrument_reports(int(instrument['ins_id']))
-            if len(reports_r12) >= 6:
-                reports_r12.sort_index(inplace=True)
-                r12_diff= ((reports_r12['earningsPerShare'].values[-1]-reports_r12['earningsPerShare'].values[-5])/reports_r12['earningsPerShare'].values[-5])*100
-                previous_r12_diff = ((reports_r12['earningsPerShare'].values[-2]-reports_r12['earningsPerShare'].values[-6])/reports_r12['earningsPerShare'].values[-6])*100
-                q_on_q_diff = ((reports_r12['earningsPerShare'].values[-1]-reports_r12['earningsPerShare'].values[-2])/reports_r12['earningsPerShare'].values[-2])*100
-             
-                instruments = self._borsdata_api.get_instruments()
-                instrument_name = instruments[instruments.index == int(instrument['ins_id'])]['name'].values[0]
-                results_df = results_df.append({'instrument_name': instrument_name, 'current_quarter_R12': int(round(r12_diff, 0)), 'previous_quarter_R12': int(round(previous_r12_diff, 0)), 'quarter_on_quarter': int(round(q_on_q_diff, 0))}, ignore_index=True)
-            else:
-                pass
-
-        print(results_df.sort_values(by=['current_quarter_R12'], ascending=False))
+        filtered_instruments = self.filter_instruments(market='Large Cap', country='Sverige')
+        with self.instrumentation.phase('fetch'):
+            reports = self._reports_cache.get_reports_many(filtered_instruments['ins_id'].values)
+        filtered_instruments = filtered_instruments[filtered_instruments['ins_id'].isin(list(reports))]
+        # the last 6 r12 eps-values of every instrument
+        eps = pack_eps([reports[int(ins_id)] for ins_id in filtered_instruments['ins_id'].values], 'r12', 6)
+        year_growth = eps_growth(eps, 4)
+        quarter_growth = eps_growth(eps, 1)
+        # instruments with fewer than 6 reports (or an eps of 0) are left out
+        valid = np.isfinite(year_growth).all(axis=1) & np.isfinite(quarter_growth[:, -1])
+        results_df = pd.DataFrame({'instrument_name': filtered_instruments['name'].values[valid],
+                                   'current_quarter_R12': np.round(year_growth[valid, -1]).astype(int),
+                                   'previous_quarter_R12': np.round(year_growth[valid, -2]).astype(int),
+                                   'quarter_on_quarter': np.round(quarter_growth[valid, -1]).astype(int)})
+        results_df = results_df.sort_values(by=['current_quarter_R12'], ascending=False)
+        print(results_df)
+        return results_df
 
+    @screener
     def breadth_large_cap_sweden(self):
         """
         plots the breadth (number of stocks above moving-average 40) for Large Cap Sweden compared
         to Large Cap Sweden Index
         """
         # creating api-object
-        # using defined function above to retrieve data frame of all instruments
-        instruments = self.instruments_with_meta_data()
         # filtering out the instruments with correct market and country
-        filtered_instruments = instruments.loc[
-            (instruments['market'] == "Large Cap") & (instruments['country'] == "Sverige")]
-        # creating empty array (to hold data frames)
-        frames = []
-        # looping through all rows in filtered data frame
-        for index, instrument in filtered_instruments.iterrows():
-            # fetching the stock prices for the current instrument
-            instrument_stock_prices = self._borsdata_api.get_instrument_stock_prices(int(instrument['ins_id']))
-            # using numpy's where function to create a 1 if close > ma40, else a 0
-            instrument_stock_prices[f'above_ma40'] = np.where(
-                instrument_stock_prices['close'] > instrument_stock_prices['close'].rolling(window=40).mean(), 1, 0)
-            instrument_stock_prices['name'] = instrument['name']
-            # check to see if response holds any data.
-            if len(instrument_stock_prices) > 0:
-                # appending data frame to array
-                frames.append(instrument_stock_prices.copy())
-        # creating concatenated data frame with concat
-        symbols_df = pd.concat(frames)
-        symbols_df = symbols_df.groupby('date').sum()
+        filtered_instruments = self.filter_instruments(market='Large Cap', country='Sverige')
+        # number of stocks above ma40 for every date, summed over the whole panel at once
+        engine = self.indicator_engine(filtered_instruments['ins_id'].values)
+        symbols_df = pd.DataFrame({'above_ma40': engine.evaluate('close > sma40').sum(axis=0)}, index=engine.panel.dates)
         # fetching OMXSLCPI data from api
-        omx = self._borsdata_api.get_instrument_stock_prices(643)
+        with self.instrumentation.phase('fetch'):
+            omx = self._price_cache.get_prices(643)
         # aligning data frames
         omx = omx[omx.index > '2015-01-01']
         symbols_df = symbols_df[symbols_df.index > '2015-01-01']
+        # matplotlib for visual-presentations (plots), only imported by the screeners that plot
+        import matplotlib.pylab as plt
         # creating subplot
         fig, (ax1, ax2) = plt.subplots(2, sharex=True)
         # plotting
@@ -413,132 +712,232 @@ class BorsdataClient:
         # show legend
         ax1.legend()
         ax2.legend()
-        plt.show()
+        with self.instrumentation.phase('export'):
+            plt.show()
 
-    def branch_breadth(self):
-        instruments = self.instruments_with_meta_data()
-        #filtered_instruments = instruments.loc[(instruments['market'] != 'Spotlight') & (instruments['market'] != 'NGM') & (instruments['market'] != 'PepMarket') & (instruments['country'] == 'Sverige')]
-        filtered_instruments = instruments.loc[(instruments['country'] == 'Finland') | (instruments['country'] == 'Sverige') | (instruments['country'] == 'Norge') | (instruments['country'] == 'Danmark')]
-
-        stock_prices = pd.DataFrame()
-        branch_breadth = pd.DataFrame(columns=['Bransch', '% > MA20', '% > MA50', '% > MA200', 'Antal Bolag'])
-        my_list = ['Olja & Gas - Borrning', 'Olja & Gas - Exploatering', 'Olja & Gas - Transport', 'Olja & Gas - Försäljning', 'Olja & Gas - Service', 'Bränsle - Kol', 'Bränsle - Uran', 'Elförsörjning', 'Gasförsörjning', 'Vattenförsörjning', 'Förnybarenergi', 'Vindkraft', 'Solkraft', 'Bioenergi', 'Kemikalier', 'Gruv - Prospekt & Drift', 'Gruv - Industrimetaller', 'Gruv - Guld & Silver', 'Gruv - Ädelstenar', 'Gruv - Service', 'Skogsbolag', 'Förpackning', 'Industrimaskiner', 'Industrikomponenter', 'Elektroniska komponenter', 'Militär & Försvar', 'Energi & Återvinning', 'Byggnation & Infrastruktur', 'Bostadsbyggnation', 'Installation & VVS', 'Byggmaterial', 'Bygginredning', 'Bemanning', 'Affärskonsulter', 'Säkerhet', 'Utbildning', 'Stödtjänster & Service', 'Mätning & Analys', 'Information & Data', 'Flygtransport', 'Sjöfart & Rederi', 'Tåg- & Lastbilstransport', 'Kläder & Skor', 'Accessoarer', 'Hemelektronik', 'Möbler & Inredning', 'Fritid & Sport', 'Bil & Motor', 'Konsumentservice', 'Detaljhandel', 'Hotell & Camping', 'Restaurang & Café', 'Resor & Nöjen', 'Betting & Casino', 'Gaming & Spel', 'Marknadsföring', 'Media & Publicering', 'Bryggeri', 'Drycker', 'Jordbruk', 'Fiskodling', 'Tobak', 'Livsmedel', 'Hygienprodukter', 'Hälsoprodukter', 'Apotek', 'Livsmedelsbutiker', 'Banker', 'Nischbanker', 'Kredit & Finansiering', 'Kapitalförvaltning', 'Fondförvaltning', 'Investmentbolag', 'Försäkring', 'Fastighetsbolag', 'Fastighet - REIT', 'Läkemedel', 'Biotech', 'Medicinsk Utrustning', 'Hälsovård & Hjälpmedel', 'Sjukhus & Vårdhem', 'Elektronik & Tillverkning', 'Datorer & Hårdvara', 'Elektronisk Utrustning', 'Biometri', 'Kommunikation', 'Rymd- & Satellitteknik', 'Säkerhet & Bevakning', 'IT-Konsulter', 'Affärs- & IT-System', 'Internettjänster', 'Betalning & E-handel', 'Bredband & Telefoni', 'Telekomtjänster']
-        
-        for branch in my_list:
-            sector_instruments = filtered_instruments.loc[(instruments['branch'] == branch)]
-
-            for index, instrument in sector_instruments.iterrows():
-                # fetching the stock prices for the current instrument
-                instrument_stock_price = self._borsdata_api.get_instrument_stock_prices(int(instrument['ins_id']))
-                instrument_stock_price.sort_index(inplace=True)
-                
-                # using numpy's where function to create a 1 if close > ma20, else a 0
-                instrument_stock_price[f'above_ma20'] = np.where(
-                    instrument_stock_price['close'] > instrument_stock_price['close'].rolling(window=20).mean(), 1, 0)
-                
-                # using numpy's where function to create a 1 if close > ma50, else a 0
-                instrument_stock_price[f'above_ma50'] = np.where(
-                    instrument_stock_price['close'] > instrument_stock_price['close'].rolling(window=50).mean(), 1, 0)
-                
-                instrument_stock_price[f'above_ma200'] = np.where(
-                    instrument_stock_price['close'] > instrument_stock_price['close'].rolling(window=200).mean(), 1, 0)
-                
-                # getting the last row of the dataframe, i.e. the last day's values
-                last_row = instrument_stock_price.iloc[[-1]]
-                
-                # appending the instrument's name and value to new dataframe
-                df_temp = pd.DataFrame([{'stock': instrument['name'], 'above_ma20': last_row['above_ma20'].values[0], 'above_ma50': last_row['above_ma50'].values[0], 'above_ma200': last_row['above_ma200'].values[0]}])
-                
-                stock_prices = pd.concat([stock_prices, df_temp], ignore_index=True)
-            
-            try:
-                breadth20 = int(len(stock_prices[stock_prices['above_ma20'] == 1])/len(sector_instruments) * 100)
-            except:
-                breadth20 = None
-            
-            try:
-                breadth50 = int(len(stock_prices[stock_prices['above_ma50'] == 1])/len(sector_instruments) * 100)
-            except:
-                breadth50 = None
-            
-            try:
-                breadth200 = int(len(stock_prices[stock_prices['above_ma200'] == 1])/len(sector_instruments) * 100)
-            except:
-                breadth200 = None
-            
-            branch_breadth = branch_breadth.append({'Bransch': branch, '% > MA20': breadth20, '% > MA50': breadth50, '% > MA200': breadth200, 'Antal Bolag': int(len(sector_instruments))}, ignore_index=True)
-            
-            df_temp= pd.DataFrame(None)
-            stock_prices= pd.DataFrame(None)
-        branch_breadth = branch_breadth.replace(to_replace='None', value=np.nan).dropna()
+    def _loaded_prices(self, ins_id, from_date=None):
+        """
+        prices for ins_id already fetched during this run, by the price cache or the compact store
+        :param from_date: first date needed, default None (the full history)
+        :return: pd.DataFrame of stock prices or None if nothing fetched covers from_date
+        """
+        stock_prices = self._price_cache.loaded(ins_id)
+        if stock_prices is not None:
+            return stock_prices
+        if self._close_store is not None and ins_id in self._close_store.fetched:
+            stock_prices, full_history = self._close_store.fetched[ins_id]
+            if full_history or (from_date is not None and len(stock_prices) > 0 and stock_prices.index[0] <= from_date):
+                return stock_prices
+        return None
+
+    def _rolling_ma_flags(self, ins_ids, windows=(20, 50, 200)):
+        """
+        above-ma flags for today from the streaming moving-average state. instruments already in
+        the state only fetch the days after their last close (or take them from the prices already
+        read this run), new instruments are seeded once from their price history
+        :param ins_ids: instrument ids
+        :param windows: moving-average windows
+        :return: (bool np.array, True for the ins_ids with prices, 2-d int np.array of flags for those)
+        """
+        ins_ids = [int(ins_id) for ins_id in ins_ids]
+        file_path = os.path.join(self._cache_path, 'rolling_ma_state.npz')
+        if self._ma_state is None or not set(windows) <= set(self._ma_state.windows):
+            # the state keeps the saved windows, the default ones and the new ones, only new windows are added
+            state_windows = sorted(set(windows) | {20, 50, 200} | set(self._ma_state.windows if self._ma_state else ()))
+            self._ma_state = RollingMAState.load(file_path, state_windows)
+            self._ma_state_checked = set()
+        state = self._ma_state
+        # instruments already topped up by an interrupted sweep are taken from the saved state as they are
+        # (unless a longer window has cleared their state)
+        unchecked = [ins_id for ins_id in dict.fromkeys(ins_ids) if ins_id not in self._ma_state_checked]
+        journaled = {ins_id for ins_id, last_date in zip(unchecked, state.last_dates(unchecked))
+                     if ins_id in self._ma_journal.done and not np.isnat(last_date)}
+        self._ma_state_checked.update(journaled)
+        unchecked = [ins_id for ins_id in unchecked if ins_id not in journaled]
+        last_dates = dict(zip(unchecked, state.last_dates(unchecked)))
+        last_closes = dict(zip(unchecked, state.last_closes(unchecked)))
+        known = [ins_id for ins_id in unchecked if not np.isnat(last_dates[ins_id])]
+        # instruments new to the state (or without prices so far) start from the full price history
+        reseed = [ins_id for ins_id in unchecked if np.isnat(last_dates[ins_id])]
+        changed = len(reseed) > 0
+        # instruments topped up since the last save, they are journaled once the state holding them is saved
+        unsaved = []
+
+        def save():
+            nonlocal changed
+            if changed:
+                state.save(file_path)
+                changed = False
+            for ins_id in unsaved:
+                self._ma_journal.mark(ins_id)
+            unsaved.clear()
+
+        def done(ins_id):
+            unsaved.append(ins_id)
+            if len(unsaved) >= MA_STATE_SAVE_EVERY:
+                save()
+
+        def push(ins_id, new_prices):
+            nonlocal changed
+            new_prices = new_prices.sort_index()
+            last_date = pd.Timestamp(last_dates[ins_id])
+            old_close = last_closes[ins_id]
+            if last_date in new_prices.index and \
+                    abs(new_prices.loc[last_date, 'close'] - old_close) > 1e-6 * max(abs(old_close), 1.0):
+                reseed.append(ins_id)
+                changed = True
+                return
+            for date, close in new_prices.loc[new_prices.index > last_date, 'close'].items():
+                state.push(ins_id, date, close)
+                changed = True
+            done(ins_id)
+
+        def seed(ins_id, stock_prices):
+            nonlocal changed
+            state.seed(ins_id, stock_prices.index.values, stock_prices['close'].values)
+            changed = True
+            done(ins_id)
+
+        try:
+            # prices already fetched during this run (covering the last close in the state) are used as they are
+            missing = []
+            for ins_id in known:
+                stock_prices = self._loaded_prices(ins_id, pd.Timestamp(last_dates[ins_id]))
+                if stock_prices is not None:
+                    push(ins_id, stock_prices)
+                else:
+                    missing.append(ins_id)
+            if self._refresh:
+                # the last close in the state is fetched again, if it has changed the history has been adjusted
+                # (e.g. a split). every instrument is pushed as soon as it arrives
+                with self.instrumentation.phase('fetch'):
+                    self._fetcher.fetch_prices(missing, [last_dates[ins_id].item() for ins_id in missing],
+                                               on_result=push)
+            state.add(reseed)
+            reseed_missing = []
+            for ins_id in reseed:
+                stock_prices = self._loaded_prices(ins_id)
+                if stock_prices is not None:
+                    seed(ins_id, stock_prices)
+                else:
+                    reseed_missing.append(ins_id)
+            with self.instrumentation.phase('fetch'):
+                for ins_id, stock_prices in self._price_cache.get_prices_many(reseed_missing).items():
+                    seed(ins_id, stock_prices)
+        finally:
+            # also when the sweep is interrupted, so a restart continues from the instruments in the journal
+            save()
+        # instruments that failed to update keep their last state for this run
+        self._ma_state_checked.update(unchecked)
+        if len(unchecked) > 0:
+            self._ma_journal.complete()
+        has_prices = ~np.isnat(state.last_dates(ins_ids))
+        return has_prices, state.flags(np.array(ins_ids)[has_prices], windows)
+
+    def _breadth_flags(self, filtered_instruments, windows=(20, 50, 200)):
+        """
+        above-ma flags for the last day, computed once per instrument from the streaming state
+        :param filtered_instruments: pd.DataFrame of instruments (from filter_instruments)
+        :param windows: moving-average windows
+        :return: pd.DataFrame of the instruments with prices and one column above_ma{window} (1/0) per window
+        """
+        has_prices, above_ma = self._rolling_ma_flags(filtered_instruments['ins_id'].values, windows)
+        flags = filtered_instruments[has_prices].copy()
+        for column, window in enumerate(windows):
+            flags[f'above_ma{window}'] = above_ma[:, column]
+        return flags
+
+    @staticmethod
+    def _group_breadth(flags, group_by, windows=(20, 50, 200)):
+        """
+        percent of instruments above moving-average per group, in one groupby
+        :param flags: pd.DataFrame from _breadth_flags
+        :param group_by: column to group on e.g. 'sector', 'branch', 'market' or 'country'
+        :return: pd.DataFrame with the columns [group_by, '% > MA20', ..., 'Antal Bolag']
+        """
+        # index-typed instruments does not have a sector or branch
+        flags = flags[flags[group_by] != 'N/A']
+        grouped = flags.groupby(group_by, observed=True)
+        counts = grouped.size()
+        above = grouped[[f'above_ma{window}' for window in windows]].sum()
+        group_breadth = (above.div(counts, axis=0) * 100).astype(int)
+        group_breadth.columns = [f'% > MA{window}' for window in windows]
+        group_breadth['Antal Bolag'] = counts
+        return group_breadth.reset_index()
+
+    @screener
+    def grouped_breadth(self, group_by, windows=(20, 50, 200), countries=NORDIC_COUNTRIES):
+        """
+        breadth (percent of stocks above moving-average) per group, the groups come from the
+        meta-data. the flags are computed once and aggregated for every grouping key
+        :param group_by: column or list of columns e.g. 'sector' or ['sector', 'branch']
+        :param windows: moving-average windows, default (20, 50, 200)
+        :param countries: countries to include, default the nordic countries
+        :return: pd.DataFrame (or dict of group_by -> pd.DataFrame when group_by is a list)
+        """
+        flags = self._breadth_flags(self.filter_instruments(country=countries), windows)
+        if isinstance(group_by, str):
+            return self._group_breadth(flags, group_by, windows)
+        return {key: self._group_breadth(flags, key, windows) for key in group_by}
+
+    @screener
+    def breadth_history(self, windows=(20, 50, 200), countries=NORDIC_COUNTRIES):
+        """
+        daily breadth (percent of stocks above moving-average) for every market, sector and branch.
+        the history is stored in the cache directory, after the first run only new days are computed
+        :param windows: moving-average windows, default (20, 50, 200)
+        :param countries: countries to include, default the nordic countries
+        :return: pd.DataFrame with date as index and (group_column, group, 'MA{window}') as columns
+        """
+        filtered_instruments = self.filter_instruments(country=countries)
+        panel = self.price_panel(filtered_instruments['ins_id'].values)
+        # meta-data in the same order as the panel's rows
+        instruments = filtered_instruments.set_index('ins_id').loc[panel.ins_ids]
+        # one stored history per selection of countries, the percentages of different universes do not mix
+        universe = tuple(sorted([countries] if isinstance(countries, str) else countries))
+        history = BreadthHistory(os.path.join(self._cache_path, f"breadth_history_{'-'.join(universe)}.pkl"), windows,
+                                 universe=universe)
+        return history.update(panel, instruments)
+
+    def _export_branch_breadth(self, branch_breadth):
+        branch_breadth = branch_breadth.rename(columns={'branch': 'Bransch'})
         print(branch_breadth.sort_values(by=['% > MA20'], ascending=False))
+        with self.instrumentation.phase('export'):
+            self.exports.submit('branch-breadth', branch_breadth)
 
-        branch_breadth.to_excel('file_exports/branch-breadth.xlsx', sheet_name='sheet 1', index=False)
+    def _export_sector_breadth(self, sector_breadth):
+        sector_breadth = sector_breadth.rename(columns={'sector': 'Sektor'}).drop(columns=['Antal Bolag'])
+        with self.instrumentation.phase('export'):
+            self.exports.submit('sector-breadth', sector_breadth)
 
+    @screener
+    def branch_breadth(self):
+        """
+        breadth per branch for the nordic countries, printed and exported as branch-breadth
+        """
+        self._export_branch_breadth(self.grouped_breadth('branch'))
+
+    @screener
     def sector_breadth(self):
+        """
+        breadth per sector for the nordic countries, exported as sector-breadth
+        """
+        self._export_sector_breadth(self.grouped_breadth('sector'))
 
-        instruments = self.instruments_with_meta_data()
-        #filtered_instruments = instruments.loc[(instruments['market'] != 'Spotlight') & (instruments['market'] != 'NGM') & (instruments['market'] != 'PepMarket') & (instruments['country'] == 'Sverige')]
-        filtered_instruments = instruments.loc[(instruments['country'] == 'Finland') | (instruments['country'] == 'Sverige') | (instruments['country'] == 'Norge') | (instruments['country'] == 'Danmark')]
-        stock_prices = pd.DataFrame()
-        sector_breadth = pd.DataFrame(columns=['Sektor', '% > MA20', '% > MA50', '% > MA200'])
-        
-        my_list = ['Energi', 'Kraftförsörjning', 'Material', 'Dagligvaror', 'Sällanköpsvaror', 'Industri', 'Hälsovård', 'Finans & Fastighet', 'Informationsteknik', 'Telekommunikation']
-
-        for sector in my_list:
-            sector_instruments = filtered_instruments.loc[(instruments['sector'] == sector)]
-
-            for index, instrument in sector_instruments.iterrows():
-                # fetching the stock prices for the current instrument
-                instrument_stock_price = self._borsdata_api.get_instrument_stock_prices(int(instrument['ins_id']))
-                instrument_stock_price.sort_index(inplace=True)
-                
-                # using numpy's where function to create a 1 if close > ma20, else a 0
-                instrument_stock_price[f'above_ma20'] = np.where(
-                    instrument_stock_price['close'] > instrument_stock_price['close'].rolling(window=20).mean(), 1, 0)
-                
-                # using numpy's where function to create a 1 if close > ma50, else a 0
-                instrument_stock_price[f'above_ma50'] = np.where(
-                    instrument_stock_price['close'] > instrument_stock_price['close'].rolling(window=50).mean(), 1, 0)
-                
-                instrument_stock_price[f'above_ma200'] = np.where(
-                    instrument_stock_price['close'] > instrument_stock_price['close'].rolling(window=200).mean(), 1, 0)
-                
-                # getting the last row of the dataframe, i.e. the last day's values
-                last_row = instrument_stock_price.iloc[[-1]]
-                
-                # appending the instrument's name and value to new dataframe
-                df_temp = pd.DataFrame([{'stock': instrument['name'], 'above_ma20': last_row['above_ma20'].values[0], 'above_ma50': last_row['above_ma50'].values[0], 'above_ma200': last_row['above_ma200'].values[0]}])
-                
-                stock_prices = pd.concat([stock_prices, df_temp], ignore_index=True)
-            
-            try:
-                breadth20 = int(len(stock_prices[stock_prices['above_ma20'] == 1])/len(sector_instruments) * 100)
-            except:
-                breadth20 = None
-            
-            try:
-                breadth50 = int(len(stock_prices[stock_prices['above_ma50'] == 1])/len(sector_instruments) * 100)
-            except:
-                breadth50 = None
-            
-            try:
-                breadth200 = int(len(stock_prices[stock_prices['above_ma200'] == 1])/len(sector_instruments) * 100)
-            except:
-                breadth200 = None
-            
-            sector_breadth = sector_breadth.append({'Sektor': sector, '% > MA20': breadth20, '% > MA50': breadth50, '% > MA200': breadth200}, ignore_index=True)
-            
-            df_temp= pd.DataFrame(None)
-            stock_prices= pd.DataFrame(None)
-
-        sector_breadth = sector_breadth.replace(to_replace='None', value=np.nan).dropna()
-        #print(sector_breadth.sort_values(by=['% > MA20'], ascending=False))
-        sector_breadth.to_excel('file_exports/sector-breadth.xlsx', sheet_name='sheet 1', index=False)
+    @screener
+    def sector_and_branch_breadth(self):
+        """
+        both the sector- and the branch-report from one run
+        """
+        group_breadth = self.grouped_breadth(['sector', 'branch'])
+        self._export_sector_breadth(group_breadth['sector'])
+        self._export_branch_breadth(group_breadth['branch'])
 
 
 if __name__ == "__main__":
     # Main, call functions here.
+    # see borsdata_screener.py for running the screeners from the command line
+    set_display_options()
     # creating BorsdataClient-instance
     borsdata_client = BorsdataClient()
     # borsdata_client.get_eps_accelerationQ()
@@ -551,9 +950,13 @@ if __name__ == "__main__":
     #borsdata_client.get_eps_acceleration()
     # borsdata_client.get_eps_accelerationR12()
     # borsdata_client.get_eps_accelerationQ()
-    borsdata_client.sector_breadth()
-    borsdata_client.branch_breadth()
+    borsdata_client.sector_and_branch_breadth()
+    # waiting for the exports (file_exports/screeners.xlsx)
+    borsdata_client.close()
+    # api calls, time per screener and phase and cache hit ratios of the run
+    borsdata_client.instrumentation.print_summary()
     #borsdata_client.sector_breadth()
+    #borsdata_client.branch_breadth()
     #borsdata_client.plot_stock_prices(3)  # ABB
     #borsdata_client.history_kpi(2, 'Large Cap', 'Sverige', 2020)  # 2 == Price/Earnings (PE)
     #borsdata_client.top_performers('Large Cap', 'Sverige', 10, 5)  # showing top10 performers based on 5 day return (1 week) for Large Cap Sverige.
@@ -0,0 +1,303 @@
+# command line runner for the BorsdataClient screeners, usage e.g.
+#   python borsdata_screener.py breadth --group sector
+#   python borsdata_screener.py eps-accel --period r12
+#   python borsdata_screener.py --summary breadth --group sector branch + eps-accel --period quarter + top -n 10
+# several screeners are separated with '+', they run one after another on one shared client
+# (one instrument-table, one price panel and warm caches). global options go before the first screener
+# argparse for the command line
+import argparse
+import sys
+
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+
+from borsdata_client import NORDIC_COUNTRIES, BorsdataClient, set_display_options
+# api call, phase and cache statistics of a run
+from instrumentation import Instrumentation
+
+# separator between the screeners of one invocation
+SEPARATOR = '+'
+
+
+def run_breadth(client, args):
+    groups = set(args.group)
+    if 'market' in groups:
+        if args.excel:
+            client.market_breadth_to_excel()
+        else:
+            breadth = client.breadth(args.markets, tuple(args.windows), args.country)
+            print(pd.DataFrame(breadth, index=[f'% > MA{window}' for window in args.windows]).T)
+    # the sector- and branch-reports are always exported
+    if {'sector', 'branch'} <= groups:
+        # both reports from one computation of the flags
+        client.sector_and_branch_breadth()
+    elif 'sector' in groups:
+        client.sector_breadth()
+    elif 'branch' in groups:
+        client.branch_breadth()
+
+
+def run_breadth_history(client, args):
+    history = client.breadth_history(tuple(args.windows), args.countries)
+    print(history.tail(args.days).T)
+    return history
+
+
+def run_eps_accel(client, args):
+    return client.eps_acceleration(args.period, periods=args.periods, countries=args.countries)
+
+
+def run_eps_backtest(client, args):
+    return client.eps_acceleration_backtest(args.period, periods=args.periods, countries=args.countries,
+                                     from_year=args.from_year)
+
+
+def run_eps_growth(client, args):
+    return client.get_eps_growth()
+
+
+def run_top(client, args):
+    return client.top_performers(args.market, args.country, args.number_of_stocks, args.days)
+
+
+def run_momentum(client, args):
+    exclude = {'market': args.exclude_markets} if args.exclude_markets else None
+    return client.momentum(args.countries, group_by=args.group, number_of_stocks=args.number_of_stocks, exclude=exclude)
+
+
+def run_screen(client, args):
+    return client.expression_screen(args.expression, args.rank_by, args.number_of_stocks, args.countries,
+                                    columns=tuple(args.columns))
+
+
+def run_expression_breadth(client, args):
+    # label:expression, or the expression as its own label
+    conditions = dict(condition.split(':', 1) if ':' in condition else (condition, condition)
+                      for condition in args.conditions)
+    history = client.expression_breadth(conditions, args.group, args.countries)
+    print(history.tail(args.days).T)
+    return history
+
+
+def run_internals(client, args):
+    return client.market_internals(args.countries, args.markets, args.days)
+
+
+def run_kpi(client, args):
+    return client.history_kpi(args.kpi, args.market, args.country, args.year)
+
+
+def run_kpi_screen(client, args):
+    return client.kpi_screen(args.kpis, args.lower_is_better, args.year, args.number_of_stocks, args.countries, args.markets)
+
+
+def run_pe(client, args):
+    return client.get_latest_pe(args.ins_id)
+
+
+def run_plot(client, args):
+    client.plot_stock_prices(args.ins_id)
+
+
+def run_large_cap_breadth(client, args):
+    client.breadth_large_cap_sweden()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='borsdata_screener',
+                                     description="runs BorsdataClient screeners, separate several with '+'")
+    parser.add_argument('--cache-path', default=None, help='root directory of the local caches')
+    parser.add_argument('--calls-per-second', type=int, default=10, help='max api calls per second')
+    parser.add_argument('--fake', type=int, metavar='N', default=None,
+                        help='run against FakeBorsdataAPI with N synthetic instruments instead of the api')
+    parser.add_argument('--compact-prices', action='store_true',
+                        help='close-only panels from the float32 memory-mapped store')
+    parser.add_argument('--export', action='store_true',
+                        help='also export every screener output to file_exports/ (screeners.xlsx, parquet and csv)')
+    parser.add_argument('--summary', action='store_true', help='print api calls, timings and cache hit ratios')
+    parser.add_argument('--profile', action='append', default=[], metavar='SCREENER',
+                        help="client method to run under cProfile (e.g. sector_breadth, repeatable), 'all' for every "
+                             "screener")
+    commands = parser.add_subparsers(dest='command', required=True, metavar='screener')
+
+    breadth = commands.add_parser('breadth', help='percent of stocks above moving-average per group')
+    breadth.add_argument('--group', nargs='+', choices=['sector', 'branch', 'market'], default=['sector'])
+    breadth.add_argument('--markets', nargs='+', default=['Large Cap', 'Mid Cap', 'Small Cap', 'First North'])
+    breadth.add_argument('--country', default='Sverige')
+    breadth.add_argument('--windows', type=int, nargs='+', default=[20, 50, 200])
+    breadth.add_argument('--excel', action='store_true', help='market breadth to the excel-report')
+    breadth.set_defaults(run=run_breadth)
+
+    history = commands.add_parser('breadth-history', help='daily breadth per market, sector and branch')
+    history.add_argument('--windows', type=int, nargs='+', default=[20, 50, 200])
+    history.add_argument('--countries', nargs='+', default=NORDIC_COUNTRIES)
+    history.add_argument('--days', type=int, default=5, help='number of days to print')
+    history.set_defaults(run=run_breadth_history)
+
+    eps_accel = commands.add_parser('eps-accel', help='instruments with accelerating eps-growth')
+    eps_accel.add_argument('--period', choices=['r12', 'quarter', 'year'], default='r12')
+    eps_accel.add_argument('--periods', type=int, default=3, help='number of accelerating growths')
+    eps_accel.add_argument('--countries', nargs='+', default=None,
+                           help='default Sverige for r12, the nordic countries otherwise')
+    eps_accel.set_defaults(run=run_eps_accel)
+
+    eps_backtest = commands.add_parser('eps-backtest', help='hit-rate and forward returns of the eps-acceleration '
+                                                            'signal at every historical report')
+    eps_backtest.add_argument('--period', choices=['r12', 'quarter', 'year'], default='r12')
+    eps_backtest.add_argument('--periods', type=int, default=3, help='number of accelerating growths')
+    eps_backtest.add_argument('--countries', nargs='+', default=NORDIC_COUNTRIES)
+    eps_backtest.add_argument('--from-year', type=int, default=None, help='first year of signals, default all')
+    eps_backtest.set_defaults(run=run_eps_backtest)
+
+    eps_growth = commands.add_parser('eps-growth', help='r12 eps-growth for Large Cap Sverige')
+    eps_growth.set_defaults(run=run_eps_growth)
+
+    top = commands.add_parser('top', help='top performers')
+    top.add_argument('--market', default='Large Cap')
+    top.add_argument('--country', default='Sverige')
+    top.add_argument('-n', '--number-of-stocks', type=int, default=5)
+    top.add_argument('--days', type=int, default=1, help='number of days for the percent change')
+    top.set_defaults(run=run_top)
+
+    momentum = commands.add_parser('momentum', help='1w-12m returns and relative-strength ranking')
+    momentum.add_argument('--countries', nargs='+', default=NORDIC_COUNTRIES)
+    momentum.add_argument('--group', choices=['market', 'sector', 'branch'], default=None,
+                          help='rank within every group')
+    momentum.add_argument('-n', '--number-of-stocks', type=int, default=10, help='number of stocks (per group)')
+    momentum.add_argument('--exclude-markets', nargs='+', default=None)
+    momentum.set_defaults(run=run_momentum)
+
+    screen = commands.add_parser('screen', help="instruments meeting an indicator expression on the last date, "
+                                                "e.g. '(dist_high252 > -0.05) & (sma50 > sma200)'")
+    screen.add_argument('expression')
+    screen.add_argument('--rank-by', default=None, help="expression to sort on, e.g. 'return63'")
+    screen.add_argument('--columns', nargs='+', default=[], help="more expressions to show, e.g. dist_high252")
+    screen.add_argument('--countries', nargs='+', default=NORDIC_COUNTRIES)
+    screen.add_argument('-n', '--number-of-stocks', type=int, default=10)
+    screen.set_defaults(run=run_screen)
+
+    expression_breadth = commands.add_parser('expression-breadth', help='daily percent of stocks meeting indicator '
+                                                                        'expressions per market, sector and branch')
+    expression_breadth.add_argument('conditions', nargs='+',
+                                    help="[label:]expression, e.g. 'near high:dist_high252 > -0.05' 'close > ema20'")
+    expression_breadth.add_argument('--group', nargs='+', choices=['sector', 'branch', 'market'],
+                                    default=['market', 'sector', 'branch'])
+    expression_breadth.add_argument('--countries', nargs='+', default=NORDIC_COUNTRIES)
+    expression_breadth.add_argument('--days', type=int, default=5, help='number of days to print')
+    expression_breadth.set_defaults(run=run_expression_breadth)
+
+    internals = commands.add_parser('internals', help='advance/decline-line, new highs/lows and mcclellan oscillator')
+    internals.add_argument('--countries', nargs='+', default=NORDIC_COUNTRIES)
+    internals.add_argument('--markets', nargs='+', default=None)
+    internals.add_argument('--days', type=int, default=10, help='number of days to print')
+    internals.set_defaults(run=run_internals)
+
+    kpi = commands.add_parser('kpi', help='kpi history, top 5 for a year')
+    kpi.add_argument('--kpi', type=int, default=2, help='kpi id, default 2 (P/E)')
+    kpi.add_argument('--market', default='Large Cap')
+    kpi.add_argument('--country', default='Sverige')
+    kpi.add_argument('--year', type=int, required=True)
+    kpi.set_defaults(run=run_kpi)
+
+    kpi_screen = commands.add_parser('kpi-screen', help='ranking on several kpis at once')
+    kpi_screen.add_argument('--kpis', type=int, nargs='+', required=True, help='kpi ids, e.g. 2 33')
+    kpi_screen.add_argument('--lower-is-better', type=int, nargs='+', default=[],
+                            help='kpis where the lowest value is the best, e.g. 2 (P/E)')
+    kpi_screen.add_argument('--year', type=int, default=None, help='default the last year')
+    kpi_screen.add_argument('--countries', nargs='+', default=NORDIC_COUNTRIES)
+    kpi_screen.add_argument('--markets', nargs='+', default=None)
+    kpi_screen.add_argument('-n', '--number-of-stocks', type=int, default=10)
+    kpi_screen.set_defaults(run=run_kpi_screen)
+
+    pe = commands.add_parser('pe', help='latest P/E of an instrument')
+    pe.add_argument('ins_id', type=int)
+    pe.set_defaults(run=run_pe)
+
+    plot = commands.add_parser('plot', help='plot of close and ma50 for an instrument')
+    plot.add_argument('ins_id', type=int)
+    plot.set_defaults(run=run_plot)
+
+    large_cap_breadth = commands.add_parser('large-cap-breadth', help='plot of Large Cap Sverige breadth (ma40)')
+    large_cap_breadth.set_defaults(run=run_large_cap_breadth)
+    return parser
+
+
+def split_commands(argv):
+    """
+    splits the arguments on '+' into one list per screener
+    """
+    commands = [[]]
+    for arg in argv:
+        if arg == SEPARATOR:
+            commands.append([])
+        else:
+            commands[-1].append(arg)
+    return [command for command in commands if len(command) > 0]
+
+
+def export_output(client, name, output):
+    """
+    queues a screener's output on the client's export pipeline (data frames, tuples or dicts of them)
+    """
+    if isinstance(output, (pd.DataFrame, pd.Series)):
+        client.exports.submit(name, output)
+    elif isinstance(output, tuple):
+        for number, item in enumerate(output, start=1):
+            export_output(client, f'{name}-{number}', item)
+    elif isinstance(output, dict):
+        for key, item in output.items():
+            export_output(client, f'{name}-{key}', item)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    chunks = split_commands(argv)
+    if len(chunks) == 0:
+        parser.print_help()
+        return 2
+    # the global options come with the first screener, after a '+' they would be silently ignored
+    for chunk in chunks[1:]:
+        if chunk[0].startswith('-'):
+            parser.error(f"'{SEPARATOR} {' '.join(chunk)}': global options go before the first screener, "
+                         f"a screener's options after its name")
+    commands = [parser.parse_args(chunk) for chunk in chunks]
+    options = commands[0]
+    for args in commands:
+        if args.command == 'eps-accel' and args.countries is None:
+            args.countries = 'Sverige' if args.period == 'r12' else NORDIC_COUNTRIES
+
+    set_display_options()
+    borsdata_api = None
+    if options.fake is not None:
+        # synthetic data, e.g. for trying out the screeners without an api key
+        from fake_borsdata_api import FakeBorsdataAPI
+        borsdata_api = FakeBorsdataAPI(options.fake)
+    profile = True if 'all' in options.profile else options.profile
+    client = BorsdataClient(borsdata_api, cache_path=options.cache_path, calls_per_second=options.calls_per_second,
+                            instrumentation=Instrumentation(profile=profile), compact_prices=options.compact_prices)
+    failed = []
+    for args in commands:
+        try:
+            output = args.run(client, args)
+            if options.export:
+                # written in the background while the next screener runs
+                export_output(client, args.command, output)
+        except Exception as exception:
+            # the other screeners still run, the caches keep what was fetched before the error
+            print(f"borsdata_screener >> {args.command} failed: {exception!r}", file=sys.stderr)
+            failed.append(args.command)
+    # waiting for the exports
+    client.close()
+    if options.summary:
+        client.instrumentation.print_summary()
+    else:
+        # instruments that could not be fetched are always reported
+        client.instrumentation.print_failures()
+    for name in client.instrumentation.profiles:
+        print(client.instrumentation.profile_report(name))
+    return 1 if len(failed) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# os for file- and directory-handling
+import os
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+import numpy as np
+
+# technical indicators and screen expressions
+from indicators import IndicatorEngine
+
+GROUP_COLUMNS = ('market', 'sector', 'branch')
+# layout of the stored history, a history of an older format is rebuilt (format 1 counted the moving-averages
+# on the dates of the whole universe instead of every instrument's own trading days)
+FORMAT = 2
+
+
+def group_percent_history(panel, instruments, conditions, group_columns=GROUP_COLUMNS, engine=None):
+    """
+    percent of the listed instruments meeting conditions per group and date
+    :param panel: PricePanel
+    :param instruments: pd.DataFrame of meta-data for the panel's instruments (same order as panel.ins_ids)
+    :param conditions: dict of label -> IndicatorEngine expression, e.g. {'MA50': 'close > sma50'}
+    :param group_columns: meta-data columns to group on
+    :param engine: IndicatorEngine of the panel, default a new one
+    :return: pd.DataFrame with date as index and (group_column, group, label) as columns
+    """
+    if engine is None:
+        engine = IndicatorEngine(panel)
+    listed = panel.listed().astype(float)
+    true = {label: np.asarray(engine.evaluate(expression), dtype=bool).astype(float)
+            for label, expression in conditions.items()}
+    columns = {}
+    for group_column in group_columns:
+        groups = instruments[group_column].astype(str).values
+        # index-typed instruments does not have a sector or branch
+        names = sorted(set(groups) - {'N/A', 'nan'})
+        # membership matrix (groups x instruments), a matrix product sums the flags of every group at once
+        membership = np.zeros((len(names), len(instruments)))
+        for row, name in enumerate(names):
+            membership[row, groups == name] = 1
+        listed_count = membership @ listed
+        for label in conditions:
+            true_count = membership @ true[label]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                percent = np.where(listed_count > 0, true_count / listed_count * 100, np.nan)
+            for row, name in enumerate(names):
+                columns[(group_column, name, label)] = percent[row]
+    history = pd.DataFrame(columns, index=panel.dates)
+    history.columns = pd.MultiIndex.from_tuples(history.columns, names=['group_column', 'group', 'window'])
+    return history
+
+
+def group_breadth_history(panel, instruments, windows, group_columns=GROUP_COLUMNS):
+    """
+    percent of the listed instruments above moving-average per group and date
+    :param panel: PricePanel
+    :param instruments: pd.DataFrame of meta-data for the panel's instruments (same order as panel.ins_ids)
+    :param windows: moving-average windows
+    :param group_columns: meta-data columns to group on
+    :return: pd.DataFrame with date as index and (group_column, group, 'MA{window}') as columns
+    """
+    return group_percent_history(panel, instruments, {f'MA{window}': f'close > sma{window}' for window in windows},
+                                 group_columns)
+
+
+class BreadthHistory:
+    """
+    store of daily "% above MA-n" series for every market, sector and branch. the first update
+    backfills the whole history, later updates only compute the days from the last stored day
+    """
+    def __init__(self, file_path, windows=(20, 50, 200), group_columns=GROUP_COLUMNS, universe=()):
+        """
+        :param file_path: path to the pickle-file of the history
+        :param windows: moving-average windows
+        :param group_columns: meta-data columns to group on
+        :param universe: what the instruments were selected on, e.g. the sorted countries. a history stored
+                         for another universe is rebuilt instead of appended to
+        """
+        self._file_path = file_path
+        self._windows = tuple(windows)
+        self._group_columns = tuple(group_columns)
+        self._universe = tuple(universe)
+        self._history = None
+
+    def load(self):
+        """
+        :return: pd.DataFrame of the stored history or None if nothing is stored (or the settings changed)
+        """
+        if self._history is None and os.path.exists(self._file_path):
+            history = pd.read_pickle(self._file_path)
+            if history.attrs.get('format') == FORMAT and history.attrs.get('windows') == self._windows and \
+                    history.attrs.get('group_columns') == self._group_columns and \
+                    history.attrs.get('universe') == self._universe:
+                self._history = history
+        return self._history
+
+    def _save(self, history):
+        history.attrs['format'] = FORMAT
+        history.attrs['windows'] = self._windows
+        history.attrs['group_columns'] = self._group_columns
+        history.attrs['universe'] = self._universe
+        # create directory if it do not exist
+        directory = os.path.dirname(self._file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        history.to_pickle(self._file_path + '.tmp')
+        os.replace(self._file_path + '.tmp', self._file_path)
+        self._history = history
+
+    def update(self, panel, instruments):
+        """
+        computes the days after the last stored day (the last stored day is computed again since
+        its prices may have been incomplete) and appends them
+        :param panel: PricePanel of the universe
+        :param instruments: pd.DataFrame of meta-data for the panel's instruments (same order as panel.ins_ids)
+        :return: pd.DataFrame of the full history
+        """
+        history = self.load()
+        if history is None or len(history) == 0:
+            # first run, backfilling the whole history
+            history = group_breadth_history(panel, instruments, self._windows, self._group_columns)
+        else:
+            last_date = history.index[-1]
+            number_of_new_dates = int((panel.dates >= last_date).sum())
+            if number_of_new_dates == 0:
+                return history
+            # only the new days plus every instrument's trading days the longest moving-average needs before them
+            recent = group_breadth_history(panel.tail(number_of_new_dates, max(self._windows)), instruments,
+                                           self._windows, self._group_columns)
+            recent = recent[recent.index >= last_date]
+            history = pd.concat([history[history.index < last_date], recent])
+        self._save(history)
+        return history
+
+    def series(self, group_column, group, window):
+        """
+        :return: pd.Series of the daily breadth for one group, e.g. ('sector', 'Energi', 50)
+        """
+        return self.load()[(group_column, group, f'MA{window}')]
@@ -0,0 +1,241 @@
+# os and json for the store's files
+import os
+import json
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+import numpy as np
+
+from price_panel import PricePanel, _fill_forward
+
+# dates are stored as int32 days since EPOCH
+EPOCH = np.datetime64('1970-01-01', 'D')
+# trading days of room added at the end of every row, new days only rewrite the matrix when it is used up
+DAY_SLACK = 260
+# layout of the store's files, a store of an older format is built again (format 1 carried the closes forward)
+FORMAT = 2
+
+
+def to_offsets(dates):
+    """
+    :return: np.array of int32 days since EPOCH
+    """
+    return (np.asarray(dates, dtype='datetime64[D]') - EPOCH).astype(np.int32)
+
+
+def to_dates(offsets):
+    """
+    :return: pd.DatetimeIndex of int32 days since EPOCH
+    """
+    return pd.DatetimeIndex((EPOCH + np.asarray(offsets).astype('timedelta64[D]')).astype('datetime64[ns]'))
+
+
+class CloseStore:
+    """
+    close prices of the whole universe as one float32 memory-mapped matrix (instruments x trading days)
+    on a shared calendar of int32 day offsets. opening the store only maps the file, a 5000 instruments
+    x 20 years store is about 100 MB on disk and pages are read when used. days an instrument did not
+    trade on are nan in the store, panels carry the closes forward and know the instruments' own trading
+    days. later runs only fetch the days after every instrument's last close
+    """
+    def __init__(self, fetcher, path):
+        """
+        :param fetcher: ApiFetcher used for fetching new days
+        :param path: directory of the store's files
+        """
+        self._fetcher = fetcher
+        self._path = path
+        # instruments already topped up during this run
+        self._checked = set()
+        # ins_id -> (stock prices fetched during this run, True if it is the full history)
+        self.fetched = {}
+        # ins_id -> exception for the instruments that could not be fetched in the last update
+        self.last_failures = {}
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self._path, name)
+
+    def _load(self):
+        meta = {}
+        if os.path.exists(self._file('store.json')):
+            with open(self._file('store.json')) as file:
+                meta = json.load(file)
+        if meta.get('format') == FORMAT:
+            self.calendar = np.load(self._file('calendar.npy'))
+            self.ins_ids = np.load(self._file('ins_ids.npy'))
+            # column of the last close per instrument, -1 for no close
+            self._last = np.load(self._file('last.npy'))
+            self._capacity = meta['capacity']
+        else:
+            self.calendar = np.zeros(0, dtype=np.int32)
+            self.ins_ids = np.zeros(0, dtype=np.int64)
+            self._last = np.zeros(0, dtype=np.int32)
+            self._capacity = 0
+        self._map()
+        self._rows = {int(ins_id): row for row, ins_id in enumerate(self.ins_ids)}
+
+    def _map(self):
+        if len(self.ins_ids) == 0 or self._capacity == 0:
+            self._closes = np.full((len(self.ins_ids), self._capacity), np.nan, dtype=np.float32)
+        else:
+            self._closes = np.memmap(self._file('closes.f32'), dtype=np.float32, mode='r+',
+                                     shape=(len(self.ins_ids), self._capacity))
+
+    def _save(self):
+        """
+        the index-files are written after the matrix, they are replaced atomically
+        """
+        if isinstance(self._closes, np.memmap):
+            self._closes.flush()
+        for name, array in (('calendar.npy', self.calendar), ('ins_ids.npy', self.ins_ids), ('last.npy', self._last)):
+            with open(self._file(name + '.tmp'), 'wb') as file:
+                np.save(file, array)
+            os.replace(self._file(name + '.tmp'), self._file(name))
+        with open(self._file('store.json.tmp'), 'w') as file:
+            json.dump({'format': FORMAT, 'capacity': self._capacity}, file)
+        os.replace(self._file('store.json.tmp'), self._file('store.json'))
+
+    def _resize(self, number_of_rows, number_of_days):
+        """
+        makes room for number_of_rows x number_of_days, new cells are nan
+        """
+        # create directory if it do not exist
+        if not os.path.exists(self._path):
+            os.makedirs(self._path)
+        old_rows = self._closes.shape[0]
+        if number_of_days > self._capacity or old_rows == 0:
+            # a new file with more days per row, the old rows are copied over
+            capacity = max(number_of_days + DAY_SLACK, self._capacity)
+            closes = np.memmap(self._file('closes.f32.tmp'), dtype=np.float32, mode='w+',
+                               shape=(max(number_of_rows, 1), capacity))
+            closes[:] = np.nan
+            closes[:old_rows, :len(self.calendar)] = self._closes[:, :len(self.calendar)]
+            closes.flush()
+            del closes
+            os.replace(self._file('closes.f32.tmp'), self._file('closes.f32'))
+            self._capacity = capacity
+        elif number_of_rows > old_rows:
+            # new rows are appended to the end of the file
+            if isinstance(self._closes, np.memmap):
+                self._closes.flush()
+            with open(self._file('closes.f32'), 'ab') as file:
+                file.write(np.full((number_of_rows - old_rows, self._capacity), np.nan, dtype=np.float32).tobytes())
+        self._closes = np.memmap(self._file('closes.f32'), dtype=np.float32, mode='r+',
+                                 shape=(number_of_rows, self._capacity))
+
+    def _add_days(self, offsets):
+        """
+        adds trading days to the calendar (nan for every instrument until written), days after the last
+        day are appended, earlier days rebuild the matrix on the new calendar
+        """
+        new_offsets = np.setdiff1d(offsets, self.calendar)
+        if len(new_offsets) == 0:
+            return
+        days = len(self.calendar)
+        if days == 0 or new_offsets[0] > self.calendar[-1]:
+            self._resize(len(self.ins_ids), days + len(new_offsets))
+            self.calendar = np.concatenate([self.calendar, new_offsets]).astype(np.int32)
+            return
+        # days inside the calendar (e.g. an instrument from another market), every column moves
+        calendar = np.union1d(self.calendar, new_offsets).astype(np.int32)
+        columns = np.searchsorted(calendar, self.calendar)
+        old_closes = np.array(self._closes[:, :days])
+        self._resize(len(self.ins_ids), len(calendar))
+        closes = np.full((len(self.ins_ids), len(calendar)), np.nan, dtype=np.float32)
+        closes[:, columns] = old_closes
+        self._closes[:, :len(calendar)] = closes
+        self._last = np.where(self._last >= 0, columns[np.maximum(self._last, 0)], -1).astype(np.int32)
+        self.calendar = calendar
+
+    def _add_rows(self, ins_ids):
+        new_ins_ids = [ins_id for ins_id in dict.fromkeys(ins_ids) if ins_id not in self._rows]
+        if len(new_ins_ids) == 0:
+            return
+        for row, ins_id in enumerate(new_ins_ids, start=len(self.ins_ids)):
+            self._rows[ins_id] = row
+        self._resize(len(self.ins_ids) + len(new_ins_ids), max(len(self.calendar), 1))
+        self.ins_ids = np.concatenate([self.ins_ids, np.array(new_ins_ids, dtype=np.int64)])
+        self._last = np.concatenate([self._last, np.full(len(new_ins_ids), -1, dtype=np.int32)])
+
+    def _write_row(self, ins_id, stock_prices, full_history):
+        """
+        writes the closes of stock_prices into the instrument's row, a full history replaces the row
+        """
+        row = self._rows[ins_id]
+        closes = stock_prices['close'].values
+        valid = ~np.isnan(closes)
+        columns = np.searchsorted(self.calendar, to_offsets(stock_prices.index.values[valid]))
+        if full_history:
+            self._closes[row, :] = np.nan
+        if len(columns) > 0:
+            self._closes[row, columns] = closes[valid]
+            self._last[row] = columns[-1]
+
+    def update(self, ins_ids):
+        """
+        tops up ins_ids (once per run): the days from every instrument's last close are fetched,
+        if the last close has changed (e.g. a split) or the instrument is new the full history is fetched
+        """
+        ins_ids = [int(ins_id) for ins_id in dict.fromkeys(ins_ids) if int(ins_id) not in self._checked]
+        if len(ins_ids) == 0:
+            return
+        from_dates = []
+        for ins_id in ins_ids:
+            row = self._rows.get(ins_id)
+            known = row is not None and self._last[row] >= 0
+            from_dates.append(to_dates(self.calendar[[self._last[row]]])[0].date() if known else None)
+        fetched = self._fetcher.fetch_prices(ins_ids, from_dates)
+        failures = dict(self._fetcher.last_failures)
+        topups = {}
+        full_history = []
+        for ins_id, from_date in zip(ins_ids, from_dates):
+            if ins_id not in fetched:
+                continue
+            stock_prices = fetched[ins_id].sort_index()
+            if from_date is None:
+                topups[ins_id] = (stock_prices, True)
+                self.fetched[ins_id] = (stock_prices, True)
+                continue
+            row = self._rows[ins_id]
+            old_close = float(self._closes[row, self._last[row]])
+            overlap = stock_prices[stock_prices.index == pd.Timestamp(from_date)]
+            # float32 keeps about 7 digits
+            if len(overlap) > 0 and abs(overlap['close'].values[0] - old_close) > 1e-5 * max(abs(old_close), 1.0):
+                full_history.append(ins_id)
+                continue
+            self.fetched[ins_id] = (stock_prices, False)
+            topups[ins_id] = (stock_prices[stock_prices.index > pd.Timestamp(from_date)], False)
+        # downloading the adjusted histories again
+        for ins_id, stock_prices in self._fetcher.fetch_prices(full_history).items():
+            topups[ins_id] = (stock_prices.sort_index(), True)
+            self.fetched[ins_id] = topups[ins_id]
+        failures.update(self._fetcher.last_failures)
+        self._add_rows(ins_ids)
+        offsets = [to_offsets(stock_prices.index.values) for stock_prices, full in topups.values()]
+        if len(offsets) > 0:
+            self._add_days(np.unique(np.concatenate(offsets)))
+        for ins_id, (stock_prices, full) in topups.items():
+            self._write_row(ins_id, stock_prices, full)
+        self._save()
+        self._checked.update(ins_ids)
+        self.last_failures = {ins_id: failure for ins_id, failure in failures.items() if ins_id not in topups}
+
+    def panel(self, ins_ids):
+        """
+        close-only PricePanel for ins_ids (instruments without closes are left out), the closes are
+        carried forward over the days an instrument did not trade and days none of them traded on are
+        left out, like PricePanel.subset
+        """
+        rows = np.array([self._rows.get(int(ins_id), -1) for ins_id in ins_ids], dtype=np.intp)
+        rows = rows[rows >= 0]
+        rows = rows[self._last[rows] >= 0]
+        days = len(self.calendar)
+        if len(rows) > 0 and np.array_equal(rows, np.arange(rows[0], rows[0] + len(rows))):
+            # instruments stored next to each other are read as one block of the memory-map
+            closes = self._closes[rows[0]:rows[0] + len(rows), :days]
+        else:
+            closes = self._closes[rows, :days]
+        traded = ~np.isnan(closes)
+        keep = traded.any(axis=0)
+        return PricePanel(self.ins_ids[rows], to_dates(self.calendar[keep]), {'close': _fill_forward(closes[:, keep])},
+                          traded[:, keep])
@@ -0,0 +1,202 @@
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+import numpy as np
+
+from eps_screen import REPORT_TYPES, YEAR_LAG, rolling_eps_acceleration
+
+# days from the end of a period until its report is taken as public, when the report date is missing
+REPORT_DELAY = np.timedelta64(60, 'D')
+# horizon -> trading days of the forward returns
+FORWARD_HORIZONS = {'1m': 21, '3m': 63, '6m': 126, '12m': 252}
+# instruments handled at once for the universe's average returns (bounds the memory)
+CHUNK_ROWS = 500
+# stand-in for a missing publish date in the int day arithmetic
+_NEVER = np.iinfo(np.int64).max
+
+
+def period_ends(periods, report_type):
+    """
+    last day of calendar periods
+    :param periods: np.array of year * 4 + quarter - 1 (or the year for year reports)
+    :return: np.array of datetime64[D]
+    """
+    periods = np.asarray(periods, dtype=np.int64)
+    if report_type == 'year':
+        next_start = (periods - 1969).astype('datetime64[Y]')
+    else:
+        # the first month of the next quarter, months since 1970
+        next_start = ((periods // 4 - 1970) * 12 + (periods % 4 + 1) * 3).astype('datetime64[M]')
+    return next_start.astype('datetime64[D]') - np.timedelta64(1, 'D')
+
+
+def period_labels(periods, report_type):
+    """
+    :return: list of '2019' (year reports) or '2019Q3' labels
+    """
+    periods = np.asarray(periods, dtype=np.int64)
+    if report_type == 'year':
+        return [str(period) for period in periods]
+    return [f'{period // 4}Q{period % 4 + 1}' for period in periods]
+
+
+def _publish_dates(report, periods, report_type):
+    """
+    date a report became public: the report date, else the end of the period + REPORT_DELAY
+    """
+    if 'reportEndDate' in report.columns:
+        # strings (an extension array in pandas >= 3), timestamps or None
+        ends = pd.to_datetime(report['reportEndDate']).values.astype('datetime64[D]')
+    else:
+        ends = period_ends(periods, report_type)
+    ends = np.where(np.isnat(ends), period_ends(periods, report_type), ends)
+    if 'reportDate' not in report.columns:
+        return ends + REPORT_DELAY
+    published = pd.to_datetime(report['reportDate']).values.astype('datetime64[D]')
+    return np.where(np.isnat(published), ends + REPORT_DELAY, published)
+
+
+def pack_eps_history(reports, report_type):
+    """
+    packs every eps-value of every instrument into one array on a shared calendar of report periods
+    (quarters, or years for year reports), together with the date each report was published
+    :param reports: list of (reports_quarter, reports_year, reports_r12), one per instrument
+    :param report_type: 'quarter', 'year' or 'r12'
+    :return: (2-d np.array of eps (instruments x periods, oldest first, nan where a report is missing),
+              2-d datetime64[D] np.array of publish dates (NaT where a report is missing),
+              np.array of the periods, year * 4 + quarter - 1 (or the year for year reports))
+    """
+    rows, periods, values, published = [], [], [], []
+    for row, instrument_reports in enumerate(reports):
+        report = instrument_reports[REPORT_TYPES[report_type]]
+        if len(report) == 0:
+            continue
+        years = report.index.get_level_values('year').values.astype(np.int64)
+        if report_type == 'year':
+            period = years
+        else:
+            period = years * 4 + report.index.get_level_values('period').values.astype(np.int64) - 1
+        rows.append(np.full(len(report), row))
+        periods.append(period)
+        values.append(report['earningsPerShare'].values.astype(float))
+        published.append(_publish_dates(report, period, report_type))
+    if len(rows) == 0:
+        return (np.full((len(reports), 0), np.nan), np.full((len(reports), 0), np.datetime64('NaT'), 'datetime64[D]'),
+                np.zeros(0, dtype=np.int64))
+    periods = np.concatenate(periods)
+    calendar = np.arange(periods.min(), periods.max() + 1)
+    rows = np.concatenate(rows)
+    columns = periods - calendar[0]
+    eps = np.full((len(reports), len(calendar)), np.nan)
+    eps[rows, columns] = np.concatenate(values)
+    publish_dates = np.full(eps.shape, np.datetime64('NaT'), dtype='datetime64[D]')
+    publish_dates[rows, columns] = np.concatenate(published)
+    return eps, publish_dates, calendar
+
+
+def known_dates(publish_dates, window):
+    """
+    date a signal from the reports in a window became known, the latest publish date of the window
+    :param publish_dates: 2-d datetime64[D] np.array from pack_eps_history
+    :param window: number of reports the signal is calculated from (periods + lag)
+    :return: 2-d datetime64[D] np.array, the window ending at report t at column t (NaT if a report is missing)
+    """
+    days = np.where(np.isnat(publish_dates), _NEVER, publish_dates.astype(np.int64))
+    known = np.full(days.shape, _NEVER)
+    if days.shape[1] >= window:
+        known[:, window - 1:] = np.lib.stride_tricks.sliding_window_view(days, window, axis=1).max(axis=2)
+    return np.where(known == _NEVER, np.datetime64('NaT'), known.astype('datetime64[D]'))
+
+
+def universe_forward_returns(close, periods):
+    """
+    average return of the universe over the periods trading days from every date, the benchmark of
+    the excess returns
+    :param close: 2-d np.array (instruments x dates) of carried forward closes
+    :return: np.array, one value per date (nan where no instrument has the full period)
+    """
+    dates = close.shape[1]
+    total = np.zeros(dates)
+    count = np.zeros(dates)
+    if periods >= dates:
+        return np.full(dates, np.nan)
+    for start in range(0, close.shape[0], CHUNK_ROWS):
+        chunk = close[start:start + CHUNK_ROWS]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = chunk[:, periods:] / chunk[:, :dates - periods] - 1
+        valid = np.isfinite(returns)
+        total[:dates - periods] += np.where(valid, returns, 0).sum(axis=0)
+        count[:dates - periods] += valid.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def eps_acceleration_events(reports, ins_ids, panel, report_type='r12', periods=3, lag=None, positive_base=True,
+                            positive_growth=True, horizons=FORWARD_HORIZONS):
+    """
+    every report of every instrument with its eps-acceleration signal (calculated from the reports up to
+    it only), the date the signal was known and the forward returns from the first trading day after it
+    :param reports: list of (reports_quarter, reports_year, reports_r12), one per ins_id
+    :param ins_ids: instrument ids, one per reports
+    :param panel: PricePanel of the instruments' closes
+    :param horizons: dict of horizon name -> trading days
+    :return: pd.DataFrame, one row per report with a known date: ins_id, period, known, entry_date, signal,
+             mean_growth and return_{horizon}, excess_{horizon} (fractions, nan past the last date)
+    """
+    if lag is None:
+        lag = YEAR_LAG[report_type]
+    eps, publish_dates, calendar = pack_eps_history(reports, report_type)
+    signal, mean_growth = rolling_eps_acceleration(eps, lag, periods, positive_base, positive_growth)
+    known = known_dates(publish_dates, periods + lag)
+    # the reports from the first one with a full window, also the ones without a signal (the comparison)
+    rows, columns = np.nonzero(~np.isnat(known) & ~np.isnan(eps))
+    known = known[rows, columns]
+    panel_rows = panel.rows(np.asarray(ins_ids)[rows])
+    # the first trading day after the signal became known (a report may be published after the close)
+    dates = panel.dates.values.astype('datetime64[D]')
+    entry = np.searchsorted(dates, known, side='right')
+    usable = (panel_rows >= 0) & (entry < len(dates))
+    events = pd.DataFrame({'ins_id': np.asarray(ins_ids)[rows].astype(np.int64),
+                           'period': period_labels(calendar[columns], report_type),
+                           'known': pd.DatetimeIndex(known.astype('datetime64[ns]')),
+                           'entry_date': pd.DatetimeIndex(np.where(usable, dates[np.minimum(entry, len(dates) - 1)],
+                                                                   np.datetime64('NaT')).astype('datetime64[ns]')),
+                           'signal': signal[rows, columns],
+                           'mean_growth': mean_growth[rows, columns]})
+    close = panel.close
+    for name, horizon in horizons.items():
+        exits = entry + horizon
+        has_exit = usable & (exits < len(dates))
+        event_returns = np.full(len(rows), np.nan)
+        safe_rows = panel_rows[has_exit]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            event_returns[has_exit] = close[safe_rows, exits[has_exit]] / close[safe_rows, entry[has_exit]] - 1
+        benchmark = universe_forward_returns(close, horizon)
+        events[f'return_{name}'] = event_returns
+        events[f'excess_{name}'] = event_returns - np.where(has_exit, benchmark[np.minimum(entry, len(dates) - 1)],
+                                                            np.nan)
+    return events
+
+
+def backtest_statistics(events, horizons=FORWARD_HORIZONS):
+    """
+    hit-rate and return statistics of the signal, compared to all reports
+    :param events: pd.DataFrame from eps_acceleration_events
+    :return: pd.DataFrame with (group, horizon) as index and the columns events, hit_rate (share of positive
+             returns), mean_return, median_return, mean_excess and excess_hit_rate, in percent
+    """
+    rows = []
+    for group, group_events in (('signal', events[events['signal']]), ('all reports', events)):
+        for name in horizons:
+            returns = group_events[f'return_{name}'].dropna().values
+            excess = group_events[f'excess_{name}'].dropna().values
+            if len(returns) == 0:
+                rows.append({'group': group, 'horizon': name, 'events': 0})
+                continue
+            rows.append({'group': group, 'horizon': name, 'events': len(returns),
+                         'hit_rate': round(float((returns > 0).mean()) * 100, 1),
+                         'mean_return': round(float(returns.mean()) * 100, 2),
+                         'median_return': round(float(np.median(returns)) * 100, 2),
+                         'mean_excess': round(float(excess.mean()) * 100, 2) if len(excess) > 0 else np.nan,
+                         'excess_hit_rate': round(float((excess > 0).mean()) * 100, 1) if len(excess) > 0 else np.nan})
+    columns = ['events', 'hit_rate', 'mean_return', 'median_return', 'mean_excess', 'excess_hit_rate']
+    return pd.DataFrame(rows).set_index(['group', 'horizon']).reindex(columns=columns)
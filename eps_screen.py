@@ -0,0 +1,93 @@
+import numpy as np
+
+# position of each report type in the tuple returned by BorsdataAPI.get_instrument_reports
+REPORT_TYPES = {'quarter': 0, 'year': 1, 'r12': 2}
+# periods between a report and the same report one year earlier
+YEAR_LAG = {'quarter': 4, 'year': 1, 'r12': 4}
+
+
+def pack_eps(reports, report_type, length):
+    """
+    packs the last length eps-values of every instrument into one array, right-aligned on the
+    latest report so the last column is every instrument's latest report
+    :param reports: list of (reports_quarter, reports_year, reports_r12), one per instrument
+    :param report_type: 'quarter', 'year' or 'r12'
+    :param length: number of reports to keep
+    :return: 2-d np.array (instruments x length), nan where an instrument has fewer reports
+    """
+    eps = np.full((len(reports), length), np.nan)
+    for row, instrument_reports in enumerate(reports):
+        report = instrument_reports[REPORT_TYPES[report_type]]
+        if len(report) == 0:
+            continue
+        values = report.sort_index()['earningsPerShare'].values[-length:]
+        eps[row, length - len(values):] = values
+    return eps
+
+
+def eps_growth(eps, lag):
+    """
+    growth in percent between each report and the report lag periods earlier
+    :param eps: 2-d np.array from pack_eps
+    :param lag: periods between the compared reports, e.g. 4 for year-on-year of quarter reports
+    :return: 2-d np.array (instruments x (length - lag)), oldest growth first, nan where the earlier
+             eps is 0 (the growth is undefined)
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth = (eps[:, lag:] - eps[:, :-lag]) / eps[:, :-lag] * 100
+    # a zero base gives +-inf, which would pass the acceleration checks and cast to a garbage int
+    growth[np.isinf(growth)] = np.nan
+    return growth
+
+
+def eps_acceleration(eps, lag, positive_base=True, positive_growth=True):
+    """
+    instruments where the eps-growth accelerates, i.e. every growth is larger than the one before
+    :param eps: 2-d np.array from pack_eps with periods + lag columns
+    :param lag: periods between the compared reports
+    :param positive_base: require the eps-values the growths are calculated from to be > 0
+    :param positive_growth: require the oldest growth to be > 0 (and thereby all of them)
+    :return: (bool np.array of accelerating instruments, 2-d np.array of growths)
+    """
+    growth = eps_growth(eps, lag)
+    # nan (too few reports) compares False and is never accelerating
+    with np.errstate(invalid='ignore'):
+        accelerating = np.all(np.diff(growth, axis=1) > 0, axis=1) & ~np.isnan(growth).any(axis=1)
+        if positive_growth:
+            accelerating &= growth[:, 0] > 0
+        if positive_base:
+            accelerating &= np.all(eps[:, :-lag] > 0, axis=1)
+    return accelerating, growth
+
+
+def rolling_eps_acceleration(eps, lag, periods, positive_base=True, positive_growth=True):
+    """
+    the eps_acceleration condition evaluated at every report at once: a report is accelerating if the
+    growths of it and the periods - 1 reports before it are increasing (only reports up to it are used)
+    :param eps: 2-d np.array (instruments x report periods), oldest first, nan for missing reports
+    :param lag: periods between the compared reports
+    :param periods: number of growths that must accelerate
+    :param positive_base: require the eps-values the growths are calculated from to be > 0
+    :param positive_growth: require the oldest growth to be > 0 (and thereby all of them)
+    :return: (2-d bool np.array of accelerating reports, 2-d np.array of the mean growth of the window),
+             both the same shape as eps
+    """
+    length = eps.shape[1]
+    accelerating = np.zeros(eps.shape, dtype=bool)
+    mean_growth = np.full(eps.shape, np.nan)
+    if length < periods + lag:
+        return accelerating, mean_growth
+    growth = eps_growth(eps, lag)
+    # (instruments x windows x periods), window w holds the growths of the reports w + lag .. w + lag + periods - 1
+    windows = np.lib.stride_tricks.sliding_window_view(growth, periods, axis=1)
+    with np.errstate(invalid='ignore'):
+        window_accelerating = np.all(np.diff(windows, axis=2) > 0, axis=2) & ~np.isnan(windows).any(axis=2)
+        if positive_growth:
+            window_accelerating &= windows[:, :, 0] > 0
+        if positive_base:
+            bases = np.lib.stride_tricks.sliding_window_view(eps[:, :length - lag], periods, axis=1)
+            window_accelerating &= np.all(bases > 0, axis=2)
+    # the window ending at report t is stored at column t
+    accelerating[:, periods + lag - 1:] = window_accelerating
+    mean_growth[:, periods + lag - 1:] = windows.mean(axis=2)
+    return accelerating, mean_growth
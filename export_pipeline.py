@@ -0,0 +1,228 @@
+# os for file- and directory-handling
+import os
+import re
+# importlib for finding the excel-writer and parquet engine without importing them
+import importlib.util
+import time
+import queue
+import atexit
+import threading
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+
+# the workbook is streamed with xlsxwriter (constant memory) or openpyxl (write-only), whichever is installed.
+# only probed here, the writer is imported when the first sheet is written (keeps the cli start fast)
+_EXCEL_WRITER = next((writer for writer in ('xlsxwriter', 'openpyxl') if importlib.util.find_spec(writer) is not None),
+                     None)
+# parquet needs pyarrow (or fastparquet), only the csv-copies are written when neither is installed
+_PARQUET = any(importlib.util.find_spec(engine) is not None for engine in ('pyarrow', 'fastparquet'))
+
+# excel does not allow these in sheet names, and at most 31 characters
+_SHEET_NAME_CHARACTERS = re.compile(r'[\[\]:*?/\\]')
+MAX_SHEET_NAME = 31
+
+
+def _flat(frame):
+    """
+    frame with a default index and one level of string column names (parquet, csv and one header row)
+    """
+    if not isinstance(frame.index, pd.RangeIndex):
+        frame = frame.reset_index()
+    if isinstance(frame.columns, pd.MultiIndex):
+        frame.columns = [' '.join(str(level) for level in column if str(level) != '') for column in frame.columns]
+    else:
+        frame.columns = [str(column) for column in frame.columns]
+    return frame
+
+
+def _rows(frame):
+    """
+    rows of python values (nan as None, dates as datetime) for the excel-writers
+    """
+    columns = []
+    for name in frame.columns:
+        column = frame[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype(object)
+        if pd.api.types.is_datetime64_any_dtype(column):
+            columns.append([None if pd.isna(value) else value.to_pydatetime() for value in column])
+        else:
+            columns.append([None if pd.isna(value) else value for value in column.tolist()])
+    return zip(*columns)
+
+
+class ExportPipeline:
+    """
+    exports the screener outputs of a run in a background thread, so the next screener computes while
+    the files are written. every output becomes a sheet of one workbook (streamed with a write-only
+    writer, saved when the pipeline is closed) and a parquet- and csv-copy for downstream jobs
+    """
+    def __init__(self, export_path='file_exports/', workbook='screeners.xlsx', formats=('parquet', 'csv')):
+        """
+        :param export_path: directory of the exported files
+        :param workbook: file name of the workbook, None for no workbook
+        :param formats: copies written per output, 'parquet' and/or 'csv'
+        """
+        # absolute, the files are written in the background also if the working directory changes
+        self._export_path = os.path.abspath(export_path)
+        self._workbook_name = workbook
+        self._formats = tuple(formats)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._workbook = None
+        self._sheet_names = set()
+        # file paths written so far and seconds spent writing them (in the background thread)
+        self.written = []
+        self.seconds = 0.0
+        # (name, exception) for the outputs that could not be written
+        self.errors = []
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                # create directory if it do not exist
+                if not os.path.exists(self._export_path):
+                    os.makedirs(self._export_path)
+                # daemon, so an unclosed pipeline never blocks the interpreter, close() runs at exit instead
+                self._thread = threading.Thread(target=self._run, name='ExportPipeline', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, name, frame):
+        """
+        queues a screener output, a copy is exported so the caller may keep changing the frame
+        :param name: name of the output, e.g. 'branch-breadth' (file name and sheet name)
+        :param frame: pd.DataFrame (or pd.Series)
+        """
+        if isinstance(frame, pd.Series):
+            frame = frame.to_frame()
+        self._start()
+        self._queue.put((name, frame.copy()))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            name, frame = item
+            start = time.perf_counter()
+            try:
+                self._write(name, _flat(frame))
+            except Exception as exception:
+                # the other outputs are still written
+                print(f"ExportPipeline >> export of {name} failed: {exception!r}")
+                self.errors.append((name, exception))
+            self.seconds += time.perf_counter() - start
+            self._queue.task_done()
+
+    def _file_path(self, file_name):
+        return os.path.join(self._export_path, file_name)
+
+    def _write(self, name, frame):
+        if 'parquet' in self._formats and _PARQUET:
+            frame.to_parquet(self._file_path(f'{name}.parquet'), index=False)
+            self.written.append(self._file_path(f'{name}.parquet'))
+        if 'csv' in self._formats:
+            frame.to_csv(self._file_path(f'{name}.csv'), index=False)
+            self.written.append(self._file_path(f'{name}.csv'))
+        if self._workbook_name is not None and _EXCEL_WRITER is not None:
+            self._add_sheet(name, frame)
+
+    def _sheet_name(self, name):
+        sheet_name = _SHEET_NAME_CHARACTERS.sub('-', name)[:MAX_SHEET_NAME]
+        number = 2
+        while sheet_name.lower() in self._sheet_names:
+            suffix = f' ({number})'
+            sheet_name = _SHEET_NAME_CHARACTERS.sub('-', name)[:MAX_SHEET_NAME - len(suffix)] + suffix
+            number += 1
+        self._sheet_names.add(sheet_name.lower())
+        return sheet_name
+
+    def _add_sheet(self, name, frame):
+        """
+        streams the frame into a new sheet, the rows are not kept in memory by the writer
+        """
+        sheet_name = self._sheet_name(name)
+        if _EXCEL_WRITER == 'xlsxwriter':
+            import xlsxwriter
+            if self._workbook is None:
+                # written to a temporary file, the old workbook is replaced when the new one is complete
+                self._workbook = xlsxwriter.Workbook(self._file_path(self._workbook_name + '.tmp'),
+                                                     {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'})
+            worksheet = self._workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, list(frame.columns))
+            for row, values in enumerate(_rows(frame), start=1):
+                worksheet.write_row(row, 0, values)
+        else:
+            import openpyxl
+            if self._workbook is None:
+                self._workbook = openpyxl.Workbook(write_only=True)
+            worksheet = self._workbook.create_sheet(sheet_name)
+            worksheet.append(list(frame.columns))
+            for values in _rows(frame):
+                worksheet.append(values)
+
+    def _save_workbook(self):
+        if self._workbook is None:
+            return
+        tmp_path = self._file_path(self._workbook_name + '.tmp')
+        if _EXCEL_WRITER == 'xlsxwriter':
+            self._workbook.close()
+        else:
+            self._workbook.save(tmp_path)
+        os.replace(tmp_path, self._file_path(self._workbook_name))
+        self.written.append(self._file_path(self._workbook_name))
+        self._workbook = None
+        self._sheet_names = set()
+
+    def flush(self):
+        """
+        blocks until every queued output has been written (the workbook is saved by close)
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """
+        writes the queued outputs, saves the workbook and stops the background thread. the pipeline
+        can be used again after close, the next output starts a new workbook
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join()
+        atexit.unregister(self.close)
+        try:
+            self._save_workbook()
+        except Exception as exception:
+            print(f"ExportPipeline >> saving {self._workbook_name} failed: {exception!r}")
+            self.errors.append((self._workbook_name, exception))
+
+
+class ExportCollector:
+    """
+    stand-in for ExportPipeline in the worker processes of a RunPlanner: the outputs are kept and
+    returned to the parent, whose pipeline writes them (one workbook, no files written by the workers)
+    """
+    def __init__(self):
+        # (name, frame) in the order they were submitted
+        self.outputs = []
+
+    def submit(self, name, frame):
+        """
+        keeps a copy of a screener output, see ExportPipeline.submit
+        """
+        if isinstance(frame, pd.Series):
+            frame = frame.to_frame()
+        self.outputs.append((name, frame.copy()))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,247 @@
+# time, threading and collections for simulated latency, throttling and call counts
+import time
+import threading
+import collections
+import random
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+import numpy as np
+
+from api_fetcher import ApiError
+
+# meta-data with the same names as the real api
+COUNTRIES = {1: 'Sverige', 2: 'Norge', 3: 'Finland', 4: 'Danmark'}
+MARKETS = {1: 'Large Cap', 2: 'Mid Cap', 3: 'Small Cap', 4: 'First North', 5: 'Spotlight', 6: 'NGM', 7: 'Index'}
+SECTORS = {1: 'Energi', 2: 'Kraftförsörjning', 3: 'Material', 4: 'Dagligvaror', 5: 'Sällanköpsvaror',
+           6: 'Industri', 7: 'Hälsovård', 8: 'Finans & Fastighet', 9: 'Informationsteknik', 10: 'Telekommunikation'}
+# branch id -> (name, sector id)
+BRANCHES = {1: ('Olja & Gas - Exploatering', 1), 2: ('Vindkraft', 2), 3: ('Elförsörjning', 2),
+            4: ('Kemikalier', 3), 5: ('Gruv - Guld & Silver', 3), 6: ('Livsmedel', 4), 7: ('Bryggeri', 4),
+            8: ('Kläder & Skor', 5), 9: ('Detaljhandel', 5), 10: ('Industrimaskiner', 6),
+            11: ('Byggnation & Infrastruktur', 6), 12: ('Läkemedel', 7), 13: ('Biotech', 7),
+            14: ('Medicinsk Utrustning', 7), 15: ('Banker', 8), 16: ('Fastighetsbolag', 8),
+            17: ('Investmentbolag', 8), 18: ('IT-Konsulter', 9), 19: ('Affärs- & IT-System', 9),
+            20: ('Bredband & Telefoni', 10)}
+
+
+class FakeBorsdataAPI:
+    """
+    deterministic stand-in for BorsdataAPI with synthetic instruments, stock prices, reports and kpi histories.
+    the data only depends on seed and ins_id, so every run (and every call order) gives the same data.
+    latency and the api's request quota can be simulated, calls over the quota raise ApiError(429)
+    """
+    def __init__(self, number_of_instruments=100, seed=0, latency=0.0, calls_per_second=None,
+                 error_rate=0.0, start_date='2005-01-03', end_date='2024-06-28', country_holidays=0.0):
+        """
+        :param number_of_instruments: size of the universe (a few index instruments are added)
+        :param seed: seed for the random data
+        :param latency: seconds every call sleeps, simulating the network
+        :param calls_per_second: calls allowed per second before ApiError(429), default no limit
+        :param error_rate: fraction of calls failing with ApiError(503)
+        :param start_date: first trading day of the price histories
+        :param end_date: last trading day of the price histories
+        :param country_holidays: fraction of the weekdays every country's exchange is closed (its own
+                                 holidays, the other countries trade), default 0 (one shared calendar)
+        """
+        self._number_of_instruments = number_of_instruments
+        self._seed = seed
+        self._latency = latency
+        self._calls_per_second = calls_per_second
+        self._error_rate = error_rate
+        self._dates = pd.bdate_range(start_date, end_date)
+        self._country_holidays = country_holidays
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._call_times = collections.deque()
+        # endpoint -> number of calls
+        self.calls = collections.Counter()
+
+    def __getstate__(self):
+        # the lock can not be pickled, e.g. when the api is handed to worker processes
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _call(self, endpoint):
+        """
+        counts the call and simulates latency, throttling and errors
+        """
+        with self._lock:
+            self.calls[endpoint] += 1
+            now = time.monotonic()
+            if self._calls_per_second is not None:
+                # sliding window of the calls made during the last second
+                while len(self._call_times) > 0 and now - self._call_times[0] > 1:
+                    self._call_times.popleft()
+                if len(self._call_times) >= self._calls_per_second:
+                    raise ApiError(429, endpoint)
+                self._call_times.append(now)
+            failing = self._random.random() < self._error_rate
+        if self._latency > 0:
+            time.sleep(self._latency)
+        if failing:
+            raise ApiError(503, endpoint)
+
+    def _rng(self, ins_id, salt=0):
+        return np.random.default_rng([self._seed, int(ins_id), salt])
+
+    @staticmethod
+    def _meta_frame(names):
+        return pd.DataFrame({'name': list(names.values())}, index=pd.Index(list(names.keys()), name='id'))
+
+    def get_countries(self):
+        self._call('countries')
+        return self._meta_frame(COUNTRIES)
+
+    def get_markets(self):
+        self._call('markets')
+        return self._meta_frame(MARKETS)
+
+    def get_sectors(self):
+        self._call('sectors')
+        return self._meta_frame(SECTORS)
+
+    def get_branches(self):
+        self._call('branches')
+        branches = self._meta_frame({branch_id: name for branch_id, (name, sector_id) in BRANCHES.items()})
+        branches['sectorId'] = [sector_id for name, sector_id in BRANCHES.values()]
+        return branches
+
+    def _instrument_ids(self):
+        """
+        :return: (branch ids, market ids, country ids) of the instruments 1..number_of_instruments
+        """
+        rng = np.random.default_rng([self._seed, 0])
+        n = self._number_of_instruments
+        branch_ids = rng.integers(1, len(BRANCHES) + 1, n)
+        market_ids = rng.choice([1, 2, 3, 4, 5, 6], n, p=[0.2, 0.2, 0.2, 0.3, 0.05, 0.05])
+        country_ids = rng.choice([1, 2, 3, 4], n, p=[0.5, 0.2, 0.15, 0.15])
+        return branch_ids, market_ids, country_ids
+
+    def _trading_days(self, ins_id):
+        """
+        the days the exchange of ins_id's country is open
+        """
+        if self._country_holidays <= 0:
+            return self._dates
+        n = self._number_of_instruments
+        country_id = int(ins_id) - n if int(ins_id) > n else int(self._instrument_ids()[2][int(ins_id) - 1])
+        rng = np.random.default_rng([self._seed, 1000 + country_id])
+        closed = rng.random(len(self._dates)) < self._country_holidays
+        return self._dates[~closed]
+
+    def get_instruments(self):
+        self._call('instruments')
+        n = self._number_of_instruments
+        ins_ids = np.arange(1, n + 1)
+        branch_ids, market_ids, country_ids = self._instrument_ids()
+        instruments = pd.DataFrame({'name': [f'Bolag {ins_id}' for ins_id in ins_ids],
+                                    'urlName': [f'bolag-{ins_id}' for ins_id in ins_ids],
+                                    'instrument': 0,
+                                    'isin': [f'SE{ins_id:010d}' for ins_id in ins_ids],
+                                    'ticker': [f'BOL{ins_id}' for ins_id in ins_ids],
+                                    'sectorId': [BRANCHES[branch_id][1] for branch_id in branch_ids],
+                                    'marketId': market_ids,
+                                    'branchId': branch_ids,
+                                    'countryId': country_ids},
+                                   index=pd.Index(ins_ids, name='insId'))
+        # one index instrument per country
+        indexes = pd.DataFrame({'name': [f'Index {name}' for name in COUNTRIES.values()],
+                                'urlName': [f'index-{country_id}' for country_id in COUNTRIES],
+                                'instrument': 2,
+                                'isin': None,
+                                'ticker': [f'IDX{country_id}' for country_id in COUNTRIES],
+                                'sectorId': np.nan,
+                                'marketId': 7,
+                                'branchId': np.nan,
+                                'countryId': list(COUNTRIES.keys())},
+                               index=pd.Index(n + np.arange(1, len(COUNTRIES) + 1), name='insId'))
+        return pd.concat([instruments, indexes])
+
+    def _stock_prices(self, ins_id):
+        """
+        full synthetic price history for ins_id (geometric random walk from a random listing day)
+        """
+        rng = self._rng(ins_id, 1)
+        # listing day counted from start_date and one random stream per column, i.e. a later
+        # end_date only adds days and never changes the days before
+        listing = min(int(rng.integers(0, 4000)), max(len(self._dates) - 250, 0))
+        level = 10 * np.exp(rng.normal(2, 1))
+        dates = self._trading_days(ins_id)
+        dates = dates[dates >= self._dates[listing]]
+        close = level * np.exp(np.cumsum(self._rng(ins_id, 3).normal(0.0003, 0.02, len(dates))))
+        spread = np.abs(self._rng(ins_id, 4).normal(0, 0.01, len(dates)))
+        return pd.DataFrame({'close': close,
+                             'high': close * (1 + spread),
+                             'low': close * (1 - spread),
+                             'open': close * (1 + self._rng(ins_id, 5).normal(0, 0.005, len(dates))),
+                             'volume': self._rng(ins_id, 6).integers(1000, 1000000, len(dates)).astype(float)},
+                            index=pd.Index(dates, name='date'))
+
+    def get_instrument_stock_prices(self, ins_id, from_date=None, to_date=None, max_count=None):
+        self._call('stockprices')
+        stock_prices = self._stock_prices(ins_id)
+        if from_date is not None:
+            stock_prices = stock_prices[stock_prices.index >= pd.Timestamp(from_date)]
+        if to_date is not None:
+            stock_prices = stock_prices[stock_prices.index <= pd.Timestamp(to_date)]
+        # the api returns the newest day first
+        stock_prices = stock_prices.sort_index(ascending=False)
+        if max_count is not None:
+            stock_prices = stock_prices.head(max_count)
+        return stock_prices
+
+    def _reports(self, ins_id):
+        """
+        synthetic quarter, year and r12 reports for ins_id, 40 quarters up to end_date
+        """
+        rng = self._rng(ins_id, 2)
+        last_quarter_end = (self._dates[-1] - pd.offsets.QuarterEnd(1)).normalize()
+        quarter_ends = pd.date_range(end=last_quarter_end, periods=40, freq='QE')
+        # quarterly eps with a random trend and noise, r12 is the sum of the last four quarters
+        eps = rng.normal(1, 0.5) + np.cumsum(rng.normal(0.02, 0.15, len(quarter_ends) + 3))
+        shares = float(rng.integers(10, 500)) * 1e6
+        r12_eps = np.convolve(eps, np.ones(4), mode='valid')
+        eps = eps[3:]
+        report_dates = quarter_ends + pd.to_timedelta(rng.integers(20, 60, len(quarter_ends)), unit='D')
+
+        def frame(values, ends, publish, periods):
+            return pd.DataFrame({'year': ends.year, 'period': periods,
+                                 'revenues': np.abs(values) * shares / 1e5,
+                                 'profitToEquityHolders': values * shares / 1e6,
+                                 'earningsPerShare': values,
+                                 'numberOfShares': shares / 1e6,
+                                 'reportStartDate': ends - pd.offsets.QuarterBegin(1, startingMonth=1),
+                                 'reportEndDate': ends,
+                                 'reportDate': publish}).set_index(['year', 'period']).sort_index(ascending=False)
+
+        reports_quarter = frame(eps, quarter_ends, report_dates, quarter_ends.quarter)
+        reports_r12 = frame(r12_eps, quarter_ends, report_dates, quarter_ends.quarter)
+        # year reports are the r12 of the fourth quarters
+        q4 = quarter_ends.quarter == 4
+        reports_year = frame(r12_eps[q4], quarter_ends[q4], report_dates[q4], 5)
+        return reports_quarter, reports_year, reports_r12
+
+    def get_instrument_reports(self, ins_id, max_count=None):
+        self._call('reports')
+        return self._reports(ins_id)
+
+    def get_kpi_history(self, ins_id, kpi_id, report_type, price_type, max_count=None):
+        self._call('kpis')
+        rng = np.random.default_rng([self._seed, int(ins_id), 100 + int(kpi_id)])
+        last_year = self._dates[-1].year - 1
+        if report_type == 'year':
+            index = [(year, 5) for year in range(last_year - 19, last_year + 1)]
+        else:
+            index = [(year, period) for year in range(last_year - 9, last_year + 1) for period in range(1, 5)]
+        # kpi-values as a random walk around a level that depends on the kpi
+        values = (1 + int(kpi_id) % 10) * 5 + np.cumsum(rng.normal(0, 2, len(index)))
+        kpi_history = pd.DataFrame({'kpiValue': values},
+                                   index=pd.MultiIndex.from_tuples(index, names=['year', 'period']))
+        if max_count is not None:
+            kpi_history = kpi_history.tail(max_count)
+        return kpi_history.sort_index(ascending=False)
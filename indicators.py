@@ -0,0 +1,230 @@
+# ast for checking the screen expressions before they are evaluated
+import ast
+import re
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+import numpy as np
+
+# trading days of the 52-week high and low
+YEAR = 252
+# spans of the mcclellan oscillator's emas (the 10% and 5% trends)
+MCCLELLAN_SPANS = (19, 39)
+
+# per-instrument indicators (instruments x dates), the number is the window in trading days
+INSTRUMENT_INDICATORS = {
+    'sma': re.compile(r'^sma(\d+)$'),              # simple moving-average
+    'ema': re.compile(r'^ema(\d+)$'),              # exponential moving-average (span)
+    'high': re.compile(r'^high(\d+)$'),            # highest close of the window
+    'low': re.compile(r'^low(\d+)$'),              # lowest close of the window
+    'dist_high': re.compile(r'^dist_high(\d+)$'),  # close / highest close - 1 (0 at a high, -0.1 is 10% below)
+    'dist_low': re.compile(r'^dist_low(\d+)$'),    # close / lowest close - 1
+    'new_high': re.compile(r'^new_high(\d+)$'),    # close above every close of the window before it
+    'new_low': re.compile(r'^new_low(\d+)$'),      # close below every close of the window before it
+    'return': re.compile(r'^return(\d+)$'),        # return over the window (fraction)
+}
+# universe indicators (one value per date)
+UNIVERSE_INDICATORS = ('advances', 'declines', 'net_advances', 'ad_line', 'new_highs', 'new_lows',
+                       'mcclellan', 'summation')
+# functions allowed in expressions
+FUNCTIONS = {'abs': np.abs, 'minimum': np.minimum, 'maximum': np.maximum, 'where': np.where, 'log': np.log}
+# syntax allowed in expressions: arithmetic, single comparisons and & | ~ for combining conditions
+_ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Name, ast.Load, ast.Constant, ast.Call,
+                  ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd, ast.Invert, ast.BitAnd, ast.BitOr,
+                  ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq)
+
+
+def ema(values, span):
+    """
+    exponential moving-average along the rows (alpha = 2 / (span + 1)), started at every row's first
+    value (same as pd.Series.ewm(span=span, adjust=False).mean() on a series without gaps). one vector
+    step per column for all rows at once
+    :param values: 2-d np.array (rows x dates or sessions), leading nans are kept
+    :return: 2-d np.array
+    """
+    alpha = 2 / (span + 1)
+    averages = np.full(values.shape, np.nan)
+    previous = np.full(values.shape[0], np.nan)
+    for column in range(values.shape[1]):
+        value = values[:, column]
+        previous = np.where(np.isnan(previous), value,
+                            np.where(np.isnan(value), previous, alpha * value + (1 - alpha) * previous))
+        averages[:, column] = previous
+    return averages
+
+
+def rolling_max(values, window):
+    """
+    max of the last window values along the rows for every date, in two passes of block-wise running
+    maxima (van herk / gil-werman) instead of window comparisons per date. nan until window values exist
+    :param values: 2-d np.array (rows x dates)
+    :return: 2-d np.array
+    """
+    rows, dates = values.shape
+    result = np.full(values.shape, np.nan)
+    if window > dates or window < 1:
+        return result
+    blocks = -(-dates // window)
+    padded = np.full((rows, blocks * window), -np.inf)
+    valid = ~np.isnan(values)
+    padded[:, :dates] = np.where(valid, values, -np.inf)
+    padded = padded.reshape(rows, blocks, window)
+    # running max from the start of every block and from the end of every block
+    prefix = np.maximum.accumulate(padded, axis=2).reshape(rows, -1)
+    suffix = np.maximum.accumulate(padded[:, :, ::-1], axis=2)[:, :, ::-1].reshape(rows, -1)
+    # the window ending at date t starts at t - window + 1 and spans at most two blocks
+    ends = np.arange(window - 1, dates)
+    result[:, window - 1:] = np.maximum(suffix[:, ends - window + 1], prefix[:, ends])
+    # windows with a missing value (e.g. before listing) are nan, like the moving-averages
+    counts = np.zeros((rows, dates + 1), dtype=np.int64)
+    np.cumsum(valid, axis=1, out=counts[:, 1:])
+    result[:, window - 1:][counts[:, window:] - counts[:, :-window] < window] = np.nan
+    return result
+
+
+def rolling_min(values, window):
+    """
+    min of the last window values along the rows, see rolling_max
+    """
+    return -rolling_max(-values, window)
+
+
+def _check_expression(tree, expression):
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"IndicatorEngine >> {type(node).__name__} is not allowed in '{expression}', "
+                             f"use & | ~ to combine conditions")
+        if isinstance(node, ast.Compare) and len(node.ops) > 1:
+            raise ValueError(f"IndicatorEngine >> chained comparisons are not allowed in '{expression}', "
+                             f"use (a < b) & (b < c)")
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS
+                                           or len(node.keywords) > 0):
+            raise ValueError(f"IndicatorEngine >> only the functions {sorted(FUNCTIONS)} are allowed in '{expression}'")
+
+
+class IndicatorEngine:
+    """
+    technical indicators for the whole universe of a PricePanel, every indicator is computed once for
+    all instruments and dates in batched numpy passes and kept for the following screens. windows count
+    every instrument's own trading days (PricePanel.sessions), on a date an instrument did not trade its
+    indicators are the ones of its latest session, so they do not depend on the rest of the universe. screens are
+    expressions over the indicator names, e.g. 'close > sma50', '(dist_high252 > -0.05) & (sma50 > sma200)'
+    or 'return63 - return252 / 4'
+    """
+    def __init__(self, panel):
+        """
+        :param panel: PricePanel with close (carried forward, nan before listing) and the traded days
+        """
+        self.panel = panel
+        self._cache = {}
+
+    def __getitem__(self, name):
+        """
+        an indicator by name, e.g. 'sma50', 'ema20', 'dist_high252', 'new_highs' or 'mcclellan'
+        :return: 2-d np.array (instruments x dates) or np.array (dates) for the universe indicators
+        """
+        if name not in self._cache:
+            self._cache[name] = self._compute(name)
+        return self._cache[name]
+
+    def _compute(self, name):
+        panel = self.panel
+        close = panel.close
+        if name in self.panel.fields:
+            return self.panel.field(name)
+        if name in UNIVERSE_INDICATORS:
+            return self._universe(name)
+        for kind, pattern in INSTRUMENT_INDICATORS.items():
+            match = pattern.match(name)
+            if match is None:
+                continue
+            window = int(match.group(1))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                if kind == 'sma':
+                    return self.panel.sma(window)
+                if kind == 'ema':
+                    return panel.expand(ema(panel.sessions(), window))
+                if kind == 'high':
+                    return panel.expand(rolling_max(panel.sessions(), window))
+                if kind == 'low':
+                    return panel.expand(rolling_min(panel.sessions(), window))
+                if kind == 'dist_high':
+                    return close / self[f'high{window}'] - 1
+                if kind == 'dist_low':
+                    return close / self[f'low{window}'] - 1
+                if kind == 'return':
+                    return self.panel.returns(window)
+                # the sessions before, a new high has to beat all of them
+                sessions = panel.sessions()
+                before = np.full(sessions.shape, np.nan)
+                before[:, 1:] = (rolling_max if kind == 'new_high' else rolling_min)(sessions, window)[:, :-1]
+                new = sessions > before if kind == 'new_high' else sessions < before
+                return panel.expand(new.astype(float)) == 1
+        raise KeyError(f"IndicatorEngine >> unknown indicator {name}, known: {self.panel.fields} "
+                       f"{[pattern.pattern for pattern in INSTRUMENT_INDICATORS.values()]} {list(UNIVERSE_INDICATORS)}")
+
+    def _universe(self, name):
+        # only the instruments trading on a date are counted on it
+        traded = self.panel.traded
+        if name in ('advances', 'declines'):
+            # change from every instrument's previous session
+            sessions = self.panel.sessions()
+            change = np.full(sessions.shape, np.nan)
+            change[:, 1:] = sessions[:, 1:] - sessions[:, :-1]
+            change = self.panel.expand(change)
+            with np.errstate(invalid='ignore'):
+                return (((change > 0) if name == 'advances' else (change < 0)) & traded).sum(axis=0)
+        if name == 'net_advances':
+            return self['advances'] - self['declines']
+        if name == 'ad_line':
+            return np.cumsum(self['net_advances'])
+        if name == 'new_highs':
+            return (self[f'new_high{YEAR}'] & traded).sum(axis=0)
+        if name == 'new_lows':
+            return (self[f'new_low{YEAR}'] & traded).sum(axis=0)
+        if name == 'mcclellan':
+            # ratio-adjusted net advances, comparable while the universe grows
+            changed = self['advances'] + self['declines']
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ratio = np.where(changed > 0, self['net_advances'] / changed * 1000, 0.0)
+            fast, slow = (ema(ratio[None, :], span)[0] for span in MCCLELLAN_SPANS)
+            return fast - slow
+        # summation index
+        return np.cumsum(self['mcclellan'])
+
+    def evaluate(self, expression):
+        """
+        evaluates an expression over the indicators for all instruments and dates
+        :param expression: e.g. 'close > sma50' or '(new_high252) & (return21 > 0.05)'
+        :return: 2-d np.array (instruments x dates), np.array (dates) when only universe indicators are used
+        """
+        tree = ast.parse(expression, mode='eval')
+        _check_expression(tree, expression)
+        names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and node.id not in FUNCTIONS}
+        namespace = dict(FUNCTIONS, **{name: self[name] for name in names})
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return eval(compile(tree, '<screen>', 'eval'), {'__builtins__': {}}, namespace)
+
+    def last(self, expression):
+        """
+        :return: np.array of the expression on the last date, one value per instrument
+        """
+        return np.asarray(self.evaluate(expression))[..., -1]
+
+    def frame(self, names):
+        """
+        universe indicators as a data frame
+        :param names: e.g. ['advances', 'declines', 'ad_line', 'mcclellan']
+        :return: pd.DataFrame with date as index and one column per name
+        """
+        return pd.DataFrame({name: self[name] for name in names}, index=self.panel.dates)
+
+    def percent(self, expression):
+        """
+        percent of the listed instruments where a condition is true for every date, e.g. 'close > sma50'
+        is the classic breadth
+        :return: pd.Series with date as index
+        """
+        listed = self.panel.listed().sum(axis=0)
+        true = np.asarray(self.evaluate(expression), dtype=bool).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.Series(np.where(listed > 0, true / listed * 100, np.nan), index=self.panel.dates)
@@ -0,0 +1,136 @@
+# os for file- and directory-handling
+import os
+# datetime for date- and time-stuff
+import datetime as dt
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+import numpy as np
+
+# instrument type dict for conversion (https://github.com/Borsdata-Sweden/API/wiki/Instruments)
+INSTRUMENT_TYPES = {0: 'Aktie', 1: 'Pref', 2: 'Index', 3: 'Stocks2', 4: 'SectorIndex',
+                    5: 'BranschIndex', 8: 'SPAC', 13: 'Index GI'}
+# columns that are stored as categoricals and can be used in InstrumentIndex
+CATEGORY_COLUMNS = ['instrument_type', 'market', 'country', 'sector', 'branch']
+INDEX_COLUMNS = ['market', 'country', 'sector', 'branch']
+
+
+def build_instruments_with_meta_data(borsdata_api):
+    """
+    joins the APIs instrument-data with the names of market, country, sector and branch
+    :param borsdata_api: BorsdataAPI-object
+    :return: pd.DataFrame of instrument-data with meta-data (one row per instrument)
+    """
+    # fetching data from api
+    countries = borsdata_api.get_countries()
+    branches = borsdata_api.get_branches()
+    sectors = borsdata_api.get_sectors()
+    markets = borsdata_api.get_markets()
+    instruments = borsdata_api.get_instruments()
+    # looking up the names for all instruments at once, .map uses the index (id) of the meta-data tables
+    market = instruments['marketId'].map(markets['name'])
+    country = instruments['countryId'].map(countries['name'])
+    # index-typed instruments does not have a sector or branch
+    is_index = market.str.lower() == 'index'
+    sector = instruments['sectorId'].map(sectors['name']).where(~is_index).fillna('N/A')
+    branch = instruments['branchId'].map(branches['name']).where(~is_index).fillna('N/A')
+    instrument_df = pd.DataFrame({'name': instruments['name'].values,
+                                  'ins_id': instruments.index.values,
+                                  'ticker': instruments['ticker'].values,
+                                  'isin': instruments['isin'].values,
+                                  'instrument_type': instruments['instrument'].map(INSTRUMENT_TYPES).values,
+                                  'market': market.values,
+                                  'country': country.values,
+                                  'sector': sector.values,
+                                  'branch': branch.values})
+    # categoricals store every distinct name once, the rows only hold small integer codes
+    for column in CATEGORY_COLUMNS:
+        instrument_df[column] = instrument_df[column].astype('category')
+    return instrument_df
+
+
+def load_instruments_with_meta_data(file_path, max_age=dt.timedelta(days=1)):
+    """
+    reads the instrument-table stored by save_instruments_with_meta_data
+    :param file_path: path to the pickle-file
+    :param max_age: dt.timedelta, files older than this are ignored
+    :return: pd.DataFrame or None if the file is missing or too old
+    """
+    if not os.path.exists(file_path):
+        return None
+    saved = dt.datetime.fromtimestamp(os.path.getmtime(file_path))
+    if dt.datetime.now() - saved > max_age:
+        return None
+    return pd.read_pickle(file_path)
+
+
+def save_instruments_with_meta_data(instrument_df, file_path):
+    # create directory if it do not exist
+    directory = os.path.dirname(file_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    # pickle keeps the categorical columns
+    instrument_df.to_pickle(file_path + '.tmp')
+    os.replace(file_path + '.tmp', file_path)
+
+
+class InstrumentIndex:
+    """
+    filter index over the instrument-table, (column, value) -> row positions.
+    replaces boolean masks like instruments.loc[(instruments['market'] == ...) & (instruments['country'] == ...)]
+    """
+    def __init__(self, instruments, columns=INDEX_COLUMNS):
+        """
+        :param instruments: pd.DataFrame from build_instruments_with_meta_data
+        :param columns: columns to index
+        """
+        self._instruments = instruments
+        self._positions = {}
+        for column in columns:
+            # groupby(...).indices gives the row positions for every value in one pass
+            for value, positions in instruments.groupby(column, observed=True, sort=False).indices.items():
+                self._positions[(column, value)] = positions
+        # already resolved selections, criteria -> row positions
+        self._selections = {}
+
+    @staticmethod
+    def _as_tuple(values):
+        if values is None:
+            return None
+        if isinstance(values, str):
+            return (values,)
+        return tuple(values)
+
+    def _column_positions(self, column, values):
+        positions = [self._positions.get((column, value), np.array([], dtype=np.intp)) for value in values]
+        return np.concatenate(positions) if len(positions) > 0 else np.array([], dtype=np.intp)
+
+    def positions(self, exclude=None, **criteria):
+        """
+        row positions of the instruments matching all criteria
+        :param exclude: dict of column -> value(s) to leave out, e.g. {'market': ['Spotlight', 'NGM']}
+        :param criteria: column=value or column=[values], e.g. market='Large Cap', country=['Sverige', 'Norge']
+        :return: np.array of row positions (ascending)
+        """
+        criteria = {column: self._as_tuple(values) for column, values in criteria.items() if values is not None}
+        exclude = {column: self._as_tuple(values) for column, values in (exclude or {}).items()}
+        key = (tuple(sorted(criteria.items())), tuple(sorted(exclude.items())))
+        if key not in self._selections:
+            positions = np.arange(len(self._instruments))
+            for column, values in criteria.items():
+                positions = np.intersect1d(positions, self._column_positions(column, values))
+            for column, values in exclude.items():
+                positions = np.setdiff1d(positions, self._column_positions(column, values))
+            self._selections[key] = positions
+        return self._selections[key]
+
+    def select(self, exclude=None, **criteria):
+        """
+        :return: pd.DataFrame of the instruments matching all criteria (see positions)
+        """
+        return self._instruments.iloc[self.positions(exclude, **criteria)]
+
+    def ins_ids(self, exclude=None, **criteria):
+        """
+        :return: np.array of ins_id for the instruments matching all criteria (see positions)
+        """
+        return self._instruments['ins_id'].values[self.positions(exclude, **criteria)]
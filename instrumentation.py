@@ -0,0 +1,244 @@
+# time and threading for the timings (api calls run in the fetcher's thread-pool)
+import time
+import threading
+import functools
+import contextlib
+# cProfile and pstats for profiling single screeners
+import cProfile
+import pstats
+import io
+import collections
+import numpy as np
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+
+# upper bounds (seconds) of the latency histogram buckets, the last bucket is everything slower
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# screener name used for work done outside a screener
+NO_SCREENER = '(no screener)'
+
+
+def response_bytes(result):
+    """
+    size of an api response, the api methods return parsed data frames so the size is the
+    memory of the frames (a tuple of frames for the reports)
+    """
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    if isinstance(result, pd.Series):
+        return int(result.memory_usage(deep=True))
+    if isinstance(result, (tuple, list)):
+        return sum(response_bytes(item) for item in result)
+    return 0
+
+
+class Instrumentation:
+    """
+    run statistics for BorsdataClient: api calls per endpoint (count, errors, latency histogram and
+    bytes), time per screener and phase (fetch / compute / export), cache hit ratios and the calls
+    that failed for good (after the retries).
+    summary() returns everything as a dict at the end of a run
+    """
+    def __init__(self, profile=()):
+        """
+        :param profile: screener names to run under cProfile, or True for every screener
+        """
+        self._profile = profile
+        self._lock = threading.Lock()
+        # endpoint -> list of call durations (seconds), errors and bytes
+        self._latencies = collections.defaultdict(list)
+        self._errors = collections.Counter()
+        self._bytes = collections.Counter()
+        # screener -> {'runs', 'seconds', 'fetch', 'export'}, compute is the rest of the screener's time
+        self._screeners = collections.defaultdict(lambda: {'runs': 0, 'seconds': 0.0, 'fetch': 0.0, 'export': 0.0})
+        # name -> object with hits and misses attributes
+        self._caches = {}
+        # objects with a failures attribute (method_name -> {key: exception}), e.g. the ApiFetcher
+        self._failure_sources = []
+        # screener -> pstats.Stats
+        self.profiles = {}
+        # the running screener and phase (screeners run on the main thread)
+        self._screener = None
+        self._phase = None
+
+    def record_call(self, endpoint, seconds, result=None, failed=False):
+        with self._lock:
+            self._latencies[endpoint].append(seconds)
+            if failed:
+                self._errors[endpoint] += 1
+            else:
+                self._bytes[endpoint] += response_bytes(result)
+
+    def register_cache(self, name, cache):
+        """
+        :param cache: object with hits and misses attributes, read when the summary is made
+        """
+        self._caches[name] = cache
+
+    def register_failures(self, source):
+        """
+        :param source: object with a failures attribute (method_name -> {key: exception}), read when the
+                       summary is made
+        """
+        self._failure_sources.append(source)
+
+    def _profiled(self, name):
+        return self._profile is True or name in self._profile
+
+    @contextlib.contextmanager
+    def screener(self, name):
+        """
+        times a screener, screeners called from another screener are counted as part of the outer one
+        """
+        if self._screener is not None:
+            yield
+            return
+        self._screener = name
+        profiler = cProfile.Profile() if self._profiled(name) else None
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                if name in self.profiles:
+                    self.profiles[name].add(profiler)
+                else:
+                    self.profiles[name] = pstats.Stats(profiler)
+            stats = self._screeners[name]
+            stats['runs'] += 1
+            stats['seconds'] += time.perf_counter() - start
+            self._screener = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        times a fetch or export phase of the running screener, nested phases count once (the outer one)
+        """
+        if self._phase is not None:
+            yield
+            return
+        self._phase = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._phase = None
+            self._screeners[self._screener or NO_SCREENER][name] += seconds
+
+    def summary(self):
+        """
+        :return: dict with 'endpoints', 'screeners', 'caches' and 'failures'
+        """
+        with self._lock:
+            endpoints = {}
+            for endpoint, latencies in self._latencies.items():
+                latencies = np.array(latencies)
+                histogram = np.bincount(np.searchsorted(LATENCY_BUCKETS, latencies), minlength=len(LATENCY_BUCKETS) + 1)
+                labels = [f'<={bound}s' for bound in LATENCY_BUCKETS] + [f'>{LATENCY_BUCKETS[-1]}s']
+                endpoints[endpoint] = {'calls': len(latencies),
+                                       'errors': self._errors[endpoint],
+                                       'seconds': round(float(latencies.sum()), 4),
+                                       'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 2),
+                                       'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 2),
+                                       'max_ms': round(float(latencies.max()) * 1000, 2),
+                                       'histogram': dict(zip(labels, histogram.tolist())),
+                                       'bytes': self._bytes[endpoint]}
+        screeners = {}
+        for name, stats in self._screeners.items():
+            screeners[name] = {'runs': stats['runs'], 'seconds': round(stats['seconds'], 4),
+                               'fetch': round(stats['fetch'], 4), 'export': round(stats['export'], 4),
+                               # the time not spent fetching or exporting
+                               'compute': round(max(stats['seconds'] - stats['fetch'] - stats['export'], 0.0), 4)}
+        caches = {}
+        for name, cache in self._caches.items():
+            lookups = cache.hits + cache.misses
+            caches[name] = {'hits': cache.hits, 'misses': cache.misses,
+                            'hit_ratio': round(cache.hits / lookups, 3) if lookups > 0 else None}
+        failures = {}
+        for source in self._failure_sources:
+            for method_name, method_failures in source.failures.items():
+                for key, exception in method_failures.items():
+                    failures.setdefault(method_name, {})[key] = str(exception)
+        failures = {method_name: keys for method_name, keys in failures.items() if len(keys) > 0}
+        return {'endpoints': endpoints, 'screeners': screeners, 'caches': caches, 'failures': failures}
+
+    def print_summary(self):
+        summary = self.summary()
+        print('api calls')
+        for endpoint, stats in summary['endpoints'].items():
+            print(f"  {endpoint:<30}{stats['calls']:>7} calls {stats['errors']:>4} errors "
+                  f"p50 {stats['p50_ms']:>8} ms  p95 {stats['p95_ms']:>8} ms  {stats['bytes'] / 1e6:>8.1f} MB")
+        print('screeners (seconds)')
+        for name, stats in summary['screeners'].items():
+            print(f"  {name:<30}{stats['seconds']:>8.2f} total {stats['fetch']:>8.2f} fetch "
+                  f"{stats['compute']:>8.2f} compute {stats['export']:>8.2f} export")
+        print('caches')
+        for name, stats in summary['caches'].items():
+            print(f"  {name:<30}{stats['hits']:>7} hits {stats['misses']:>7} misses  ratio {stats['hit_ratio']}")
+        self.print_failures(summary['failures'])
+
+    def print_failures(self, failures=None):
+        """
+        prints the keys (ins_ids) of the calls that failed for good, they are fetched again by the next run
+        :param failures: summary()['failures'], default the current failures
+        """
+        failures = self.summary()['failures'] if failures is None else failures
+        if len(failures) == 0:
+            return
+        print('failed calls (fetched again by the next run)')
+        for method_name, keys in failures.items():
+            print(f"  {method_name:<30}{len(keys):>7} failed: {list(keys)[:20]}")
+            # the first error, the others are most often the same
+            print(f"  {'':<30}{next(iter(keys.values()))}")
+
+    def profile_report(self, name, number_of_lines=20):
+        """
+        :return: str of the slowest functions (cumulative time) of a profiled screener
+        """
+        stream = io.StringIO()
+        stats = self.profiles[name]
+        stats.stream = stream
+        stats.sort_stats('cumulative').print_stats(number_of_lines)
+        return stream.getvalue()
+
+
+class InstrumentedApi:
+    """
+    wraps a BorsdataAPI-object, every method call is timed and recorded per endpoint (method name)
+    """
+    def __init__(self, borsdata_api, instrumentation):
+        # the wrapped api-object
+        self.borsdata_api = borsdata_api
+        self._instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        attribute = getattr(self.borsdata_api, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception:
+                self._instrumentation.record_call(name, time.perf_counter() - start, failed=True)
+                raise
+            self._instrumentation.record_call(name, time.perf_counter() - start, result)
+            return result
+        return timed
+
+
+def screener(method):
+    """
+    decorator for BorsdataClient-methods, times the method as a screener in self.instrumentation
+    """
+    @functools.wraps(method)
+    def timed(self, *args, **kwargs):
+        with self.instrumentation.screener(method.__name__):
+            return method(self, *args, **kwargs)
+    return timed
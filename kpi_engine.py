@@ -0,0 +1,179 @@
+# os for file- and directory-handling
+import os
+# datetime for date- and time-stuff
+import datetime as dt
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+import numpy as np
+
+
+def percentile_ranks_along(values, axis=0):
+    """
+    percentile rank (1-100) along an axis, the largest value gets 100, nan values get nan
+    :param values: np.array
+    :return: np.array of the same shape
+    """
+    valid = ~np.isnan(values)
+    # nan sorts last, the rank of a value is its position in the sorted order
+    ranks = np.argsort(np.argsort(values, axis=axis, kind='stable'), axis=axis, kind='stable') + 1
+    counts = valid.sum(axis=axis, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, np.ceil(ranks / counts * 100), np.nan)
+
+
+class KpiCache:
+    """
+    cache of kpi histories keyed by (kpi, ins_id, report_type, price_type), in memory and optionally
+    on disk (one directory per kpi, report_type and price_type). a history is fetched again once it
+    is older than max_age, the histories missing in the cache are fetched concurrently in one batch
+    """
+    def __init__(self, fetcher, cache_path=None, max_age=dt.timedelta(days=1)):
+        """
+        :param fetcher: ApiFetcher used for fetching kpi histories
+        :param cache_path: directory where the kpi-files are stored, default None (memory only)
+        :param max_age: dt.timedelta after which a history is fetched again
+        """
+        self._fetcher = fetcher
+        self._cache_path = cache_path
+        self._max_age = max_age
+        # (kpi, ins_id, report_type, price_type) -> {'history': pd.DataFrame, 'fetched': dt.datetime}
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        # (kpi, ins_id) -> exception for the histories that could not be fetched in the last call
+        self.last_failures = {}
+
+    def _file_path(self, key):
+        kpi, ins_id, report_type, price_type = key
+        return os.path.join(self._cache_path, f'{kpi}_{report_type}_{price_type}', f'{ins_id}.pkl')
+
+    def _read(self, key):
+        if self._cache_path is None or not os.path.exists(self._file_path(key)):
+            return None
+        return pd.read_pickle(self._file_path(key))
+
+    def _write(self, key, entry):
+        if self._cache_path is None:
+            return
+        file_path = self._file_path(key)
+        # create directory if it do not exist
+        if not os.path.exists(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        pd.to_pickle(entry, file_path + '.tmp')
+        os.replace(file_path + '.tmp', file_path)
+
+    def get_histories(self, kpis, ins_ids, report_type='year', price_type='mean'):
+        """
+        kpi histories for every kpi and instrument, only the missing or old ones are fetched
+        :param kpis: kpi ids see https://github.com/Borsdata-Sweden/API/wiki/KPI-History
+        :param ins_ids: instrument ids
+        :param report_type: 'year', 'r12' or 'quarter'
+        :param price_type: calculation e.g. 'mean', 'high' or 'low'
+        :return: dict of kpi -> dict of ins_id -> pd.DataFrame with (year, period) as index (ascending)
+                 and a kpiValue column, histories that could not be fetched (and are not cached) are left out
+        """
+        kpis = [int(kpi) for kpi in dict.fromkeys(kpis)]
+        ins_ids = [int(ins_id) for ins_id in dict.fromkeys(ins_ids)]
+        now = dt.datetime.now()
+        stale = []
+        for kpi in kpis:
+            for ins_id in ins_ids:
+                key = (kpi, ins_id, report_type, price_type)
+                if key not in self._entries:
+                    entry = self._read(key)
+                    if entry is not None:
+                        self._entries[key] = entry
+                if key in self._entries and now - self._entries[key]['fetched'] < self._max_age:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    stale.append((kpi, ins_id))
+
+        def store(kpi_ins_id, history):
+            key = kpi_ins_id + (report_type, price_type)
+            history = history.sort_index()[['kpiValue']].astype(np.float32)
+            self._entries[key] = {'history': history, 'fetched': now}
+            self._write(key, self._entries[key])
+
+        # every history is written as soon as it arrives, a restarted run only fetches the rest
+        self._fetcher.fetch_kpi_histories(stale, report_type, price_type, on_result=store)
+        self.last_failures = {key: failure for key, failure in self._fetcher.last_failures.items()
+                              if key + (report_type, price_type) not in self._entries}
+        return {kpi: {ins_id: self._entries[(kpi, ins_id, report_type, price_type)]['history']
+                      for ins_id in ins_ids if (kpi, ins_id, report_type, price_type) in self._entries}
+                for kpi in kpis}
+
+
+class KpiCube:
+    """
+    kpi-values as one aligned array (instruments x years x kpis), nan where a value is missing.
+    for r12 and quarter histories the year's value is the one of its last reported period
+    """
+    def __init__(self, ins_ids, years, kpis, values):
+        """
+        :param ins_ids: np.array of instrument ids, one per row
+        :param years: np.array of years (ascending)
+        :param kpis: list of kpi ids
+        :param values: 3-d np.array (instruments x years x kpis)
+        """
+        self.ins_ids = np.asarray(ins_ids)
+        self.years = np.asarray(years)
+        self.kpis = list(kpis)
+        self.values = values
+
+    @classmethod
+    def from_histories(cls, histories, ins_ids):
+        """
+        :param histories: dict of kpi -> dict of ins_id -> pd.DataFrame (from KpiCache.get_histories)
+        :param ins_ids: instrument ids, one row each (also the ones without history)
+        :return: KpiCube
+        """
+        ins_ids = np.array([int(ins_id) for ins_id in dict.fromkeys(ins_ids)], dtype=np.int64)
+        kpis = list(histories.keys())
+        years = set()
+        for kpi_histories in histories.values():
+            for history in kpi_histories.values():
+                years.update(history.index.get_level_values('year'))
+        years = np.array(sorted(years), dtype=np.int64)
+        values = np.full((len(ins_ids), len(years), len(kpis)), np.nan, dtype=np.float32)
+        rows = {ins_id: row for row, ins_id in enumerate(ins_ids)}
+        for column, kpi in enumerate(kpis):
+            for ins_id, history in histories[kpi].items():
+                if ins_id not in rows or len(history) == 0:
+                    continue
+                history_years = history.index.get_level_values('year').values
+                # the histories are sorted, the last period of every year is the year's value
+                last_of_year = np.append(history_years[1:] != history_years[:-1], True)
+                values[rows[ins_id], np.searchsorted(years, history_years[last_of_year]), column] = \
+                    history['kpiValue'].values[last_of_year]
+        return cls(ins_ids, years, kpis, values)
+
+    def kpi(self, kpi):
+        """
+        :return: 2-d np.array (instruments x years) of one kpi
+        """
+        return self.values[:, :, self.kpis.index(kpi)]
+
+    def year(self, year):
+        """
+        :return: 2-d np.array (instruments x kpis) of one year, nan if the year is missing
+        """
+        if year not in self.years:
+            return np.full((len(self.ins_ids), len(self.kpis)), np.nan, dtype=np.float32)
+        return self.values[:, int(np.searchsorted(self.years, year)), :]
+
+    def ranks(self, lower_is_better=()):
+        """
+        percentile rank (1-100) of every value among the instruments, for every year and kpi at once
+        :param lower_is_better: kpis where the lowest value is the best (e.g. P/E)
+        :return: 3-d np.array (instruments x years x kpis)
+        """
+        signs = np.array([-1.0 if kpi in lower_is_better else 1.0 for kpi in self.kpis])
+        return percentile_ranks_along(self.values.astype(float) * signs, axis=0)
+
+    def score(self, lower_is_better=()):
+        """
+        multi-kpi score, the mean percentile rank over the kpis (instruments missing a kpi get nan)
+        :return: 2-d np.array (instruments x years)
+        """
+        return self.ranks(lower_is_better).mean(axis=2)
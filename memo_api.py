@@ -0,0 +1,163 @@
+# time and threading for the expiry and the in-flight calls (api calls run in the fetcher's thread-pool)
+import time
+import threading
+import functools
+import collections
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+
+# endpoint -> (seconds a response is kept, max number of responses kept). the meta-data changes at most
+# daily, the other endpoints are mostly kept for merging identical calls made close together
+ENDPOINT_POLICIES = {
+    'get_countries': (24 * 3600, 1),
+    'get_markets': (24 * 3600, 1),
+    'get_sectors': (24 * 3600, 1),
+    'get_branches': (24 * 3600, 1),
+    'get_instruments': (24 * 3600, 1),
+    'get_instrument_stock_prices': (60, 64),
+    'get_instrument_reports': (3600, 256),
+    'get_kpi_history': (3600, 1024),
+}
+# endpoints missing in the policies
+DEFAULT_POLICY = (60, 128)
+
+
+def copy_response(response):
+    """
+    copy of an api response (a data frame or a tuple of frames for the reports), callers sort and
+    add columns in place
+    """
+    if isinstance(response, (pd.DataFrame, pd.Series)):
+        return response.copy()
+    if isinstance(response, tuple):
+        return tuple(copy_response(item) for item in response)
+    if isinstance(response, list):
+        return [copy_response(item) for item in response]
+    return response
+
+
+def _call_key(args, kwargs):
+    key = (args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        # e.g. a list argument
+        key = repr(key)
+    return key
+
+
+class _Flight:
+    """
+    a call in progress, the threads asking for the same call wait for its outcome
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.exception = None
+
+
+class MemoizedApi:
+    """
+    wraps a BorsdataAPI-object (or an InstrumentedApi), responses are kept per endpoint for a while
+    (ttl) in a bounded lru. identical calls made at the same time from several threads are merged into
+    one call (single-flight), the others wait for it and get the same response. every caller gets its
+    own copy of the data frames. failed calls are not kept, all callers waiting for them get the error
+    """
+    def __init__(self, borsdata_api, policies=None):
+        """
+        :param borsdata_api: BorsdataAPI-object (or anything with the same methods)
+        :param policies: dict of endpoint -> (ttl seconds, max entries), merged into ENDPOINT_POLICIES.
+                         a ttl of 0 keeps nothing, only the in-flight calls are merged
+        """
+        # the wrapped api-object
+        self.borsdata_api = borsdata_api
+        self._policies = dict(ENDPOINT_POLICIES, **(policies or {}))
+        self._lock = threading.Lock()
+        # endpoint -> OrderedDict of key -> (expiry, response), least recently used first
+        self._entries = collections.defaultdict(collections.OrderedDict)
+        # (endpoint, key) -> _Flight
+        self._flights = {}
+        # responses served without an api call, calls made and calls merged into a call in progress
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+
+    def __getstate__(self):
+        # only the wrapped api is pickled (e.g. handed to worker processes), the kept responses are not
+        return {'borsdata_api': self.borsdata_api, '_policies': self._policies}
+
+    def __setstate__(self, state):
+        self.__init__(state['borsdata_api'], state['_policies'])
+
+    def _policy(self, endpoint):
+        return self._policies.get(endpoint, DEFAULT_POLICY)
+
+    def call(self, endpoint, *args, **kwargs):
+        """
+        :param endpoint: name of the BorsdataAPI method e.g. 'get_instruments'
+        :return: copy of the (kept or fetched) response
+        """
+        ttl, max_entries = self._policy(endpoint)
+        key = _call_key(args, kwargs)
+        with self._lock:
+            entries = self._entries[endpoint]
+            entry = entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    entries.move_to_end(key)
+                    self.hits += 1
+                    return copy_response(entry[1])
+                del entries[key]
+            flight = self._flights.get((endpoint, key))
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[(endpoint, key)] = flight
+                self.misses += 1
+            else:
+                self.merged += 1
+        if not leader:
+            flight.done.wait()
+            if flight.exception is not None:
+                raise flight.exception
+            return copy_response(flight.response)
+        try:
+            flight.response = getattr(self.borsdata_api, endpoint)(*args, **kwargs)
+        except BaseException as exception:
+            flight.exception = exception
+            raise
+        finally:
+            with self._lock:
+                del self._flights[(endpoint, key)]
+                if flight.exception is None and ttl > 0 and max_entries > 0:
+                    entries = self._entries[endpoint]
+                    entries[key] = (time.monotonic() + ttl, flight.response)
+                    entries.move_to_end(key)
+                    # least recently used first
+                    while len(entries) > max_entries:
+                        entries.popitem(last=False)
+            flight.done.set()
+        return copy_response(flight.response)
+
+    def invalidate(self, endpoint=None):
+        """
+        forgets the kept responses of an endpoint, default all endpoints
+        """
+        with self._lock:
+            if endpoint is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(endpoint, None)
+
+    def __getattr__(self, name):
+        if name == 'borsdata_api':
+            # not set yet (e.g. while copying), the api's attributes are not looked up
+            raise AttributeError(name)
+        attribute = getattr(self.borsdata_api, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def memoized(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+        return memoized
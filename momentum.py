@@ -0,0 +1,92 @@
+import numpy as np
+
+# horizon -> trading days
+HORIZONS = {'1w': 5, '1m': 21, '3m': 63, '6m': 126, '12m': 252}
+# weights of the horizons in the relative-strength score, the latest quarter counts the most
+RS_WEIGHTS = {'1m': 0.2, '3m': 0.4, '6m': 0.2, '12m': 0.2}
+
+
+def horizon_returns(panel, horizons=HORIZONS):
+    """
+    returns up to the last date for several horizons
+    :param panel: PricePanel
+    :param horizons: dict of horizon name -> trading days
+    :return: 2-d np.array (instruments x horizons) of returns as fractions, nan if the history is too short
+    """
+    returns = np.full((len(panel), len(horizons)), np.nan)
+    for column, periods in enumerate(horizons.values()):
+        returns[:, column] = panel.last_returns(periods)
+    return returns
+
+
+def percentile_ranks(values, groups=None):
+    """
+    percentile rank (1-100) of every value within its group, the best value gets 100 and equal values
+    get the same rank (the highest of their positions, like pd.Series.rank(method='max', pct=True))
+    :param values: np.array, nan values get a nan rank and do not count
+    :param groups: np.array of group codes (one per value), default one group
+    :return: np.array of ranks
+    """
+    values = np.asarray(values, dtype=float)
+    groups = np.zeros(len(values), dtype=np.int64) if groups is None else np.asarray(groups)
+    ranks = np.full(len(values), np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) == 0:
+        return ranks
+    codes = np.unique(groups[valid], return_inverse=True)[1]
+    # sorted on group and then value, the position within the group is the rank
+    sort = np.lexsort((values[valid], codes))
+    order = valid[sort]
+    sorted_codes = codes[sort]
+    counts = np.bincount(sorted_codes)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    sorted_values = values[order]
+    # the last position of every run of equal values within a group, every value of the run gets it
+    run_ends = np.flatnonzero(np.concatenate([(sorted_codes[1:] != sorted_codes[:-1]) |
+                                              (sorted_values[1:] != sorted_values[:-1]), [True]]))
+    position = run_ends[np.searchsorted(run_ends, np.arange(len(order)))] - starts[sorted_codes] + 1
+    ranks[order] = np.ceil(position / counts[sorted_codes] * 100)
+    return ranks
+
+
+def rs_score(returns, horizons=HORIZONS, weights=RS_WEIGHTS):
+    """
+    relative strength, the weighted return over the horizons as a percentile rank of the universe
+    :param returns: 2-d np.array from horizon_returns
+    :param weights: dict of horizon name -> weight, instruments missing a weighted horizon get nan
+    :return: (np.array of weighted returns, np.array of percentile ranks 1-100)
+    """
+    weight_vector = np.array([weights.get(horizon, 0.0) for horizon in horizons])
+    used = weight_vector > 0
+    weighted = returns[:, used] @ weight_vector[used] / weight_vector[used].sum()
+    return weighted, percentile_ranks(weighted)
+
+
+def top_k(values, k):
+    """
+    positions of the k largest values (nan left out), partial sort with argpartition and only the k sorted
+    :return: np.array of positions, largest first
+    """
+    values = np.asarray(values, dtype=float)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) > k:
+        valid = valid[np.argpartition(-values[valid], k - 1)[:k]]
+    return valid[np.argsort(-values[valid], kind='stable')]
+
+
+def top_k_by_group(values, groups, k):
+    """
+    positions of the k largest values within every group
+    :param groups: np.array of group values (one per value)
+    :return: dict of group -> np.array of positions, largest first
+    """
+    groups = np.asarray(groups)
+    names, codes = np.unique(groups, return_inverse=True)
+    # positions of every group at once, sorted on group code
+    order = np.argsort(codes, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(names)))])
+    top = {}
+    for code, name in enumerate(names):
+        positions = order[bounds[code]:bounds[code + 1]]
+        top[name] = positions[top_k(np.asarray(values, dtype=float)[positions], k)]
+    return top
@@ -0,0 +1,202 @@
+# os for file- and directory-handling
+import os
+# importlib for finding the parquet engine without importing it
+import importlib.util
+# datetime for date- and time-stuff
+import datetime as dt
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+
+# checkpoint of an unfinished batch of top-ups
+from sweep_journal import SweepJournal
+
+# parquet needs pyarrow (or fastparquet), fall back to pickle-files when neither is installed. only
+# probed here, pandas imports the engine when the first file is read or written
+_FILE_FORMAT = 'parquet' if any(importlib.util.find_spec(engine) is not None
+                                for engine in ('pyarrow', 'fastparquet')) else 'pkl'
+
+class PriceCache:
+    """
+    on-disk cache of instrument stock prices, one file per ins_id.
+    the full history of an instrument is downloaded once, later runs only fetch
+    the days after the last cached date and append them to the file. every instrument is written
+    as soon as it has been fetched, a batch interrupted by a crash is resumed from the sweep journal
+    """
+    def __init__(self, fetcher, cache_path, max_age=None):
+        """
+        :param fetcher: ApiFetcher used for fetching missing days
+        :param cache_path: directory where the price-files are stored
+        :param max_age: dt.timedelta, skip the top-up if the file was checked more recently than this.
+                        default None, i.e. every instrument is topped up once per run
+        """
+        self._fetcher = fetcher
+        self._cache_path = cache_path
+        self._max_age = max_age
+        # instruments already read (and topped up) during this run, ins_id -> pd.DataFrame
+        self._prices = {}
+        # lookups served without an api call and lookups that needed one (a top-up or a full download)
+        self.hits = 0
+        self.misses = 0
+        # ins_id -> exception for the instruments that could not be fetched in the last call
+        self.last_failures = {}
+        # instruments topped up by an unfinished batch, they are not topped up again on a restart
+        self._journal = SweepJournal(os.path.join(cache_path, 'sweep.journal'))
+
+    def _file_path(self, ins_id):
+        return os.path.join(self._cache_path, f'{int(ins_id)}.{_FILE_FORMAT}')
+
+    def _read(self, ins_id):
+        """
+        reads the cached prices for ins_id
+        :return: pd.DataFrame sorted on date (ascending) or None if nothing is cached
+        """
+        file_path = self._file_path(ins_id)
+        if not os.path.exists(file_path):
+            return None
+        if _FILE_FORMAT == 'parquet':
+            return pd.read_parquet(file_path)
+        return pd.read_pickle(file_path)
+
+    def _write(self, ins_id, stock_prices):
+        # create directory if it do not exist
+        if not os.path.exists(self._cache_path):
+            os.makedirs(self._cache_path)
+        # writing to a temporary file first so an interrupted run never leaves a half-written file
+        file_path = self._file_path(ins_id)
+        tmp_path = file_path + '.tmp'
+        if _FILE_FORMAT == 'parquet':
+            stock_prices.to_parquet(tmp_path)
+        else:
+            stock_prices.to_pickle(tmp_path)
+        os.replace(tmp_path, file_path)
+
+    def _is_fresh(self, ins_id):
+        """
+        checks if the cached file was topped up within max_age
+        """
+        if int(ins_id) in self._journal.done:
+            return True
+        if self._max_age is None:
+            return False
+        checked = dt.datetime.fromtimestamp(os.path.getmtime(self._file_path(ins_id)))
+        return dt.datetime.now() - checked < self._max_age
+
+    def _store(self, ins_id, stock_prices, changed):
+        if changed:
+            self._write(ins_id, stock_prices)
+        else:
+            # touching the file, i.e. marking it as checked
+            os.utime(self._file_path(ins_id))
+        self._prices[ins_id] = stock_prices
+        self._journal.mark(ins_id)
+
+    @staticmethod
+    def _append(cached, new_prices):
+        """
+        appends the fetched days to the cached prices. the last cached date is fetched again,
+        if its close has changed the history has been adjusted (e.g. a split)
+        :return: (pd.DataFrame, True if the data changed) or (None, True) if the full history is needed
+        """
+        if len(new_prices) == 0:
+            return cached, False
+        last_date = cached.index[-1]
+        # comparing the overlapping day
+        if last_date in new_prices.index:
+            old_close = cached['close'].values[-1]
+            new_close = new_prices.loc[last_date, 'close']
+            if abs(new_close - old_close) > 1e-6 * max(abs(old_close), 1.0):
+                return None, True
+        new_prices = new_prices[new_prices.index > last_date]
+        if len(new_prices) == 0:
+            return cached, False
+        return pd.concat([cached, new_prices[cached.columns]]), True
+
+    def get_prices_many(self, ins_ids):
+        """
+        returns the full price history for many instruments, reading the cache first and
+        fetching only the days after the last cached date (concurrently) from the api
+        :param ins_ids: instrument ids
+        :return: dict of ins_id -> pd.DataFrame of stock prices sorted on date (ascending),
+                 instruments that could not be fetched (and are not cached) are left out
+        """
+        ins_ids = [int(ins_id) for ins_id in ins_ids]
+        # ins_id -> first date to fetch (None for the full history)
+        from_dates = {}
+        cached_prices = {}
+        for ins_id in ins_ids:
+            if ins_id in from_dates:
+                continue
+            if ins_id in self._prices:
+                self.hits += 1
+                continue
+            cached = self._read(ins_id)
+            if cached is None or len(cached) == 0:
+                # nothing cached, downloading the full history
+                from_dates[ins_id] = None
+            elif self._is_fresh(ins_id):
+                self._prices[ins_id] = cached
+            else:
+                cached_prices[ins_id] = cached
+                from_dates[ins_id] = cached.index[-1].date()
+            if ins_id in from_dates:
+                self.misses += 1
+            else:
+                self.hits += 1
+        full_history = []
+
+        def store_top_up(ins_id, new_prices):
+            new_prices.sort_index(inplace=True)
+            if ins_id not in cached_prices:
+                self._store(ins_id, new_prices, True)
+                return
+            stock_prices, changed = self._append(cached_prices[ins_id], new_prices)
+            if stock_prices is None:
+                full_history.append(ins_id)
+            else:
+                self._store(ins_id, stock_prices, changed)
+
+        def store_full_history(ins_id, stock_prices):
+            stock_prices.sort_index(inplace=True)
+            self._store(ins_id, stock_prices, True)
+
+        # every instrument is stored as soon as it arrives
+        self._fetcher.fetch_prices(list(from_dates), list(from_dates.values()), on_result=store_top_up)
+        failures = dict(self._fetcher.last_failures)
+        # downloading the adjusted histories again
+        self._fetcher.fetch_prices(full_history, on_result=store_full_history)
+        failures.update(self._fetcher.last_failures)
+        if len(from_dates) > 0:
+            # the batch is done, the next run tops up every instrument again
+            self._journal.complete()
+        for ins_id in failures:
+            if ins_id in cached_prices and ins_id not in self._prices:
+                # the top-up failed, using the cached (older) prices for this run
+                print(f"PriceCache >> using cached prices for {ins_id}, top-up failed: {failures[ins_id]}")
+                self._prices[ins_id] = cached_prices[ins_id]
+        self.last_failures = {ins_id: failure for ins_id, failure in failures.items() if ins_id not in self._prices}
+        # returning copies since the callers add columns and sort in place
+        return {ins_id: self._prices[ins_id].copy() for ins_id in ins_ids if ins_id in self._prices}
+
+    def get_prices(self, ins_id):
+        """
+        returns the full price history for ins_id (see get_prices_many)
+        :param ins_id: instrument id
+        :return: pd.DataFrame of stock prices sorted on date (ascending)
+        """
+        stock_prices = self.get_prices_many([ins_id])
+        if int(ins_id) not in stock_prices:
+            raise self.last_failures[int(ins_id)]
+        return stock_prices[int(ins_id)]
+
+    def loaded(self, ins_id):
+        """
+        prices for ins_id already read (and topped up) during this run, without touching disk or api
+        :return: pd.DataFrame sorted on date (ascending) or None
+        """
+        return self._prices.get(int(ins_id))
+
+    def clear(self):
+        """
+        forgets the prices read during this run (the files on disk are kept)
+        """
+        self._prices = {}
@@ -0,0 +1,314 @@
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+import numpy as np
+
+# price columns are carried forward over days an instrument did not trade, volume is 0 on those days
+PRICE_FIELDS = ['open', 'high', 'low', 'close']
+
+
+def _fill_forward(values):
+    """
+    carries the last valid value forward along each row, leading nans are kept
+    :param values: 2-d np.array
+    :return: 2-d np.array
+    """
+    # column of the last valid value for every cell, 0 where nothing valid has been seen yet
+    last_valid = np.where(np.isnan(values), 0, np.arange(values.shape[1]))
+    np.maximum.accumulate(last_valid, axis=1, out=last_valid)
+    return values[np.arange(values.shape[0])[:, None], last_valid]
+
+
+def _rolling_mean(values, window):
+    """
+    mean of the last window values along the rows, nan until window values exist
+    (same as pd.Series.rolling(window=window).mean())
+    :param values: 2-d np.array
+    :return: 2-d np.array
+    """
+    valid = ~np.isnan(values)
+    # running sums with a leading zero column, the sum of a window is the difference of two running sums
+    sums = np.zeros((values.shape[0], values.shape[1] + 1))
+    np.cumsum(np.where(valid, values, 0.0), axis=1, out=sums[:, 1:])
+    counts = np.zeros(sums.shape, dtype=np.int64)
+    np.cumsum(valid, axis=1, out=counts[:, 1:])
+    moving_average = np.full(values.shape, np.nan)
+    if window <= values.shape[1]:
+        window_sums = sums[:, window:] - sums[:, :-window]
+        window_counts = counts[:, window:] - counts[:, :-window]
+        moving_average[:, window - 1:] = np.where(window_counts == window, window_sums / window, np.nan)
+    return moving_average
+
+
+def _shift(values, periods):
+    """
+    shifts a 2-d array periods columns to the right, the empty columns are nan
+    """
+    shifted = np.full(values.shape, np.nan)
+    if periods < values.shape[1]:
+        shifted[:, periods:] = values[:, :values.shape[1] - periods]
+    return shifted
+
+
+class PricePanel:
+    """
+    stock prices of many instruments as 2-d arrays aligned on a shared trading-date index,
+    one row per instrument and one column per date. prices are carried forward over days an
+    instrument did not trade (e.g. another country's holiday), days before listing are nan.
+    moving-averages and returns count every instrument's own trading days (sessions), so the
+    values of an instrument do not depend on which other instruments share the panel
+    """
+    def __init__(self, ins_ids, dates, fields, traded=None):
+        """
+        :param ins_ids: np.array of instrument ids, one per row
+        :param dates: pd.DatetimeIndex, one per column (ascending)
+        :param fields: dict of field name (e.g. 'close') -> 2-d np.array
+        :param traded: 2-d bool np.array, True where an instrument had its own close, default every
+                       date with a close (i.e. the closes are not carried forward)
+        """
+        self.ins_ids = np.asarray(ins_ids)
+        self.dates = dates
+        self._fields = fields
+        self._traded = traded
+        # instrument id -> row
+        self._rows = {int(ins_id): row for row, ins_id in enumerate(self.ins_ids)}
+        # session number of every date per instrument and the values per session, computed when used
+        self._positions = None
+        self._sessions = {}
+
+    @classmethod
+    def from_frames(cls, frames, fields=('close',)):
+        """
+        builds a panel from per-instrument stock prices
+        :param frames: dict of ins_id -> pd.DataFrame of stock prices with date as index
+        :param fields: columns to keep, default only close
+        :return: PricePanel
+        """
+        # instruments without any prices are left out
+        frames = {ins_id: frame for ins_id, frame in frames.items() if len(frame) > 0}
+        # the shared date index is the union of all instruments' trading days
+        dates = pd.DatetimeIndex([])
+        for frame in frames.values():
+            dates = dates.union(frame.index)
+        dates = dates.sort_values()
+        # the closes (also when not a requested field) tell the days every instrument traded
+        arrays = {field: np.full((len(frames), len(dates)), np.nan)
+                  for field in dict.fromkeys(['close'] + list(fields))}
+        for row, frame in enumerate(frames.values()):
+            columns = dates.get_indexer(frame.index)
+            for field in arrays:
+                arrays[field][row, columns] = frame[field].values
+        traded = ~np.isnan(arrays['close'])
+        if 'close' not in fields:
+            del arrays['close']
+        for field in fields:
+            if field in PRICE_FIELDS:
+                arrays[field] = _fill_forward(arrays[field])
+            else:
+                arrays[field] = np.nan_to_num(arrays[field])
+        return cls(np.array(list(frames.keys()), dtype=np.int64), dates, arrays, traded)
+
+    def __len__(self):
+        return len(self.ins_ids)
+
+    def __contains__(self, ins_id):
+        return int(ins_id) in self._rows
+
+    @property
+    def fields(self):
+        return list(self._fields.keys())
+
+    @property
+    def close(self):
+        return self._fields['close']
+
+    @property
+    def traded(self):
+        """
+        :return: 2-d bool np.array, True on the dates an instrument traded (had its own close)
+        """
+        if self._traded is None:
+            self._traded = ~np.isnan(self.close)
+        return self._traded
+
+    def field(self, name):
+        """
+        :param name: field name e.g. 'close' or 'volume'
+        :return: 2-d np.array (instruments x dates)
+        """
+        return self._fields[name]
+
+    def rows(self, ins_ids):
+        """
+        :return: np.array of rows for ins_ids, -1 for instruments missing in the panel
+        """
+        return np.array([self._rows.get(int(ins_id), -1) for ins_id in ins_ids], dtype=np.intp)
+
+    def subset(self, ins_ids):
+        """
+        panel of some of the instruments (instruments missing in the panel are left out). dates none
+        of them traded on (e.g. another country's holiday) are left out, so the subset is the same as a
+        panel built from the instruments' own prices
+        :param ins_ids: instrument ids, the order is kept
+        :return: PricePanel
+        """
+        rows = self.rows(ins_ids)
+        rows = rows[rows >= 0]
+        keep = self.traded[rows].any(axis=0)
+        if keep.all():
+            return PricePanel(self.ins_ids[rows], self.dates,
+                              {field: values[rows] for field, values in self._fields.items()}, self.traded[rows])
+        # rows and dates picked in one copy
+        cells = np.ix_(rows, np.flatnonzero(keep))
+        return PricePanel(self.ins_ids[rows], self.dates[keep],
+                          {field: values[cells] for field, values in self._fields.items()}, self.traded[cells])
+
+    def tail(self, number_of_dates, number_of_sessions=0):
+        """
+        panel of the last number_of_dates dates, starting earlier when needed so every instrument has
+        number_of_sessions of its own trading days before them (e.g. the window of a moving-average)
+        :return: PricePanel
+        """
+        start = max(len(self.dates) - number_of_dates, 0)
+        if number_of_sessions > 0 and start > 0:
+            positions = self._session_positions()[:, :start]
+            # the first session every instrument needs, instruments without sessions before need none
+            latest = positions[:, -1]
+            first = np.maximum(latest - number_of_sessions + 1, 0)
+            columns = np.where(latest >= 0, (positions < first[:, None]).sum(axis=1), start)
+            start = int(columns.min(initial=start))
+        return PricePanel(self.ins_ids, self.dates[start:],
+                          {field: values[:, start:] for field, values in self._fields.items()},
+                          self.traded[:, start:])
+
+    def to_frame(self, ins_id):
+        """
+        :return: pd.DataFrame of the fields for one instrument with date as index
+        """
+        row = self._rows[int(ins_id)]
+        return pd.DataFrame({field: values[row] for field, values in self._fields.items()}, index=self.dates)
+
+    def listed(self):
+        """
+        :return: 2-d bool np.array, True from the first day an instrument has a close
+        """
+        return ~np.isnan(self.close)
+
+    def _session_positions(self):
+        """
+        :return: 2-d int np.array (instruments x dates), the number of every date's latest session
+                 per instrument (0 for the first trading day), -1 before listing
+        """
+        if self._positions is None:
+            self._positions = np.cumsum(self.traded, axis=1) - 1
+        return self._positions
+
+    def sessions(self, field='close'):
+        """
+        values on every instrument's own trading days, column k is the instrument's k-th session.
+        windows over these columns count sessions, a date another instrument traded on is not one
+        :return: 2-d np.array (instruments x the most sessions of an instrument), nan after the last session
+        """
+        if field not in self._sessions:
+            traded = self.traded
+            number_of_sessions = traded.sum(axis=1)
+            values = np.full((len(self), int(number_of_sessions.max(initial=0))), np.nan)
+            rows, columns = np.nonzero(traded)
+            values[rows, self._session_positions()[rows, columns]] = self._fields[field][rows, columns]
+            self._sessions[field] = values
+        return self._sessions[field]
+
+    def expand(self, session_values):
+        """
+        values per session (see sessions) on the panel's dates, a date without a session takes the
+        instrument's latest session before it
+        :param session_values: 2-d np.array (instruments x sessions)
+        :return: 2-d float np.array (instruments x dates), nan before listing
+        """
+        positions = self._session_positions()
+        if session_values.shape[1] == 0:
+            return np.full(positions.shape, np.nan)
+        expanded = np.take_along_axis(session_values, np.maximum(positions, 0), axis=1)
+        return np.where(positions >= 0, expanded, np.nan)
+
+    def sma(self, window, field='close'):
+        """
+        simple moving-average of every instrument's last window sessions for all instruments and dates,
+        nan until window sessions exist (same as pd.Series.rolling(window=window).mean() on the
+        instrument's own prices)
+        :return: 2-d np.array (instruments x dates)
+        """
+        return self.expand(_rolling_mean(self.sessions(field), window))
+
+    def above_sma(self, window):
+        """
+        :return: 2-d bool np.array, True where close > moving-average (False while the average is nan)
+        """
+        with np.errstate(invalid='ignore'):
+            return self.close > self.sma(window)
+
+    def _last_sessions(self, number):
+        """
+        :return: 2-d np.array (instruments x number) of every instrument's last number session closes,
+                 oldest first, nan where an instrument has fewer sessions
+        """
+        traded = self.traded
+        dates = traded.shape[1]
+        needed = np.minimum(traded.sum(axis=1), number)
+        # only a block of the last dates is read, widened until it holds every instrument's last sessions
+        width = min(number, dates)
+        while width < dates and (traded[:, dates - width:].sum(axis=1) < needed).any():
+            width = min(width * 2, dates)
+        block = traded[:, dates - width:]
+        # sessions counted back from every instrument's last one (0 for the last)
+        from_last = np.cumsum(block[:, ::-1], axis=1)[:, ::-1] - 1
+        rows, columns = np.nonzero(block & (from_last < number))
+        values = np.full((len(self), number), np.nan)
+        values[rows, number - 1 - from_last[rows, columns]] = self.close[:, dates - width:][rows, columns]
+        return values
+
+    def last_above_sma(self, windows):
+        """
+        flags for the last date only, 1 if the last close is above the moving-average of the
+        instrument's last window sessions, else 0
+        :param windows: moving-average windows
+        :return: 2-d int np.array (instruments x windows)
+        """
+        flags = np.zeros((len(self), len(windows)), dtype=int)
+        if len(windows) == 0:
+            return flags
+        closes = self._last_sessions(max(windows))
+        last_close = closes[:, -1]
+        for column, window in enumerate(windows):
+            # mean of the last window sessions, nan if the instrument has fewer
+            moving_average = closes[:, -window:].mean(axis=1)
+            with np.errstate(invalid='ignore'):
+                flags[:, column] = np.where(last_close > moving_average, 1, 0)
+        return flags
+
+    def returns(self, periods):
+        """
+        percent change over periods sessions (as a fraction) for all instruments and dates
+        :return: 2-d np.array (instruments x dates)
+        """
+        sessions = self.sessions()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.expand(sessions / _shift(sessions, periods) - 1)
+
+    def last_returns(self, periods):
+        """
+        percent change over the last periods sessions (as a fraction) of every instrument
+        :return: np.array, one value per instrument (nan if the history is too short)
+        """
+        closes = self._last_sessions(periods + 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return closes[:, -1] / closes[:, 0] - 1
+
+    def breadth(self, window):
+        """
+        percent of the listed instruments with close above the moving-average for every date
+        :return: pd.Series with date as index
+        """
+        listed = self.listed().sum(axis=0)
+        above = self.above_sma(window).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.Series(np.where(listed > 0, above / listed * 100, np.nan), index=self.dates)
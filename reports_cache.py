@@ -0,0 +1,130 @@
+# os for file- and directory-handling
+import os
+# datetime for date- and time-stuff
+import datetime as dt
+# pandas is a data-analysis library for python (data frames)
+import pandas as pd
+import numpy as np
+
+
+def _compact(report):
+    """
+    float64-columns as float32, half the memory for the report values
+    """
+    report = report.sort_index()
+    float_columns = report.select_dtypes(include=['float64']).columns
+    return report.astype({column: np.float32 for column in float_columns})
+
+
+def latest_report_end(reports_quarter):
+    """
+    end date of the latest quarter report
+    :param reports_quarter: pd.DataFrame of quarter reports with (year, period) as index
+    :return: pd.Timestamp or None if there are no reports
+    """
+    if len(reports_quarter) == 0:
+        return None
+    if 'reportEndDate' in reports_quarter.columns:
+        return pd.Timestamp(reports_quarter['reportEndDate'].max())
+    # calendar quarter when the report dates are missing
+    year, period = reports_quarter.index.max()
+    return pd.Timestamp(int(year), int(period) * 3, 1) + pd.offsets.MonthEnd(0)
+
+
+class ReportsCache:
+    """
+    cache of financial reports (quarter, year and r12) keyed by ins_id, in memory and optionally on disk.
+    a cached entry is used until the quarter after the latest report has ended, after that the
+    reports are fetched again at most once per recheck_after and replaced only when a newer
+    report period shows up
+    """
+    def __init__(self, fetcher, cache_path=None, recheck_after=dt.timedelta(days=1)):
+        """
+        :param fetcher: ApiFetcher used for fetching reports
+        :param cache_path: directory where the report-files are stored, default None (memory only)
+        :param recheck_after: dt.timedelta between two checks for a new report
+        """
+        self._fetcher = fetcher
+        self._cache_path = cache_path
+        self._recheck_after = recheck_after
+        # ins_id -> {'reports': (reports_quarter, reports_year, reports_r12), 'checked': dt.datetime}
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        # ins_id -> exception for the instruments that could not be fetched in the last call
+        self.last_failures = {}
+
+    def _file_path(self, ins_id):
+        return os.path.join(self._cache_path, f'{int(ins_id)}.pkl')
+
+    def _read(self, ins_id):
+        if self._cache_path is None or not os.path.exists(self._file_path(ins_id)):
+            return None
+        return pd.read_pickle(self._file_path(ins_id))
+
+    def _write(self, ins_id, entry):
+        if self._cache_path is None:
+            return
+        # create directory if it do not exist
+        if not os.path.exists(self._cache_path):
+            os.makedirs(self._cache_path)
+        pd.to_pickle(entry, self._file_path(ins_id) + '.tmp')
+        os.replace(self._file_path(ins_id) + '.tmp', self._file_path(ins_id))
+
+    def _is_valid(self, entry, now):
+        """
+        no newer report can exist before the quarter after the latest report has ended
+        """
+        latest_end = latest_report_end(entry['reports'][0])
+        if latest_end is not None and now < latest_end + pd.offsets.QuarterEnd(1):
+            return True
+        return now - entry['checked'] < self._recheck_after
+
+    def get_reports_many(self, ins_ids):
+        """
+        reports for many instruments, only the stale entries are fetched (concurrently)
+        :param ins_ids: instrument ids
+        :return: dict of ins_id -> (reports_quarter, reports_year, reports_r12),
+                 instruments that could not be fetched (and are not cached) are left out
+        """
+        ins_ids = [int(ins_id) for ins_id in ins_ids]
+        now = dt.datetime.now()
+        stale = []
+        for ins_id in ins_ids:
+            if ins_id not in self._entries:
+                entry = self._read(ins_id)
+                if entry is not None:
+                    self._entries[ins_id] = entry
+            if ins_id in self._entries and self._is_valid(self._entries[ins_id], now):
+                self.hits += 1
+            elif ins_id not in stale:
+                self.misses += 1
+                stale.append(ins_id)
+
+        def store(ins_id, reports):
+            old_entry = self._entries.get(ins_id)
+            if old_entry is not None and \
+                    latest_report_end(reports[0]) == latest_report_end(old_entry['reports'][0]):
+                # same latest period, keeping the cached reports and only marking them as checked
+                old_entry['checked'] = now
+                entry = old_entry
+            else:
+                entry = {'reports': tuple(_compact(report) for report in reports), 'checked': now}
+            self._entries[ins_id] = entry
+            self._write(ins_id, entry)
+
+        # every instrument is written as soon as it arrives, a restarted run only fetches the rest
+        self._fetcher.fetch_reports(stale, on_result=store)
+        self.last_failures = {ins_id: failure for ins_id, failure in self._fetcher.last_failures.items()
+                              if ins_id not in self._entries}
+        return {ins_id: self._entries[ins_id]['reports'] for ins_id in ins_ids if ins_id in self._entries}
+
+    def get_reports(self, ins_id):
+        """
+        reports for one instrument (see get_reports_many)
+        :return: (reports_quarter, reports_year, reports_r12)
+        """
+        reports = self.get_reports_many([ins_id])
+        if int(ins_id) not in reports:
+            raise self.last_failures[int(ins_id)]
+        return reports[int(ins_id)]
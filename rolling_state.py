@@ -0,0 +1,185 @@
+# os for file- and directory-handling
+import os
+import numpy as np
+
+
+class RollingMAState:
+    """
+    streaming moving-averages, per instrument a ring buffer of the last closes and a running sum
+    per window. a new close updates every moving-average in constant time, so the above-ma flags
+    for today only need the new days instead of the full history
+    """
+    def __init__(self, windows=(20, 50, 200)):
+        """
+        :param windows: moving-average windows
+        """
+        self.windows = tuple(int(window) for window in windows)
+        self._size = max(self.windows)
+        self.ins_ids = np.zeros(0, dtype=np.int64)
+        # (instruments x size) ring buffer of the last closes and the position of the next close
+        self._ring = np.zeros((0, self._size))
+        self._position = np.zeros(0, dtype=np.int64)
+        # number of closes seen (capped at size)
+        self._count = np.zeros(0, dtype=np.int64)
+        # (instruments x windows) sum of the last window closes
+        self._sums = np.zeros((0, len(self.windows)))
+        self.last_close = np.zeros(0)
+        self.last_date = np.zeros(0, dtype='datetime64[D]')
+        self._rows = {}
+
+    @classmethod
+    def load(cls, file_path, windows=(20, 50, 200)):
+        """
+        reads a state saved with save, a new (empty) state is returned if the file is missing. the state
+        keeps the saved windows as well as the requested ones: a new window up to the saved ring size is
+        summed from the ring buffer, only a longer window needs the instruments with a full ring seeded
+        again (their last date is cleared, see last_dates)
+        """
+        if not os.path.exists(file_path):
+            return cls(windows)
+        with np.load(file_path) as arrays:
+            saved = {name: arrays[name] for name in arrays.files}
+        saved_windows = tuple(int(window) for window in saved['windows'])
+        state = cls(sorted(set(saved_windows) | {int(window) for window in windows}))
+        state.ins_ids = saved['ins_ids']
+        state.last_close = saved['last_close']
+        state.last_date = saved['last_date']
+        state._count = saved['count']
+        state._rows = {int(ins_id): row for row, ins_id in enumerate(state.ins_ids)}
+        if state.windows == saved_windows:
+            state._ring = saved['ring']
+            state._position = saved['position']
+            state._sums = saved['sums']
+            return state
+        # the saved closes oldest first, a full ring starts at the position of the next close
+        ring, position, count = saved['ring'], saved['position'], saved['count']
+        saved_size = ring.shape[1]
+        full = count >= saved_size
+        order = np.where(full[:, None], (position[:, None] + np.arange(saved_size)) % saved_size, np.arange(saved_size))
+        closes = np.take_along_axis(ring, order, axis=1)
+        state._ring = np.zeros((len(state.ins_ids), state._size))
+        state._ring[:, :saved_size] = closes
+        state._position = count % state._size
+        # running sums of the saved closes, the sum of a window is the difference of two running sums
+        sums = np.zeros((len(state.ins_ids), saved_size + 1))
+        np.cumsum(closes, axis=1, out=sums[:, 1:])
+        rows = np.arange(len(state.ins_ids))
+        state._sums = np.zeros((len(state.ins_ids), len(state.windows)))
+        for column, window in enumerate(state.windows):
+            if window in saved_windows:
+                state._sums[:, column] = saved['sums'][:, saved_windows.index(window)]
+            else:
+                state._sums[:, column] = sums[rows, count] - sums[rows, np.maximum(count - window, 0)]
+        if state._size > saved_size:
+            # older closes than the ring kept are needed, these instruments are seeded again
+            state.last_close[full] = np.nan
+            state.last_date[full] = np.datetime64('NaT', 'D')
+        return state
+
+    def save(self, file_path):
+        # create directory if it do not exist
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # np.savez adds .npz to names without it, the temporary file keeps the extension
+        tmp_path = file_path + '.tmp.npz'
+        np.savez(tmp_path, windows=np.array(self.windows), ins_ids=self.ins_ids, ring=self._ring,
+                 position=self._position, count=self._count, sums=self._sums, last_close=self.last_close,
+                 last_date=self.last_date)
+        os.replace(tmp_path, file_path)
+
+    def __contains__(self, ins_id):
+        return int(ins_id) in self._rows
+
+    def add(self, ins_ids):
+        """
+        adds empty rows for the instruments not in the state (all at once, growing the arrays once)
+        """
+        new_ins_ids = [int(ins_id) for ins_id in dict.fromkeys(ins_ids) if int(ins_id) not in self._rows]
+        if len(new_ins_ids) == 0:
+            return
+        n = len(new_ins_ids)
+        for row, ins_id in enumerate(new_ins_ids, start=len(self.ins_ids)):
+            self._rows[ins_id] = row
+        self.ins_ids = np.concatenate([self.ins_ids, np.array(new_ins_ids, dtype=np.int64)])
+        self._ring = np.vstack([self._ring, np.zeros((n, self._size))])
+        self._position = np.concatenate([self._position, np.zeros(n, dtype=np.int64)])
+        self._count = np.concatenate([self._count, np.zeros(n, dtype=np.int64)])
+        self._sums = np.vstack([self._sums, np.zeros((n, len(self.windows)))])
+        self.last_close = np.concatenate([self.last_close, np.full(n, np.nan)])
+        self.last_date = np.concatenate([self.last_date, np.full(n, np.datetime64('NaT', 'D'))])
+
+    def _row(self, ins_id):
+        """
+        row of ins_id, a new (empty) row is added for unknown instruments
+        """
+        if int(ins_id) not in self._rows:
+            self.add([ins_id])
+        return self._rows[int(ins_id)]
+
+    def seed(self, ins_id, dates, closes):
+        """
+        (re)starts the state of an instrument from its price history
+        :param dates: dates of the closes (ascending)
+        :param closes: closes, only the last max(windows) are used
+        """
+        row = self._row(ins_id)
+        closes = np.asarray(closes, dtype=float)
+        dates = np.asarray(dates)[~np.isnan(closes)]
+        # days without a close are skipped
+        closes = closes[~np.isnan(closes)][-self._size:]
+        self._ring[row] = 0.0
+        self._ring[row, :len(closes)] = closes
+        self._position[row] = len(closes) % self._size
+        self._count[row] = len(closes)
+        self._sums[row] = [closes[-window:].sum() for window in self.windows]
+        self.last_close[row] = closes[-1] if len(closes) > 0 else np.nan
+        self.last_date[row] = np.datetime64(dates[-1], 'D') if len(dates) > 0 else np.datetime64('NaT', 'D')
+
+    def push(self, ins_id, date, close):
+        """
+        adds one new close, every moving-average is updated in constant time
+        """
+        if np.isnan(close):
+            return
+        row = self._row(ins_id)
+        position = self._position[row]
+        for column, window in enumerate(self.windows):
+            if self._count[row] >= window:
+                # the close leaving the window
+                self._sums[row, column] -= self._ring[row, (position - window) % self._size]
+            self._sums[row, column] += close
+        self._ring[row, position] = close
+        self._position[row] = (position + 1) % self._size
+        self._count[row] = min(self._count[row] + 1, self._size)
+        self.last_close[row] = close
+        self.last_date[row] = np.datetime64(date, 'D')
+
+    def last_dates(self, ins_ids):
+        """
+        :return: np.array of the date of the last close per instrument, NaT for unknown instruments
+        """
+        return np.array([self.last_date[self._rows[int(ins_id)]] if int(ins_id) in self._rows
+                         else np.datetime64('NaT', 'D') for ins_id in ins_ids], dtype='datetime64[D]')
+
+    def last_closes(self, ins_ids):
+        """
+        :return: np.array of the last close per instrument, nan for unknown instruments
+        """
+        return np.array([self.last_close[self._rows[int(ins_id)]] if int(ins_id) in self._rows else np.nan
+                         for ins_id in ins_ids])
+
+    def flags(self, ins_ids, windows=None):
+        """
+        above-ma flags for the last close, 1 if the close is above the moving-average, else 0
+        :param windows: windows to return (all of them must be in the state), default all
+        :return: 2-d int np.array (instruments x windows), 0 while the history is shorter than the window
+        """
+        if windows is None:
+            windows = self.windows
+        rows = np.array([self._rows[int(ins_id)] for ins_id in ins_ids], dtype=np.intp)
+        columns = [self.windows.index(window) for window in windows]
+        windows = np.array(windows)
+        moving_averages = self._sums[rows][:, columns] / windows
+        enough = self._count[rows][:, None] >= windows
+        return np.where(enough & (self.last_close[rows][:, None] > moving_averages), 1, 0)
@@ -0,0 +1,199 @@
+# os for the number of cpus
+import os
+import io
+import contextlib
+# process-pool for running the screeners' compute stages in parallel
+from concurrent.futures import ProcessPoolExecutor
+
+from borsdata_client import NORDIC_COUNTRIES, BorsdataClient
+# the workers' exports are handed back to the parent's export pipeline
+from export_pipeline import ExportCollector
+
+# the data a screener reads, one kind per way it is fetched:
+#   'prices'         full price histories for price panels (the compact store when compact_prices is set)
+#   'price_frames'   full price histories of single instruments through the price cache (plots, P/E, index)
+#   'latest_prices'  the days after the streaming moving-average state's last close (today's breadth)
+#   'reports'        financial reports through the reports cache
+#   'kpi_histories'  (kpi, ins_id) pairs of year/mean kpi histories through the kpi cache
+# all kinds of stock prices come from the same endpoint, an instrument in both 'prices' and
+# 'latest_prices' is fetched once (the moving-average state takes its new days from the price cache)
+ENDPOINTS = {'prices': 'get_instrument_stock_prices', 'price_frames': 'get_instrument_stock_prices',
+             'latest_prices': 'get_instrument_stock_prices', 'reports': 'get_instrument_reports', 'kpi_histories': 'get_kpi_history'}
+EPS_EXCLUDE_MARKETS = ('Spotlight', 'NGM', 'PepMarket')
+MARKETS = ['Large Cap', 'Mid Cap', 'Small Cap', 'First North']
+
+
+def _ins_ids(client, exclude=None, **criteria):
+    return [int(ins_id) for ins_id in client.filter_instruments(exclude, **criteria)['ins_id'].values]
+
+
+def _breadth_needs(client, markets, windows=(20, 50, 200), country='Sverige'):
+    return {'latest_prices': _ins_ids(client, market=markets, country=country)}, tuple(windows)
+
+
+def _grouped_breadth_needs(client, group_by=None, windows=(20, 50, 200), countries=NORDIC_COUNTRIES):
+    return {'latest_prices': _ins_ids(client, country=countries)}, tuple(windows)
+
+
+def _eps_needs(client, report_type='r12', periods=3, lag=None, positive_base=True, positive_growth=True,
+               countries=NORDIC_COUNTRIES, exclude_markets=EPS_EXCLUDE_MARKETS):
+    return {'reports': _ins_ids(client, country=countries, exclude={'market': list(exclude_markets)})}, ()
+
+
+def _kpi_screen_needs(client, kpis, lower_is_better=(), year=None, number_of_stocks=10, countries=NORDIC_COUNTRIES,
+                      market=None):
+    criteria = {'country': countries} if market is None else {'country': countries, 'market': market}
+    ins_ids = _ins_ids(client, {'sector': ['N/A']}, **criteria)
+    return {'kpi_histories': [(int(kpi), ins_id) for kpi in kpis for ins_id in ins_ids]}, ()
+
+
+# screener (BorsdataClient-method) -> function(client, **kwargs) returning ({kind: ins_ids}, moving-average windows)
+SCREENER_NEEDS = {
+    'breadth': _breadth_needs,
+    'market_breadth': lambda client, market: _breadth_needs(client, [market]),
+    'market_breadth_50': lambda client, market: _breadth_needs(client, [market], (50,)),
+    'market_breadth_to_excel': lambda client: _breadth_needs(client, MARKETS),
+    'grouped_breadth': _grouped_breadth_needs,
+    'sector_breadth': lambda client: _grouped_breadth_needs(client),
+    'branch_breadth': lambda client: _grouped_breadth_needs(client),
+    'sector_and_branch_breadth': lambda client: _grouped_breadth_needs(client),
+    'breadth_history': lambda client, windows=(20, 50, 200), countries=NORDIC_COUNTRIES:
+        ({'prices': _ins_ids(client, country=countries)}, ()),
+    'breadth_large_cap_sweden': lambda client:
+        ({'prices': _ins_ids(client, market='Large Cap', country='Sverige'), 'price_frames': [643]}, ()),
+    'top_performers': lambda client, market, country, number_of_stocks=5, percent_change=1:
+        ({'prices': _ins_ids(client, market=market, country=country)}, ()),
+    'momentum': lambda client, countries=NORDIC_COUNTRIES, horizons=None, weights=None, group_by=None,
+                       number_of_stocks=10, exclude=None: ({'prices': _ins_ids(client, exclude, country=countries)}, ()),
+    'expression_screen': lambda client, expression, rank_by=None, number_of_stocks=10, countries=NORDIC_COUNTRIES,
+                                exclude=None, columns=(): ({'prices': _ins_ids(client, exclude, country=countries)}, ()),
+    'expression_breadth': lambda client, conditions, group_by=None, countries=NORDIC_COUNTRIES:
+        ({'prices': _ins_ids(client, country=countries)}, ()),
+    'market_internals': lambda client, countries=NORDIC_COUNTRIES, market=None, days=10:
+        ({'prices': _ins_ids(client, {'sector': ['N/A']}, country=countries)
+          if market is None else _ins_ids(client, {'sector': ['N/A']}, country=countries, market=market)}, ()),
+    'plot_stock_prices': lambda client, ins_id: ({'price_frames': [int(ins_id)]}, ()),
+    'eps_acceleration': _eps_needs,
+    'eps_acceleration_backtest': lambda client, report_type='r12', periods=3, lag=None, positive_base=True,
+                                        positive_growth=True, countries=NORDIC_COUNTRIES,
+                                        exclude_markets=EPS_EXCLUDE_MARKETS, horizons=None, from_year=None:
+        ({kind: _ins_ids(client, country=countries, exclude={'market': list(exclude_markets)})
+          for kind in ('reports', 'prices')}, ()),
+    'get_eps_accelerationR12': lambda client: _eps_needs(client, 'r12', countries='Sverige'),
+    'get_eps_accelerationQ': lambda client: _eps_needs(client, 'quarter'),
+    'get_eps_growth': lambda client: ({'reports': _ins_ids(client, market='Large Cap', country='Sverige')}, ()),
+    'history_kpi': lambda client, kpi, market, country, year:
+        ({'kpi_histories': [(int(kpi), ins_id) for ins_id in _ins_ids(client, market=market, country=country)]}, ()),
+    'kpi_screen': _kpi_screen_needs,
+    'get_latest_pe': lambda client, ins_id: ({'price_frames': [int(ins_id)], 'reports': [int(ins_id)]}, ()),
+}
+
+
+def _screener_spec(screener):
+    """
+    :param screener: method name, or (method name, dict of keyword arguments)
+    :return: (name, kwargs)
+    """
+    if isinstance(screener, str):
+        return screener, {}
+    name, kwargs = screener
+    return name, dict(kwargs)
+
+
+def _run_screener(borsdata_api, cache_path, compact_prices, name, kwargs):
+    """
+    runs one screener in a worker process on the prefetched caches (no top-ups). the exports are
+    collected and returned, the parent writes them with its own pipeline (pool processes do not run
+    atexit-hooks, and several workers must not replace the same workbook)
+    :return: (printed output, result, number of api calls, list of (export name, pd.DataFrame))
+    """
+    exports = ExportCollector()
+    client = BorsdataClient(borsdata_api, cache_path=cache_path, refresh=False, compact_prices=compact_prices,
+                            exports=exports)
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            result = getattr(client, name)(**kwargs)
+    finally:
+        client.close()
+    api_calls = sum(endpoint['calls'] for endpoint in client.instrumentation.summary()['endpoints'].values())
+    return output.getvalue(), result, api_calls, exports.outputs
+
+
+class RunPlanner:
+    """
+    runs several screeners with each piece of data fetched once: the needs of all screeners are
+    merged into one set of (endpoint, ins_id), fetched concurrently into the client's caches, and
+    the screeners' compute stages then run in worker processes reading the warm on-disk caches
+    """
+    def __init__(self, client, borsdata_api=None, processes=None):
+        """
+        :param client: BorsdataClient doing the fetching
+        :param borsdata_api: api-object handed to the worker processes (must be picklable), default the client's
+        :param processes: number of worker processes, default one per screener (max the number of cpus).
+                          0 or 1 runs the screeners one after another on the client
+        """
+        self._client = client
+        self._borsdata_api = borsdata_api if borsdata_api is not None else client._raw_api
+        self._processes = processes
+        # (endpoint, ins_id) fetched by the last prefetch
+        self.fetched = set()
+        # api calls made by the worker processes during the last run (0 when everything was prefetched)
+        self.worker_api_calls = 0
+
+    def plan(self, screeners):
+        """
+        merged needs of the screeners
+        :param screeners: list of method names or (method name, kwargs)
+        :return: (dict of kind -> list of unique ins_ids (or (kpi, ins_id) pairs), tuple of moving-average windows)
+        """
+        needs = {kind: {} for kind in ENDPOINTS}
+        windows = set()
+        for screener in screeners:
+            name, kwargs = _screener_spec(screener)
+            if name not in SCREENER_NEEDS:
+                raise ValueError(f"RunPlanner >> unknown screener {name}, known: {sorted(SCREENER_NEEDS)}")
+            screener_needs, screener_windows = SCREENER_NEEDS[name](self._client, **kwargs)
+            for kind, ins_ids in screener_needs.items():
+                needs[kind].update(dict.fromkeys(ins_ids))
+            windows.update(screener_windows)
+        return {kind: list(ins_ids) for kind, ins_ids in needs.items()}, tuple(sorted(windows))
+
+    def prefetch(self, screeners):
+        """
+        fetches the merged needs once, each kind in one concurrent batch
+        :return: set of (endpoint, ins_id) needed by the screeners
+        """
+        needs, windows = self.plan(screeners)
+        self._client.prefetch(needs['prices'], needs['latest_prices'], needs['reports'], windows or (20, 50, 200),
+                              needs['kpi_histories'], needs['price_frames'])
+        self.fetched = {(ENDPOINTS[kind], ins_id) for kind, ins_ids in needs.items() for ins_id in ins_ids}
+        return self.fetched
+
+    def run(self, screeners):
+        """
+        prefetches the needs and runs the screeners, printed output is shown in the screeners' order
+        :param screeners: list of method names or (method name, kwargs)
+        :return: list of the screeners' return values
+        """
+        self.prefetch(screeners)
+        specs = [_screener_spec(screener) for screener in screeners]
+        processes = self._processes if self._processes is not None else min(len(specs), os.cpu_count() or 1)
+        if processes <= 1:
+            self.worker_api_calls = 0
+            return [getattr(self._client, name)(**kwargs) for name, kwargs in specs]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(_run_screener, self._borsdata_api, self._client.cache_path,
+                                       self._client.compact_prices, name, kwargs)
+                       for name, kwargs in specs]
+            outcomes = [future.result() for future in futures]
+        results = []
+        self.worker_api_calls = 0
+        for output, result, api_calls, exports in outcomes:
+            print(output, end='')
+            results.append(result)
+            self.worker_api_calls += api_calls
+            # written in the screeners' order, like a run on the client
+            for export_name, frame in exports:
+                self._client.exports.submit(export_name, frame)
+        return results
@@ -0,0 +1,75 @@
+# os and json for the journal-file
+import os
+import json
+# datetime for date- and time-stuff
+import datetime as dt
+
+
+class SweepJournal:
+    """
+    checkpoint of an unfinished sweep (e.g. the top-ups of a nordic-wide price or moving-average batch):
+    every instrument is appended to the journal-file as soon as its result is stored, and the file is
+    removed when the sweep completes. a run restarted after a crash finds the journal and skips the
+    instruments already done, only the rest (and the failures) are fetched again
+    """
+    def __init__(self, file_path, max_age=dt.timedelta(hours=12)):
+        """
+        :param file_path: path of the journal-file
+        :param max_age: dt.timedelta, an older journal is ignored (the data is topped up again)
+        """
+        self._file_path = file_path
+        self._max_age = max_age
+        self._file = None
+        # keys stored by the unfinished sweep (and by this run)
+        self.done = set()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self._file_path):
+            return
+        with open(self._file_path) as file:
+            lines = file.read().splitlines()
+        if len(lines) == 0:
+            return
+        try:
+            started = dt.datetime.fromisoformat(json.loads(lines[0])['started'])
+        except (ValueError, KeyError, TypeError):
+            return
+        if dt.datetime.now() - started >= self._max_age:
+            return
+        for line in lines[1:]:
+            try:
+                key = json.loads(line)
+            except ValueError:
+                # the last line of an interrupted write
+                continue
+            self.done.add(tuple(key) if isinstance(key, list) else key)
+
+    def mark(self, key):
+        """
+        records key as done, the line is flushed right away so it survives a crash
+        :param key: ins_id (or a tuple of ints/strings)
+        """
+        if self._file is None:
+            fresh = len(self.done) == 0 or not os.path.exists(self._file_path)
+            # create directory if it do not exist
+            directory = os.path.dirname(self._file_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self._file = open(self._file_path, 'w' if fresh else 'a')
+            if fresh:
+                self._file.write(json.dumps({'started': dt.datetime.now().isoformat()}) + '\n')
+        self._file.write(json.dumps(key) + '\n')
+        self._file.flush()
+        self.done.add(key)
+
+    def complete(self):
+        """
+        the sweep has finished, the journal is removed and the next run starts from scratch
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self._file_path):
+            os.remove(self._file_path)
+        self.done = set()
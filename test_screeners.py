@@ -0,0 +1,167 @@
+# screener results must not depend on which screeners ran before on the same client or on how
+# the run is split up, usage
+#   python -m pytest test_screeners.py
+import numpy as np
+import pandas as pd
+import pytest
+
+import borsdata_client
+from fake_borsdata_api import FakeBorsdataAPI
+from borsdata_client import BorsdataClient, NORDIC_COUNTRIES
+from breadth_history import BreadthHistory, group_breadth_history
+from momentum import percentile_ranks
+from price_panel import PricePanel
+from rolling_state import RollingMAState
+from run_planner import RunPlanner
+
+# every country's exchange is closed on 5% of the weekdays, so a nordic-wide panel has days the
+# swedish instruments did not trade on
+COUNTRY_HOLIDAYS = 0.05
+
+
+@pytest.fixture
+def api():
+    return FakeBorsdataAPI(300, country_holidays=COUNTRY_HOLIDAYS)
+
+
+@pytest.fixture(params=[False, True], ids=['price_files', 'compact_prices'])
+def client(api, tmp_path, monkeypatch, request):
+    # the exports are written relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return BorsdataClient(api, cache_path=str(tmp_path / 'cache'), calls_per_second=1000, compact_prices=request.param)
+
+
+def test_top_performers_independent_of_earlier_screeners(client):
+    before = client.top_performers('Large Cap', 'Sverige', 5, 60)
+    # loads the instruments of every nordic country into the shared panel
+    client.momentum()
+    after = client.top_performers('Large Cap', 'Sverige', 5, 60)
+    pd.testing.assert_frame_equal(before, after)
+
+
+def test_momentum_independent_of_earlier_screeners(client):
+    before = client.momentum(countries=['Sverige'])
+    client.momentum()
+    after = client.momentum(countries=['Sverige'])
+    pd.testing.assert_frame_equal(before, after)
+
+
+def test_panel_windows_count_own_trading_days(api, client):
+    client.momentum()
+    ins_ids = client.filter_instruments(country=['Sverige', 'Norge'])['ins_id'].values
+    panel = client.price_panel(ins_ids)
+    sma = panel.sma(50)[:, -1]
+    returns = panel.last_returns(60)
+    for row, ins_id in enumerate(panel.ins_ids):
+        close = api.get_instrument_stock_prices(ins_id)['close'].sort_index()
+        # the compact store keeps float32 closes
+        assert sma[row] == pytest.approx(close.rolling(50).mean().iloc[-1], rel=1e-5, nan_ok=True)
+        assert returns[row] == pytest.approx(close.iloc[-1] / close.iloc[-61] - 1, rel=1e-4, abs=1e-6)
+    assert np.array_equal(panel.above_sma(50)[:, -1].astype(int), panel.last_above_sma([50])[:, 0])
+
+
+def test_expression_screeners_independent_of_earlier_screeners(client):
+    def run():
+        screen = client.expression_screen('(dist_high252 > -0.2) & (close > ema20)', rank_by='return63',
+                                          countries=['Sverige'], columns=('sma50', 'new_high252'))
+        breadth = client.expression_breadth({'near high': 'dist_high252 > -0.05', 'EMA20': 'close > ema20'},
+                                            group_by='market', countries=['Sverige'])
+        return screen, breadth
+    before = run()
+    client.momentum()
+    after = run()
+    pd.testing.assert_frame_equal(before[0], after[0])
+    pd.testing.assert_frame_equal(before[1], after[1])
+
+
+def test_indicators_count_own_trading_days(api, client):
+    ins_ids = client.filter_instruments(country=['Sverige', 'Norge'])['ins_id'].values
+    engine = client.indicator_engine(ins_ids)
+    last = {name: engine.last(name) for name in ('ema20', 'high252', 'new_high252', 'new_low20')}
+    for row, ins_id in enumerate(engine.panel.ins_ids):
+        close = api.get_instrument_stock_prices(ins_id)['close'].sort_index()
+        assert last['ema20'][row] == pytest.approx(close.ewm(span=20, adjust=False).mean().iloc[-1], rel=1e-5)
+        assert last['high252'][row] == pytest.approx(close.rolling(252).max().iloc[-1], rel=1e-5, nan_ok=True)
+        assert last['new_high252'][row] == (close.iloc[-1] > close.iloc[-253:-1].max())
+        assert last['new_low20'][row] == (close.iloc[-1] < close.iloc[-21:-1].min())
+
+
+def test_breadth_history_matches_breadth(client):
+    # a nordic-wide universe, its last date may be a day one of the exchanges was closed
+    markets = ['Large Cap', 'Mid Cap', 'Small Cap']
+    breadth = client.breadth(markets, country=NORDIC_COUNTRIES)
+    history = client.breadth_history()
+    internals = client.market_internals(market='Large Cap')
+    for market in markets:
+        assert breadth[market] == [int(history[('market', market, f'MA{window}')].iloc[-1]) for window in (20, 50, 200)]
+    assert breadth['Large Cap'][1] == int(internals['% > MA50'].iloc[-1])
+
+
+def test_breadth_history_update_matches_backfill(api, client, tmp_path):
+    instruments = client.filter_instruments(country=['Sverige', 'Norge', 'Finland'])
+    frames = {int(ins_id): api.get_instrument_stock_prices(ins_id).sort_index() for ins_id in instruments['ins_id']}
+    panel = PricePanel.from_frames(frames)
+    instruments = instruments.set_index('ins_id').loc[panel.ins_ids]
+    history = BreadthHistory(str(tmp_path / 'history.pkl'))
+    # the history as of 30 dates ago, then topped up
+    history.update(PricePanel.from_frames({ins_id: frame[frame.index < panel.dates[-30]]
+                                           for ins_id, frame in frames.items()}), instruments)
+    pd.testing.assert_frame_equal(history.update(panel, instruments), group_breadth_history(panel, instruments,
+                                                                                           (20, 50, 200)))
+
+
+def test_percentile_ranks_of_ties_are_equal():
+    rng = np.random.default_rng(0)
+    # few distinct values, so most values are tied
+    values = rng.integers(0, 8, 200).astype(float)
+    values[rng.random(200) < 0.1] = np.nan
+    groups = rng.integers(0, 3, 200)
+    expected = pd.Series(values).groupby(groups).rank(method='max', pct=True).values
+    np.testing.assert_array_equal(percentile_ranks(values, groups), np.ceil(expected * 100))
+    np.testing.assert_array_equal(percentile_ranks([1.0, 2.0, 2.0, np.nan, 3.0]), [25, 75, 75, np.nan, 100])
+
+
+def assert_same_result(serial, parallel):
+    if isinstance(serial, pd.DataFrame):
+        pd.testing.assert_frame_equal(serial, parallel)
+    elif isinstance(serial, dict):
+        assert serial.keys() == parallel.keys()
+        for key in serial:
+            assert_same_result(serial[key], parallel[key])
+    else:
+        assert serial == parallel
+
+
+def test_planner_serial_and_parallel_runs_match(api, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    screeners = [('top_performers', {'market': 'Large Cap', 'country': 'Sverige', 'percent_change': 60}),
+                 'momentum',
+                 ('breadth', {'markets': ['Large Cap', 'Mid Cap']}),
+                 ('grouped_breadth', {'group_by': 'sector'}),
+                 'breadth_history',
+                 ('expression_screen', {'expression': 'close > ema20', 'rank_by': 'return63', 'countries': ['Sverige']}),
+                 ('market_internals', {'market': 'Large Cap'}),
+                 'eps_acceleration']
+    results = {}
+    for processes in (1, 2):
+        client = BorsdataClient(api, cache_path=str(tmp_path / f'cache{processes}'), calls_per_second=1000)
+        results[processes] = RunPlanner(client, processes=processes).run(screeners)
+        client.close()
+    for serial, parallel in zip(results[1], results[2]):
+        assert_same_result(serial, parallel)
+
+
+def test_ma_journal_lists_only_saved_instruments(client, tmp_path, monkeypatch):
+    # a crash right after any journal line must find the instrument in the saved state
+    monkeypatch.setattr(borsdata_client, 'MA_STATE_SAVE_EVERY', 50)
+    file_path = str(tmp_path / 'cache' / 'rolling_ma_state.npz')
+    marked = []
+    mark = client._ma_journal.mark
+
+    def checked_mark(ins_id):
+        assert not np.isnat(RollingMAState.load(file_path).last_dates([ins_id])[0])
+        marked.append(ins_id)
+        mark(ins_id)
+    monkeypatch.setattr(client._ma_journal, 'mark', checked_mark)
+    client.breadth(['Large Cap', 'Mid Cap', 'Small Cap'], country=NORDIC_COUNTRIES)
+    assert len(marked) > 50